@@ -4,19 +4,12 @@ Tinder形式のSNS投稿作成アプリケーション
 """
 
 from flask import Blueprint, request, jsonify
-from app.services.rag_service import RAGService
-from app.services.claude_service import ClaudeService
-from app.services.sheets_service import SheetsService
+from app.services.registry import get_service
 from datetime import datetime
 import traceback
 
 api_bp = Blueprint('api', __name__)
 
-# Initialize services
-rag_service = RAGService()
-claude_service = ClaudeService()
-sheets_service = SheetsService()
-
 
 @api_bp.route('/init', methods=['POST'])
 def initialize_context():
@@ -38,7 +31,11 @@ def initialize_context():
     Response:
         {
             "pinecone_results": [...],
-            "similar_posts": [...]
+            "similar_posts": [...],
+            "similar_posts_scored": 98,       # past posts that had a vector
+            "similar_posts_candidates": 100,  # past posts considered
+            "timings": {"embedding": 210.5, "pinecone": 380.2, ..., "total": 912.4},  # ms
+            "timed_out": []                   # sources that hit their timeout
         }
     """
     try:
@@ -52,7 +49,7 @@ def initialize_context():
         # URL is optional - if not provided, only similar posts will be searched
         # Supports multiple URLs (comma-separated): "url1, url2, url3"
         # Multiple URLs will be automatically detected and processed by RAGService
-        context = rag_service.get_comprehensive_context(
+        context = get_service('rag').get_comprehensive_context(
             url=data.get('url') or None,
             decided=data.get('decided'),
             anniversary=data.get('anniversary')
@@ -61,7 +58,11 @@ def initialize_context():
         return jsonify({
             'pinecone_results': context.get('pinecone_results', []),
             'similar_posts': context.get('similar_posts', []),
-            'analytics_insights': context.get('analytics_insights', '')
+            'similar_posts_scored': context.get('similar_posts_scored', 0),
+            'similar_posts_candidates': context.get('similar_posts_candidates', 0),
+            'analytics_insights': context.get('analytics_insights', ''),
+            'timings': context.get('timings', {}),
+            'timed_out': context.get('timed_out', [])
         }), 200
 
     except Exception as e:
@@ -148,7 +149,7 @@ def generate_posts():
 
         # Generate posts with Claude (including X Analytics insights)
         print(f"\n[INFO] Claude API呼び出し開始...")
-        result = claude_service.create_sns_post_with_context(
+        result = get_service('claude').create_sns_post_with_context(
             date=data.get('date'),
             decided=data.get('decided'),
             url=data.get('url'),
@@ -240,7 +241,7 @@ def refine_post():
 
         # Refine post with Claude
         print(f"\n[INFO] Claude API（改善）呼び出し開始...")
-        result = claude_service.refine_post(
+        result = get_service('claude').refine_post(
             selected_post=data.get('selected_post'),
             refinement_request=data.get('refinement_request', ''),
             round_num=data.get('round', 2)
@@ -348,6 +349,7 @@ def publish_post():
 
         # Save to Draft sheet
         print(f"\n[INFO] Draft sheetに保存中...")
+        sheets_service = get_service('sheets')
         draft_row = sheets_service.save_draft(sheet_data)
         print(f"   Draft sheet 行番号: {draft_row}")
 
@@ -522,8 +524,7 @@ def refine_emojis():
 
         # Get emoji guidelines from X Analytics
         print(f"\n[INFO] X Analyticsから絵文字ガイドラインを取得中...")
-        from app.services.analytics_service import AnalyticsService
-        analytics = AnalyticsService()
+        analytics = get_service('analytics')
         emoji_guidelines = analytics.get_emoji_guidelines(min_occurrences=3, top_n=15)
 
         print(f"   推奨絵文字: {len(emoji_guidelines.get('recommended', []))}種類")
@@ -531,7 +532,7 @@ def refine_emojis():
 
         # Refine emojis with Claude
         print(f"\n[INFO] Claude APIで絵文字を最適化中...")
-        result = claude_service.refine_emojis(text, emoji_guidelines)
+        result = get_service('claude').refine_emojis(text, emoji_guidelines)
 
         print(f"\n{'🎨'*30}")
         print(f"[API] 絵文字改善完了")
@@ -5,9 +5,8 @@ Batch Processing API Routes
 """
 
 from flask import Blueprint, request, jsonify
-from app.services.sheets_service import SheetsService
-from app.services.claude_service import ClaudeService
-from app.services.pinecone_service import PineconeService
+from app.services.registry import get_service
+from app.services.batch_job_service import generate_post_for_row, save_generated_post
 import traceback
 import csv
 import io
@@ -16,6 +15,56 @@ from datetime import datetime
 batch_api_bp = Blueprint('batch_api', __name__, url_prefix='/api/batch')
 
 
+def _read_draft_rows(start_row=2, end_row=0):
+    """
+    Read unfinished rows from the draft sheet
+
+    Args:
+        start_row: First row to read (1-indexed, row 1 is the header)
+        end_row: Last row to read (0 = all rows)
+
+    Returns:
+        list: [{'row', 'date', 'url', 'decided', 'anniversary', 'remarks'}, ...]
+            (empty if the window has no data rows)
+
+    Raises:
+        ValueError: If a required column is missing
+    """
+    sheets_service = get_service('sheets')
+
+    # Validate the header even when the window turns out to be empty
+    columns = sheets_service.header_map('draft')
+    missing = [name for name in ('投稿日', 'URL', '決定事項') if name not in columns]
+    if missing:
+        raise ValueError(f"必須カラムが見つかりません: {', '.join(missing)}")
+
+    posts = []
+    # Only the requested window is downloaded, chunk by chunk
+    for row_number, record in sheets_service.iter_rows('draft', start_row, end_row):
+        # Skip if already has final post
+        if record.get('最終投稿', '').strip():
+            print(f"[SKIP] 行{row_number}: すでに最終投稿が存在")
+            continue
+
+        # Skip if missing required fields
+        if not record['決定事項'].strip():
+            print(f"[SKIP] 行{row_number}: 決定事項が空")
+            continue
+
+        post = {
+            'row': row_number,
+            'date': record['投稿日'],
+            'url': record['URL'],
+            'decided': record['決定事項'],
+            'anniversary': record.get('記念日', ''),
+            'remarks': record.get('補足', '')
+        }
+
+        posts.append(post)
+
+    return posts
+
+
 @batch_api_bp.route('/load', methods=['POST'])
 def load_batch_data():
     """
@@ -65,65 +114,14 @@ def load_batch_data():
             print(f"   開始行: {start_row}")
             print(f"   終了行: {end_row if end_row > 0 else '全件'}")
 
-            sheets_service = SheetsService()
-
-            # Get all data from the sheet
-            all_values = sheets_service.draft_sheet.get_all_values()
-
-            if not all_values or len(all_values) < 2:
-                return jsonify({
-                    'success': False,
-                    'error': 'シートにデータがありません'
-                }), 400
-
-            # Headers are in row 1 (index 0)
-            headers = all_values[0]
-
-            # Find column indices
             try:
-                date_idx = headers.index('投稿日')
-                url_idx = headers.index('URL')
-                decided_idx = headers.index('決定事項')
-                anniversary_idx = headers.index('記念日') if '記念日' in headers else None
-                remarks_idx = headers.index('補足') if '補足' in headers else None
-                final_post_idx = headers.index('最終投稿') if '最終投稿' in headers else None
+                posts = _read_draft_rows(start_row, end_row)
             except ValueError as e:
                 return jsonify({
                     'success': False,
-                    'error': f'必須カラムが見つかりません: {e}'
+                    'error': str(e)
                 }), 400
 
-            # Extract data rows
-            posts = []
-            data_rows = all_values[start_row - 1:]  # start_row is 1-indexed
-
-            if end_row > 0:
-                data_rows = data_rows[:end_row - start_row + 1]
-
-            for i, row in enumerate(data_rows):
-                row_number = start_row + i
-
-                # Skip if already has final post
-                if final_post_idx and len(row) > final_post_idx and row[final_post_idx].strip():
-                    print(f"[SKIP] 行{row_number}: すでに最終投稿が存在")
-                    continue
-
-                # Skip if missing required fields
-                if len(row) <= decided_idx or not row[decided_idx].strip():
-                    print(f"[SKIP] 行{row_number}: 決定事項が空")
-                    continue
-
-                post = {
-                    'row': row_number,
-                    'date': row[date_idx] if len(row) > date_idx else '',
-                    'url': row[url_idx] if len(row) > url_idx else '',
-                    'decided': row[decided_idx] if len(row) > decided_idx else '',
-                    'anniversary': row[anniversary_idx] if anniversary_idx and len(row) > anniversary_idx else '',
-                    'remarks': row[remarks_idx] if remarks_idx and len(row) > remarks_idx else ''
-                }
-
-                posts.append(post)
-
             print(f"\n✅ [成功] {len(posts)}件のデータを読み込みました")
 
             return jsonify({
@@ -157,7 +155,10 @@ def load_batch_data():
 @batch_api_bp.route('/process', methods=['POST'])
 def process_batch():
     """
-    Step 2: Process batch posts (generate posts one by one)
+    Step 2: Process a single batch post synchronously
+
+    Batch runs should use /api/batch/jobs instead; this endpoint is kept
+    for generating one row at a time.
 
     Request:
         {
@@ -194,102 +195,23 @@ def process_batch():
         print(f"   決定事項: {post_data.get('decided')}")
         print(f"{'🔄'*30}\n")
 
-        # Initialize services
-        claude_service = ClaudeService()
-        pinecone_service = PineconeService()
-        sheets_service = SheetsService()
-
-        # Step 1: Get context (Pinecone + Similar posts)
-        print(f"[INFO] コンテキスト取得中...")
-
-        # Pinecone search
-        pinecone_results = []
-        if post_data.get('url'):
-            try:
-                pinecone_results = pinecone_service.search_products(
-                    query=post_data.get('decided', ''),
-                    top_k=5
-                )
-                print(f"✅ Pinecone: {len(pinecone_results)}件取得")
-            except Exception as e:
-                print(f"⚠️  Pinecone検索エラー: {e}")
-
-        # Similar posts search
-        similar_posts = []
         try:
-            similar_posts = sheets_service.get_similar_posts(
-                query=post_data.get('decided', ''),
-                top_k=3
-            )
-            print(f"✅ 類似投稿: {len(similar_posts)}件取得")
-        except Exception as e:
-            print(f"⚠️  類似投稿検索エラー: {e}")
-
-        # Step 2: Generate posts
-        print(f"[INFO] 投稿生成中...")
-
-        result = claude_service.generate_posts(
-            date=post_data.get('date', ''),
-            decided=post_data.get('decided', ''),
-            url=post_data.get('url', ''),
-            remarks=post_data.get('remarks', ''),
-            anniversary=post_data.get('anniversary', ''),
-            pinecone_context=pinecone_results,
-            similar_posts=similar_posts
-        )
-
-        if 'error' in result:
-            print(f"❌ [エラー] 投稿生成失敗: {result['error']}")
+            result = generate_post_for_row(post_data, select_first=select_first)
+        except RuntimeError as e:
+            print(f"❌ [エラー] 投稿生成失敗: {e}")
             return jsonify({
                 'success': False,
-                'error': result['error']
+                'error': str(e)
             }), 500
 
         print(f"✅ [成功] 投稿生成完了")
 
-        # Step 3: Auto-select first post if requested
-        selected_post = None
-        if select_first and result.get('post_a'):
-            selected_post = result['post_a']['text']
-            print(f"[INFO] 自動選択: 案A")
-
-        # Step 4: Auto-save if requested
-        if auto_save and selected_post:
-            print(f"[INFO] 自動保存中...")
-
-            save_data = {
-                '作成日時': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                '投稿日': post_data.get('date', ''),
-                'URL': post_data.get('url', ''),
-                '決定事項': post_data.get('decided', ''),
-                '記念日': post_data.get('anniversary', ''),
-                '補足': post_data.get('remarks', ''),
-                '最終投稿': selected_post,
-                '文字数': len(selected_post),
-                '文字数チェック': '✅' if len(selected_post) <= 140 else '❌',
-                'ラウンド数': 1,
-                'Pinecone結果数': len(pinecone_results),
-                '類似投稿数': len(similar_posts)
-            }
-
-            try:
-                # Save to draft sheet (update existing row)
-                sheets_service.save_draft_post(save_data, post_data.get('row'))
-
-                # Save to published sheet (add new row)
-                sheets_service.publish_post(save_data)
-
-                print(f"✅ [成功] 自動保存完了")
-            except Exception as e:
-                print(f"⚠️  自動保存エラー: {e}")
+        if auto_save and result['selected']:
+            save_generated_post(post_data, result)
 
         return jsonify({
             'success': True,
-            'post_a': result.get('post_a'),
-            'post_b': result.get('post_b'),
-            'selected': selected_post,
-            'pinecone_count': len(pinecone_results),
-            'similar_count': len(similar_posts)
+            **result
         }), 200
 
     except Exception as e:
@@ -301,6 +223,176 @@ def process_batch():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+@batch_api_bp.route('/jobs', methods=['POST'])
+def create_job():
+    """
+    Start a server-side batch job
+
+    Rows are generated by the server's worker pool, so the run continues
+    even if the browser tab is closed. Poll /api/batch/jobs/<job_id> for progress.
+
+    Request:
+        {
+            "posts": [...],        # rows from /api/batch/load, or
+            "start_row": 2,        # a row range read from the draft sheet
+            "end_row": 0,
+            "auto_save": false,
+            "skip_errors": true,
+            "select_first": true
+        }
+
+    Response:
+        {
+            "success": true,
+            "job": {"id": "...", "status": "running", "progress": {...}, "items": [...]}
+        }
+    """
+    try:
+        data = request.get_json() or {}
+        posts = data.get('posts')
+
+        if posts is None:
+            try:
+                posts = _read_draft_rows(
+                    int(data.get('start_row', 2)),
+                    int(data.get('end_row', 0))
+                )
+            except ValueError as e:
+                return jsonify({
+                    'success': False,
+                    'error': str(e)
+                }), 400
+
+        if not posts:
+            return jsonify({
+                'success': False,
+                'error': '処理対象の投稿がありません'
+            }), 400
+
+        job = get_service('batch_jobs').create_job(posts, {
+            'auto_save': bool(data.get('auto_save', False)),
+            'skip_errors': bool(data.get('skip_errors', True)),
+            'select_first': bool(data.get('select_first', True))
+        })
+
+        return jsonify({
+            'success': True,
+            'job': job
+        }), 202
+
+    except Exception as e:
+        print(f"[ERROR] ジョブ作成エラー: {str(e)}")
+        traceback.print_exc()
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@batch_api_bp.route('/jobs', methods=['GET'])
+def list_jobs():
+    """
+    List batch jobs (without rows), newest first
+
+    Response:
+        {
+            "success": true,
+            "jobs": [{"id": "...", "status": "...", "progress": {...}}, ...]
+        }
+    """
+    return jsonify({
+        'success': True,
+        'jobs': get_service('batch_jobs').list_jobs()
+    }), 200
+
+
+@batch_api_bp.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """
+    Get job status, progress and per-row results
+
+    Query:
+        items=0 to omit per-row results (progress only)
+
+    Response:
+        {
+            "success": true,
+            "job": {
+                "id": "...",
+                "status": "running" | "completed" | "cancelled",
+                "active": true,      # being processed by this server process
+                "resumable": false,  # has unfinished rows and nobody working on them
+                "progress": {"total", "processed", "percentage", "pending", "running", "done", "failed", "cancelled"},
+                "items": [{"row", "date", ..., "status", "post", "error"}, ...]
+            }
+        }
+    """
+    include_items = request.args.get('items', '1') != '0'
+    job = get_service('batch_jobs').get_job(job_id, include_items=include_items)
+
+    if job is None:
+        return jsonify({'success': False, 'error': f'ジョブが見つかりません: {job_id}'}), 404
+
+    return jsonify({'success': True, 'job': job}), 200
+
+
+@batch_api_bp.route('/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """
+    Cancel a job: rows already being generated finish, the rest are skipped
+
+    Response:
+        {
+            "success": true,
+            "job": {...}
+        }
+    """
+    job = get_service('batch_jobs').cancel_job(job_id)
+
+    if job is None:
+        return jsonify({'success': False, 'error': f'ジョブが見つかりません: {job_id}'}), 404
+
+    return jsonify({'success': True, 'job': job}), 200
+
+
+@batch_api_bp.route('/jobs/<job_id>/resume', methods=['POST'])
+def resume_job(job_id):
+    """
+    Resume an interrupted, failed or cancelled job
+
+    Rows that are already done keep their output and are not sent to
+    Claude again; only pending, interrupted and (optionally) failed rows run.
+
+    Request:
+        {
+            "retry_failed": true
+        }
+
+    Response:
+        {
+            "success": true,
+            "job": {...}
+        }
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+
+        try:
+            job = get_service('batch_jobs').resume_job(
+                job_id,
+                retry_failed=bool(data.get('retry_failed', True))
+            )
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 409
+
+        if job is None:
+            return jsonify({'success': False, 'error': f'ジョブが見つかりません: {job_id}'}), 404
+
+        return jsonify({'success': True, 'job': job}), 200
+
+    except Exception as e:
+        print(f"[ERROR] ジョブ再開エラー: {str(e)}")
+        traceback.print_exc()
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
 @batch_api_bp.route('/export', methods=['POST'])
 def export_results():
     """
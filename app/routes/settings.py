@@ -3,14 +3,11 @@ Settings Routes for PostCrafterPro
 プロンプト設定管理用のルート
 """
 from flask import Blueprint, request, jsonify, render_template
-from app.services.prompt_service import PromptService
+from app.services.registry import get_service, refresh_services, service_names
 import traceback
 
 settings_bp = Blueprint('settings', __name__)
 
-# Initialize prompt service
-prompt_service = PromptService()
-
 
 @settings_bp.route('/settings', methods=['GET'])
 def settings_page():
@@ -33,7 +30,7 @@ def get_prompts():
         }
     """
     try:
-        prompts = prompt_service.get_all_prompts()
+        prompts = get_service('prompt').get_all_prompts()
         return jsonify(prompts), 200
 
     except Exception as e:
@@ -69,7 +66,7 @@ def update_prompts():
             return jsonify({'error': 'prompt_keyとprompt_valueは必須です'}), 400
 
         # Update prompt
-        success = prompt_service.update_prompt(prompt_key, prompt_value)
+        success = get_service('prompt').update_prompt(prompt_key, prompt_value)
 
         if success:
             return jsonify({
@@ -99,7 +96,7 @@ def reset_prompts():
         }
     """
     try:
-        success = prompt_service.reset_to_defaults()
+        success = get_service('prompt').reset_to_defaults()
 
         if success:
             return jsonify({
@@ -140,7 +137,7 @@ def validate_prompt():
         template = data.get('template', '')
         required_vars = data.get('required_vars', [])
 
-        is_valid, error_message = prompt_service.validate_prompt_template(
+        is_valid, error_message = get_service('prompt').validate_prompt_template(
             template, required_vars
         )
 
@@ -153,3 +150,45 @@ def validate_prompt():
         print(f"Error in /api/prompts/validate: {str(e)}")
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
+
+
+@settings_bp.route('/api/services/refresh', methods=['POST'])
+def refresh_shared_services():
+    """
+    共有サービスを破棄し、次回利用時に再生成させる
+
+    シートの追加・認証情報の差し替え・アナリティクスデータの再読み込み時に使用します。
+
+    Request:
+        {
+            "services": ["sheets", "analytics"]  # 省略時はすべて
+        }
+
+    Response:
+        {
+            "success": true,
+            "refreshed": ["analytics", "rag", "sheets"]
+        }
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        names = data.get('services') or []
+
+        unknown = [name for name in names if name not in service_names()]
+        if unknown:
+            return jsonify({
+                'error': f"不明なサービスです: {', '.join(unknown)}",
+                'available': service_names()
+            }), 400
+
+        refreshed = refresh_services(*names)
+
+        return jsonify({
+            'success': True,
+            'refreshed': refreshed
+        }), 200
+
+    except Exception as e:
+        print(f"Error in /api/services/refresh: {str(e)}")
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
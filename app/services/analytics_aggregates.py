@@ -0,0 +1,158 @@
+"""
+Incrementally maintained X Analytics aggregates for PostCrafterPro
+
+The prompt context used to recompute the top-50 content patterns and the
+30-day daily averages on every request. These aggregates are updated row by
+row as new tweet and day rows arrive, so building the context is a lookup.
+"""
+import heapq
+from collections import deque
+
+
+class TopN:
+    """
+    Rows with the N highest values, kept in a min-heap
+
+    Ties keep the earlier row, like a stable descending sort.
+    """
+
+    def __init__(self, n):
+        self.n = n
+        self._heap = []
+
+    def __len__(self):
+        return len(self._heap)
+
+    def push(self, value, row):
+        """Offer one row; it is kept only if it ranks among the top N"""
+        item = (value, -row)
+        if len(self._heap) < self.n:
+            heapq.heappush(self._heap, item)
+        elif item > self._heap[0]:
+            heapq.heapreplace(self._heap, item)
+
+    def rows(self):
+        """Row indices, highest value first"""
+        return [-neg_row for _, neg_row in sorted(self._heap, reverse=True)]
+
+    def clear(self):
+        self._heap = []
+
+
+class RollingWindow:
+    """
+    Running sums over the last N rows
+
+    Rows are (impressions, engagement, engagement_rate) tuples, or None for
+    rows that do not count (no impressions or unparsable). Only counting
+    rows contribute to the sums, but every row occupies a slot.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self._rows = deque()
+        self._sums = [0.0, 0.0, 0.0]
+        self._valid = 0
+
+    def _apply(self, row, sign):
+        if row is None:
+            return
+        for i, value in enumerate(row):
+            self._sums[i] += sign * value
+        self._valid += sign
+
+    def add(self, row):
+        """Append one row, dropping the oldest once the window is full"""
+        self._rows.append(row)
+        self._apply(row, 1)
+        if len(self._rows) > self.size:
+            self._apply(self._rows.popleft(), -1)
+
+    def clear(self):
+        self._rows.clear()
+        self._sums = [0.0, 0.0, 0.0]
+        self._valid = 0
+
+    def summary(self):
+        """
+        Averages over the counting rows in the window
+
+        Returns:
+            dict: Same shape as AnalyticsService.get_daily_performance_trends()
+                ({} if no row counts)
+        """
+        if not self._valid:
+            return {}
+
+        impressions, engagement, engagement_rate = self._sums
+        return {
+            'period_days': self.size,
+            'avg_daily_impressions': impressions / self._valid,
+            'avg_daily_engagement': engagement / self._valid,
+            'avg_engagement_rate': engagement_rate / self._valid,
+            'total_impressions': impressions,
+            'total_engagement': engagement
+        }
+
+
+class AnalyticsAggregates:
+    """
+    Top-N posts by engagement rate and rolling daily averages
+
+    ``version`` changes whenever the tweet aggregates change, so results
+    derived from them can be cached against it.
+    """
+
+    def __init__(self, top_n=50, window_days=30):
+        """
+        Initialize empty aggregates
+
+        Args:
+            top_n: Number of top posts kept by engagement rate
+            window_days: Number of most recent day rows averaged
+        """
+        self.top_posts = TopN(top_n)
+        self.daily = RollingWindow(window_days)
+        self.tweet_rows = 0
+        self.day_rows = 0
+        self.version = 0
+
+    def reset_tweets(self):
+        self.top_posts.clear()
+        self.tweet_rows = 0
+        self.version += 1
+
+    def add_tweets(self, tweets):
+        """
+        Feed the tweet rows that arrived since the last call
+
+        Args:
+            tweets: PostColumns whose first ``tweet_rows`` rows were already fed
+        """
+        if len(tweets) <= self.tweet_rows:
+            return
+
+        engagement_rates = tweets.column('engagement_rate')
+        for row in range(self.tweet_rows, len(tweets)):
+            value = engagement_rates[row]
+            # Same filter as PostColumns.top_k: a metric and some text
+            if value != 0 and tweets.lengths[row] > 0:
+                self.top_posts.push(float(value), row)
+
+        self.tweet_rows = len(tweets)
+        self.version += 1
+
+    def reset_days(self):
+        self.daily.clear()
+        self.day_rows = 0
+
+    def add_days(self, rows):
+        """
+        Feed day rows that arrived since the last call
+
+        Args:
+            rows: Parsed day rows ((impressions, engagement, engagement_rate) or None)
+        """
+        for row in rows:
+            self.daily.add(row)
+        self.day_rows += len(rows)
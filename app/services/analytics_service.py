@@ -3,9 +3,38 @@ X Analytics Service for PostCrafterPro
 Analyze past tweet performance to inform new post creation
 """
 from app.services.sheets_service import SheetsService
+from app.services.sheets_replica import records_from_values
+from app.services.analytics_store import PostColumns
+from app.services.analytics_aggregates import AnalyticsAggregates
+from app.services.emoji_stats import EmojiStatsTable, data_version
+from app.services.embedding_service import top_k_indices
+from app.utils.emoji_tokenizer import TOKENIZER_VERSION, extract_emojis
+import numpy as np
 import statistics
-import re
-from collections import defaultdict
+import threading
+
+
+def _parse_day(day):
+    """
+    Parse one day record for the daily averages
+
+    Args:
+        day: Record from the day sheet
+
+    Returns:
+        tuple or None: (impressions, engagement, engagement_rate), or None
+            if the day has no impressions or a value is not numeric
+    """
+    try:
+        impressions = float(day.get('インプレッション', 0))
+        engagement = float(day.get('エンゲージメント', 0))
+        engagement_rate = float(day.get('エンゲージメント率', 0))
+    except (ValueError, TypeError):
+        return None
+
+    if impressions <= 0:
+        return None
+    return impressions, engagement, engagement_rate
 
 
 class AnalyticsService:
@@ -13,11 +42,27 @@ class AnalyticsService:
     Analyze X (Twitter) analytics data to identify high-performing content patterns
     """
 
-    def __init__(self):
-        """Initialize analytics service"""
-        self.sheets = SheetsService()
-        self.tweet_data = []  # 投稿別データ (tweetシート)
-        self.daily_data = []  # 日次データ (dayシート)
+    def __init__(self, sheets=None):
+        """
+        Initialize analytics service
+
+        Args:
+            sheets: Shared SheetsService (optional, created if omitted)
+        """
+        self.sheets = sheets or SheetsService()
+        self.tweets = PostColumns([])  # 投稿別データ (tweetシート, columnar)
+        self.daily_data = []  # 日次データ (dayシート, parsed rows)
+
+        # Top posts and the 30-day window, updated as new rows arrive
+        self.aggregates = AnalyticsAggregates(top_n=50, window_days=30)
+        self._tweet_source = None  # Post list self.tweets was built from
+        self._day_source = None    # Value matrix self.daily_data was parsed from
+        # Emoji counts / ER sums / medians, versioned by the tweet data
+        self.emoji_stats = EmojiStatsTable()
+        # (aggregates version, key) -> result, cleared when the tweets change
+        self._cache = {}
+        self._lock = threading.RLock()
+
         self._load_analytics()
 
     def _load_analytics(self):
@@ -27,8 +72,8 @@ class AnalyticsService:
             print("[WARN]  Tweet analytics sheet not available")
         else:
             try:
-                self.tweet_data = self.sheets.get_past_posts(limit=None)  # Get all tweets
-                print(f"[OK] Loaded {len(self.tweet_data)} tweets from X analytics")
+                self._sync_tweets()
+                print(f"[OK] Loaded {len(self.tweets)} tweets from X analytics")
             except Exception as e:
                 print(f"[ERROR] Error loading tweet data: {e}")
 
@@ -37,11 +82,79 @@ class AnalyticsService:
             print("[WARN]  Daily analytics sheet not available")
         else:
             try:
-                self.daily_data = self.sheets.get_daily_stats(limit=None)  # Get all days
+                self._sync_days()
                 print(f"[OK] Loaded {len(self.daily_data)} days from X analytics")
             except Exception as e:
                 print(f"[ERROR] Error loading daily data: {e}")
 
+    def _sync(self):
+        """
+        Pick up tweet and day rows that arrived since the last call
+
+        Cheap when the sheets did not change: the replica hands back the
+        same snapshot and nothing is recomputed.
+        """
+        with self._lock:
+            if self.sheets.analytics_sheet:
+                try:
+                    self._sync_tweets()
+                except Exception as e:
+                    print(f"[WARN] Tweet analytics refresh failed: {e}")
+            if self.sheets.analytics_day_sheet:
+                try:
+                    self._sync_days()
+                except Exception as e:
+                    print(f"[WARN] Daily analytics refresh failed: {e}")
+
+    def _sync_tweets(self):
+        """Rebuild the tweet columns on a new snapshot; feed only appended rows to the aggregates"""
+        posts = self.sheets.get_posts(limit=None, source='tweet')
+        if posts is self._tweet_source:
+            return
+
+        previous = self.tweets
+        self.tweets = PostColumns(posts)
+        self._tweet_source = posts
+
+        if not previous.is_prefix_of(self.tweets):
+            # Rows were edited or removed (e.g. metrics updated) - start over
+            self.aggregates.reset_tweets()
+        self.aggregates.add_tweets(self.tweets)
+        self._cache = {}
+
+    def _sync_days(self):
+        """Parse only the day rows appended since the last snapshot"""
+        values = self.sheets.read_values('day')
+        if values is self._day_source:
+            return
+
+        previous = self._day_source or []
+        parsed = len(self.daily_data)
+        appended = (
+            previous and len(values) >= len(previous)
+            and values[:len(previous)] == previous
+        )
+        if not appended:
+            self.daily_data = []
+            self.aggregates.reset_days()
+            parsed = 0
+
+        new_rows = []
+        if values:
+            new_rows = [_parse_day(day) for day in records_from_values([values[0]] + values[1 + parsed:])]
+        self.daily_data.extend(new_rows)
+        self.aggregates.add_days(new_rows)
+        self._day_source = values
+
+    def _cached(self, key, compute):
+        """Result of compute() cached until the tweet aggregates change"""
+        cache_key = (self.aggregates.version, key)
+        if cache_key not in self._cache:
+            if len(self._cache) > 256:
+                self._cache = {}
+            self._cache[cache_key] = compute()
+        return self._cache[cache_key]
+
     def get_top_performing_posts(self, limit=10, metric='エンゲージメント率'):
         """
         Get top performing posts by specified metric
@@ -51,30 +164,16 @@ class AnalyticsService:
             metric: Metric to sort by ('エンゲージメント率', 'インプレッション', 'エンゲージメント', 'いいね')
 
         Returns:
-            list: Top performing posts
+            list: Top performing posts (Post records)
         """
-        if not self.tweet_data:
+        self._sync()
+        if not len(self.tweets):
             return []
 
         try:
-            # Filter posts with valid metrics
-            valid_posts = [
-                post for post in self.tweet_data
-                if post.get(metric) and post.get('ツイート本文')
-            ]
-
-            # Convert metric to float for sorting
-            for post in valid_posts:
-                try:
-                    post['_sort_value'] = float(post[metric])
-                except (ValueError, TypeError):
-                    post['_sort_value'] = 0
-
-            # Sort by metric (descending)
-            sorted_posts = sorted(valid_posts, key=lambda x: x['_sort_value'], reverse=True)
-
-            # Return top N
-            return sorted_posts[:limit]
+            # Top N by metric (descending), skipping posts without text or metric
+            rows = self.tweets.top_k(metric, limit)
+            return [self.tweets.post(i) for i in rows]
 
         except Exception as e:
             print(f"Error getting top posts: {e}")
@@ -88,11 +187,22 @@ class AnalyticsService:
             top_n: Number of top posts to analyze
 
         Returns:
-            dict: Analysis results
+            dict: Analysis results (shared cached dict - do not modify)
         """
-        top_posts = self.get_top_performing_posts(limit=top_n)
+        self._sync()
+        return self._cached(('patterns', top_n), lambda: self._analyze_content_patterns(top_n))
+
+    def _analyze_content_patterns(self, top_n):
+        """Compute analyze_content_patterns() from the maintained top-N heap"""
+        tweets = self.tweets
+        if top_n <= self.aggregates.top_posts.n:
+            rows = np.array(self.aggregates.top_posts.rows()[:top_n], dtype=np.int64)
+        elif len(tweets):
+            rows = tweets.top_k('engagement_rate', top_n)
+        else:
+            rows = np.empty(0, dtype=np.int64)
 
-        if not top_posts:
+        if not rows.size:
             return {}
 
         analysis = {
@@ -101,54 +211,27 @@ class AnalyticsService:
             'has_hashtag_percentage': 0,
             'common_themes': [],
             'average_engagement_rate': 0,
+            'median_engagement_rate': 0,
             'sample_posts': []
         }
 
-        # Calculate averages
-        lengths = []
-        engagement_rates = []
-        has_url_count = 0
-        has_hashtag_count = 0
-
-        for post in top_posts:
-            text = post.get('ツイート本文', '')
-
-            # Length
-            lengths.append(len(text))
-
-            # Engagement rate
-            try:
-                engagement_rate = float(post.get('エンゲージメント率', 0))
-                engagement_rates.append(engagement_rate)
-            except (ValueError, TypeError):
-                pass
-
-            # Has URL
-            if 'http' in text:
-                has_url_count += 1
-
-            # Has hashtag
-            if '#' in text:
-                has_hashtag_count += 1
-
-        # Calculate statistics
-        if lengths:
-            analysis['average_length'] = int(statistics.mean(lengths))
-        if engagement_rates:
-            analysis['average_engagement_rate'] = statistics.mean(engagement_rates)
-        analysis['has_url_percentage'] = (has_url_count / len(top_posts)) * 100
-        analysis['has_hashtag_percentage'] = (has_hashtag_count / len(top_posts)) * 100
+        # Calculate statistics (vectorized over the selected rows)
+        analysis['average_length'] = int(tweets.lengths[rows].mean())
+        analysis['average_engagement_rate'] = tweets.mean('engagement_rate', rows)
+        analysis['median_engagement_rate'] = tweets.median('engagement_rate', rows)
+        analysis['has_url_percentage'] = float(tweets.has_url[rows].mean()) * 100
+        analysis['has_hashtag_percentage'] = float(tweets.has_hashtag[rows].mean()) * 100
 
         # Sample top 5 posts
         analysis['sample_posts'] = [
             {
-                'text': post.get('ツイート本文', ''),
-                'engagement_rate': post.get('エンゲージメント率', 0),
-                'impressions': post.get('インプレッション', 0),
-                'likes': post.get('いいね', 0),
-                'retweets': post.get('リツイート', 0)
+                'text': post.text,
+                'engagement_rate': post.engagement_rate,
+                'impressions': post.impressions,
+                'likes': post.likes,
+                'retweets': post.retweets
             }
-            for post in top_posts[:5]
+            for post in (tweets.post(i) for i in rows[:5])
         ]
 
         return analysis
@@ -162,32 +245,21 @@ class AnalyticsService:
             limit: Number of results
 
         Returns:
-            list: Similar high-performing posts
+            list: Similar high-performing posts (Post records)
         """
-        if not self.tweet_data:
+        self._sync()
+        if not len(self.tweets) or not keyword:
             return []
 
-        try:
-            # Filter posts containing keyword
-            matching_posts = [
-                post for post in self.tweet_data
-                if keyword and keyword.lower() in post.get('ツイート本文', '').lower()
-            ]
-
-            # Sort by engagement rate
-            for post in matching_posts:
-                try:
-                    post['_engagement_rate'] = float(post.get('エンゲージメント率', 0))
-                except (ValueError, TypeError):
-                    post['_engagement_rate'] = 0
-
-            sorted_posts = sorted(
-                matching_posts,
-                key=lambda x: x['_engagement_rate'],
-                reverse=True
-            )
+        return self._cached(('similar', keyword, limit), lambda: self._find_similar_high_performers(keyword, limit))
 
-            return sorted_posts[:limit]
+    def _find_similar_high_performers(self, keyword, limit):
+        """Uncached find_similar_high_performers()"""
+        try:
+            # Posts containing keyword, highest engagement rate first
+            rows = self.tweets.find(keyword)
+            order = top_k_indices(self.tweets.column('engagement_rate')[rows], limit)
+            return [self.tweets.post(i) for i in rows[order]]
 
         except Exception as e:
             print(f"Error finding similar posts: {e}")
@@ -203,47 +275,29 @@ class AnalyticsService:
         Returns:
             dict: Daily performance trends
         """
-        if not self.daily_data:
-            return {}
-
-        try:
-            recent_days = self.daily_data[-days:] if len(self.daily_data) > days else self.daily_data
-
-            # Calculate averages
-            total_impressions = 0
-            total_engagement = 0
-            total_engagement_rate = 0
-            valid_days = 0
+        self._sync()
 
-            for day in recent_days:
-                try:
-                    impressions = float(day.get('インプレッション', 0))
-                    engagement = float(day.get('エンゲージメント', 0))
-                    engagement_rate = float(day.get('エンゲージメント率', 0))
+        # The default window is maintained as rows arrive
+        if days == self.aggregates.daily.size:
+            return self.aggregates.daily.summary()
 
-                    if impressions > 0:
-                        total_impressions += impressions
-                        total_engagement += engagement
-                        total_engagement_rate += engagement_rate
-                        valid_days += 1
-                except (ValueError, TypeError):
-                    continue
+        recent_days = [day for day in self.daily_data[-days:] if day is not None]
+        if not recent_days:
+            return {}
 
-            if valid_days == 0:
-                return {}
+        total_impressions = sum(day[0] for day in recent_days)
+        total_engagement = sum(day[1] for day in recent_days)
+        total_engagement_rate = sum(day[2] for day in recent_days)
+        valid_days = len(recent_days)
 
-            return {
-                'period_days': days,
-                'avg_daily_impressions': total_impressions / valid_days,
-                'avg_daily_engagement': total_engagement / valid_days,
-                'avg_engagement_rate': total_engagement_rate / valid_days,
-                'total_impressions': total_impressions,
-                'total_engagement': total_engagement
-            }
-
-        except Exception as e:
-            print(f"Error analyzing daily trends: {e}")
-            return {}
+        return {
+            'period_days': days,
+            'avg_daily_impressions': total_impressions / valid_days,
+            'avg_daily_engagement': total_engagement / valid_days,
+            'avg_engagement_rate': total_engagement_rate / valid_days,
+            'total_impressions': total_impressions,
+            'total_engagement': total_engagement
+        }
 
     def get_performance_insights(self, theme=None):
         """
@@ -297,9 +351,9 @@ class AnalyticsService:
             if similar_posts:
                 insights['top_examples'] = [
                     {
-                        'text': post.get('ツイート本文', ''),
-                        'engagement_rate': post.get('エンゲージメント率', 0),
-                        'impressions': post.get('インプレッション', 0)
+                        'text': post.text,
+                        'engagement_rate': post.engagement_rate,
+                        'impressions': post.impressions
                     }
                     for post in similar_posts
                 ]
@@ -364,11 +418,7 @@ class AnalyticsService:
         if top_examples:
             context_parts.append("《類似テーマの高パフォーマンス投稿例》")
             for i, example in enumerate(top_examples, 1):
-                engagement_rate = example.get('engagement_rate', 0)
-                try:
-                    engagement_pct = float(engagement_rate) * 100
-                except (ValueError, TypeError):
-                    engagement_pct = 0
+                engagement_pct = example['engagement_rate'] * 100
                 context_parts.append(
                     f"{i}. (エンゲージメント率: {engagement_pct:.2f}%, "
                     f"インプレッション: {example.get('impressions', 0):.0f})"
@@ -381,14 +431,10 @@ class AnalyticsService:
         if sample_posts and not top_examples:  # Only if no theme-specific examples
             context_parts.append("《全体の高パフォーマンス投稿例（Top 3）》")
             for i, post in enumerate(sample_posts[:3], 1):
-                engagement_rate = post.get('engagement_rate', 0)
-                try:
-                    engagement_pct = float(engagement_rate) * 100
-                except (ValueError, TypeError):
-                    engagement_pct = 0
+                engagement_pct = post['engagement_rate'] * 100
                 context_parts.append(
                     f"{i}. (エンゲージメント率: {engagement_pct:.2f}%, "
-                    f"いいね: {post.get('likes', 0)})"
+                    f"いいね: {post['likes']:.0f})"
                 )
                 context_parts.append(f"   {post['text'][:120]}")
 
@@ -398,96 +444,66 @@ class AnalyticsService:
         """
         Extract all emojis from text
 
+        ZWJ sequences, skin tones, flags and keycaps count as one emoji each
+        (see app.utils.emoji_tokenizer).
+
         Args:
             text: Text to extract emojis from
 
         Returns:
             list: List of emojis found in text
         """
-        if not text:
-            return []
+        return extract_emojis(text)
 
-        # Unicode emoji ranges
-        emoji_pattern = re.compile(
-            "["
-            "\U0001F600-\U0001F64F"  # emoticons
-            "\U0001F300-\U0001F5FF"  # symbols & pictographs
-            "\U0001F680-\U0001F6FF"  # transport & map symbols
-            "\U0001F1E0-\U0001F1FF"  # flags (iOS)
-            "\U00002702-\U000027B0"  # dingbats
-            "\U000024C2-\U0001F251"  # enclosed characters
-            "\U0001F900-\U0001F9FF"  # supplemental symbols
-            "\U0001FA00-\U0001FA6F"  # extended symbols
-            "\U00002600-\U000026FF"  # miscellaneous symbols
-            "]+",
-            flags=re.UNICODE
-        )
+    def _emoji_table(self):
+        """
+        Get the emoji statistics table for the current tweets
 
-        emojis = emoji_pattern.findall(text)
-        return emojis
+        The table is rebuilt (or loaded from disk) only when the tweet texts
+        or engagement rates changed.
 
-    def analyze_emoji_performance(self, min_occurrences=5):
+        Returns:
+            EmojiStatsTable: Table matching the loaded tweets
+        """
+        self._sync()
+        version = self._cached(('data_version',), lambda: data_version(self.tweets, TOKENIZER_VERSION))
+        self.emoji_stats.ensure(self.tweets, self._extract_emojis, version)
+        return self.emoji_stats
+
+    def analyze_emoji_performance(self, min_occurrences=5, theme=None):
         """
         Analyze emoji performance based on X Analytics data
 
         Args:
             min_occurrences: Minimum number of times an emoji must appear to be included
+            theme: Optional hashtag to analyze only posts with that hashtag
 
         Returns:
             dict: {
                 'top_emojis': [(emoji, avg_engagement_rate, count), ...],
                 'low_emojis': [(emoji, avg_engagement_rate, count), ...],
-                'emoji_stats': {emoji: {'avg_er': float, 'count': int, 'total_er': float}}
+                'emoji_stats': {emoji: {'avg_er': float, 'count': int, 'total_er': float, 'median_er': float}}
             }
         """
+        table = self._emoji_table()
+        return self._cached(
+            ('emoji_performance', min_occurrences, theme),
+            lambda: self._analyze_emoji_performance(table, min_occurrences, theme)
+        )
+
+    def _analyze_emoji_performance(self, table, min_occurrences, theme):
+        """Rank emojis from the statistics table (see analyze_emoji_performance)"""
         print(f"\n[INFO] 絵文字パフォーマンス分析を開始...")
-        print(f"   分析対象: {len(self.tweet_data)}件の投稿")
+        print(f"   分析対象: {len(self.tweets)}件の投稿" + (f" (テーマ: {theme})" if theme else ""))
 
-        if not self.tweet_data:
+        if not len(self.tweets):
             print(f"[WARN]  分析データがありません")
             return {'top_emojis': [], 'low_emojis': [], 'emoji_stats': {}}
 
-        # Collect emoji usage with engagement rates
-        emoji_data = defaultdict(lambda: {'total_er': 0, 'count': 0, 'posts': []})
-
-        for post in self.tweet_data:
-            text = post.get('ツイート本文', '')
-            if not text:
-                continue
+        print(f"[INFO] 発見した絵文字の種類: {len(table.stats)}種類")
 
-            # Get engagement rate
-            try:
-                engagement_rate = float(post.get('エンゲージメント率', 0))
-            except (ValueError, TypeError):
-                continue
-
-            if engagement_rate == 0:
-                continue
-
-            # Extract emojis
-            emojis = self._extract_emojis(text)
-
-            # Record each emoji's performance
-            for emoji in set(emojis):  # Use set to avoid duplicates in same post
-                emoji_data[emoji]['total_er'] += engagement_rate
-                emoji_data[emoji]['count'] += 1
-                emoji_data[emoji]['posts'].append({
-                    'text': text[:100],
-                    'er': engagement_rate
-                })
-
-        print(f"[INFO] 発見した絵文字の種類: {len(emoji_data)}種類")
-
-        # Calculate average engagement rate for each emoji
-        emoji_stats = {}
-        for emoji, data in emoji_data.items():
-            if data['count'] >= min_occurrences:
-                avg_er = data['total_er'] / data['count']
-                emoji_stats[emoji] = {
-                    'avg_er': avg_er,
-                    'count': data['count'],
-                    'total_er': data['total_er']
-                }
+        # Average engagement rate for each emoji (precomputed counts and sums)
+        emoji_stats = table.ranked(min_occurrences=min_occurrences, theme=theme)
 
         print(f"[INFO] 最低出現回数{min_occurrences}回以上の絵文字: {len(emoji_stats)}種類")
 
@@ -529,13 +545,17 @@ class AnalyticsService:
             'median_er': median_er
         }
 
-    def get_emoji_guidelines(self, min_occurrences=5, top_n=15):
+    def get_emoji_guidelines(self, min_occurrences=5, top_n=15, theme=None):
         """
         Generate emoji usage guidelines based on X Analytics performance
 
+        Answered from the precomputed emoji table; the formatted result is
+        cached until the analytics data changes.
+
         Args:
             min_occurrences: Minimum number of times an emoji must appear
             top_n: Number of top emojis to include in recommendations
+            theme: Optional hashtag to base the guidelines on
 
         Returns:
             dict: {
@@ -550,10 +570,15 @@ class AnalyticsService:
                 'guidelines_text': str  # Formatted text for Claude prompt
             }
         """
-        print(f"\n[INFO] 絵文字ガイドライン生成中...")
+        analysis = self.analyze_emoji_performance(min_occurrences=min_occurrences, theme=theme)
+        return self._cached(
+            ('emoji_guidelines', min_occurrences, top_n, theme),
+            lambda: self._format_emoji_guidelines(analysis, min_occurrences, top_n)
+        )
 
-        # Analyze performance
-        analysis = self.analyze_emoji_performance(min_occurrences=min_occurrences)
+    def _format_emoji_guidelines(self, analysis, min_occurrences, top_n):
+        """Build get_emoji_guidelines() output from an emoji analysis"""
+        print(f"\n[INFO] 絵文字ガイドライン生成中...")
 
         if not analysis['emoji_stats']:
             return {
@@ -608,7 +633,7 @@ class AnalyticsService:
             )
 
         guidelines_parts.append("")
-        guidelines_parts.append(f"※ 分析データ: {len(self.tweet_data)}件の投稿")
+        guidelines_parts.append(f"※ 分析データ: {len(self.tweets)}件の投稿")
         guidelines_parts.append(f"※ 最低出現回数: {min_occurrences}回")
 
         guidelines_text = "\n".join(guidelines_parts)
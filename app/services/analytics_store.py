@@ -0,0 +1,167 @@
+"""
+Columnar store of X Analytics posts for PostCrafterPro
+
+Metrics live in one NumPy array per column and texts in one string with
+an offsets array, so top-k selections, averages and medians are single
+vectorized operations over data that was parsed once at load.
+"""
+import numpy as np
+
+from app.services.embedding_service import top_k_indices
+from app.services.post_record import METRIC_FIELDS, Post, metric_attr
+
+
+# Separates texts in the keyword-search blob so a match never spans two posts
+_TEXT_SEPARATOR = '\x00'
+
+
+class PostColumns:
+    """
+    Immutable column arrays built from a list of Post records
+
+    Row i of every array belongs to the same post. Rows are never updated
+    in place; a new snapshot builds a new store.
+    """
+
+    def __init__(self, posts):
+        """
+        Build the columns
+
+        Args:
+            posts: List of Post records (e.g. SheetsService.get_posts())
+        """
+        texts = [post.text for post in posts]
+
+        self.columns = {
+            attr: np.fromiter((getattr(post, attr) for post in posts), dtype=np.float64, count=len(posts))
+            for attr in METRIC_FIELDS.values()
+        }
+        self.dates = [post.date for post in posts]
+        self.raws = [post.raw for post in posts]
+
+        # Texts as one string + offsets: text i is text_blob[offsets[i]:offsets[i + 1]]
+        self.text_blob = ''.join(texts)
+        self.offsets = np.zeros(len(texts) + 1, dtype=np.int64)
+        np.cumsum([len(text) for text in texts], out=self.offsets[1:])
+        self.lengths = np.diff(self.offsets)
+
+        # Lowercased copy for keyword search, separated so matches stay inside one post
+        lowered = [text.lower() for text in texts]
+        self._search_blob = _TEXT_SEPARATOR.join(lowered)
+        self._search_starts = np.zeros(len(lowered), dtype=np.int64)
+        if lowered:
+            np.cumsum([len(text) + 1 for text in lowered[:-1]], out=self._search_starts[1:])
+
+        self.has_url = np.fromiter(('http' in text for text in texts), dtype=bool, count=len(texts))
+        self.has_hashtag = np.fromiter(('#' in text for text in texts), dtype=bool, count=len(texts))
+
+    def __len__(self):
+        return self.lengths.shape[0]
+
+    def is_prefix_of(self, other):
+        """
+        Whether every row of this store appears unchanged at the start of other
+
+        Args:
+            other: Newer PostColumns
+
+        Returns:
+            bool: True if other only appends rows to this store
+        """
+        n = len(self)
+        if n > len(other):
+            return False
+        if not n:
+            return True
+        return (
+            np.array_equal(self.offsets, other.offsets[:n + 1])
+            and other.text_blob.startswith(self.text_blob)
+            and all(np.array_equal(values, other.columns[attr][:n]) for attr, values in self.columns.items())
+        )
+
+    def text(self, i):
+        """Text of row i"""
+        return self.text_blob[self.offsets[i]:self.offsets[i + 1]]
+
+    def column(self, metric):
+        """
+        Values of a metric
+
+        Args:
+            metric: Column name (e.g. 'エンゲージメント率') or Post attribute
+                (e.g. 'engagement_rate')
+
+        Returns:
+            numpy.ndarray: float64 values, one per row
+        """
+        attr = metric if metric in self.columns else metric_attr(metric)
+        return self.columns[attr]
+
+    def post(self, i):
+        """Rebuild the Post record of row i"""
+        metrics = {attr: float(values[i]) for attr, values in self.columns.items()}
+        return Post(self.text(i), self.dates[i], raw=self.raws[i], **metrics)
+
+    def top_k(self, metric, k, rows=None):
+        """
+        Rows with the highest values of a metric
+
+        Rows with an empty text or a zero metric are skipped.
+
+        Args:
+            metric: Column name or Post attribute
+            k: Number of rows to return
+            rows: Optional array of row indices to select from
+
+        Returns:
+            numpy.ndarray: Row indices, highest value first
+        """
+        values = self.column(metric)
+        if rows is None:
+            rows = np.flatnonzero((values != 0) & (self.lengths > 0))
+        else:
+            rows = np.asarray(rows, dtype=np.int64)
+            rows = rows[(values[rows] != 0) & (self.lengths[rows] > 0)]
+
+        order = top_k_indices(values[rows], k)
+        return rows[order]
+
+    def mean(self, metric, rows=None):
+        """Mean of a metric over rows (all rows if None); 0.0 if empty"""
+        values = self.column(metric)
+        if rows is not None:
+            values = values[rows]
+        return float(values.mean()) if values.size else 0.0
+
+    def median(self, metric, rows=None):
+        """Median of a metric over rows (all rows if None); 0.0 if empty"""
+        values = self.column(metric)
+        if rows is not None:
+            values = values[rows]
+        return float(np.median(values)) if values.size else 0.0
+
+    def find(self, keyword):
+        """
+        Rows whose text contains a keyword (case-insensitive)
+
+        Args:
+            keyword: Keyword to search for
+
+        Returns:
+            numpy.ndarray: Matching row indices in row order
+        """
+        keyword = keyword.lower()
+        if not keyword or not len(self) or _TEXT_SEPARATOR in keyword:
+            return np.empty(0, dtype=np.int64)
+
+        rows = []
+        start = self._search_blob.find(keyword)
+        while start != -1:
+            row = int(np.searchsorted(self._search_starts, start, side='right')) - 1
+            rows.append(row)
+            # Continue from the start of the next post
+            if row + 1 >= len(self):
+                break
+            start = self._search_blob.find(keyword, int(self._search_starts[row + 1]))
+
+        return np.array(rows, dtype=np.int64)
@@ -0,0 +1,496 @@
+"""
+Server-side batch job engine for PostCrafterPro
+
+Batch generation used to be driven by the browser, one /api/batch/process
+request per row: closing the tab stopped the run and rows were processed
+strictly one after another. Jobs now run on a worker pool inside the server
+and the page only polls their progress. Row state is kept in
+BatchJobStore, so an interrupted job can be resumed.
+"""
+import os
+import socket
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from app.services.batch_job_store import (
+    BatchJobStore, PENDING, RUNNING, DONE, FAILED, CANCELLED
+)
+from app.services.registry import get_service
+from app.utils.tweet_length import check_tweet_length
+
+# Error messages that are worth retrying after a pause
+RETRYABLE_ERRORS = ('rate_limit', 'rate limit', '429', 'overloaded', '529', 'timeout', 'timed out')
+
+
+def generate_post_for_row(post, select_first=True):
+    """
+    Generate the two post options for one draft row
+
+    Args:
+        post: Row data {'row', 'date', 'url', 'decided', 'anniversary', 'remarks'}
+        select_first: Select post_a automatically
+
+    Returns:
+        dict: {
+            'post_a': {...},
+            'post_b': {...},
+            'selected': str or None,
+            'pinecone_count': int,
+            'similar_count': int
+        }
+
+    Raises:
+        RuntimeError: If Claude returned an error
+    """
+    print(f"[INFO] 行{post.get('row')}: コンテキスト取得中...")
+    context = get_service('rag').get_comprehensive_context(
+        url=post.get('url') or None,
+        decided=post.get('decided', ''),
+        anniversary=post.get('anniversary') or None
+    )
+    pinecone_results = context.get('pinecone_results', [])
+    similar_posts = context.get('similar_posts', [])
+
+    print(f"[INFO] 行{post.get('row')}: 投稿生成中...")
+    result = get_service('claude').create_sns_post_with_context(
+        date=post.get('date', ''),
+        decided=post.get('decided', ''),
+        url=post.get('url', ''),
+        remarks=post.get('remarks', ''),
+        anniversary=post.get('anniversary', ''),
+        pinecone_context=pinecone_results,
+        similar_posts=similar_posts,
+        analytics_insights=context.get('analytics_insights')
+    )
+
+    if 'error' in result:
+        raise RuntimeError(result['error'])
+
+    selected_post = None
+    if select_first and result.get('post_a'):
+        selected_post = result['post_a']['text']
+
+    return {
+        'post_a': result.get('post_a'),
+        'post_b': result.get('post_b'),
+        'selected': selected_post,
+        'pinecone_count': len(pinecone_results),
+        'similar_count': len(similar_posts)
+    }
+
+
+def save_generated_post(post, result, buffer=None, callback=None):
+    """
+    Save the selected post to the draft and published sheets
+
+    Args:
+        post: Row data the post was generated for
+        result: Return value of generate_post_for_row
+        buffer: SheetsWriteBuffer to queue both writes in (optional)
+        callback: With a buffer, called with True/False once both writes
+            have been flushed
+
+    Returns:
+        bool or None: True if both sheets were written, None if queued
+    """
+    selected_post = result.get('selected')
+    if not selected_post:
+        return False
+
+    save_data = {
+        '作成日時': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        '投稿日': post.get('date', ''),
+        'URL': post.get('url', ''),
+        '決定事項': post.get('decided', ''),
+        '記念日': post.get('anniversary', ''),
+        '補足': post.get('remarks', ''),
+        '最終投稿': selected_post,
+        '文字数': len(selected_post),
+        # Same rule as is_valid in the UI: X's weighted length (全角140字 / 半角280字)
+        '文字数チェック': '✅' if check_tweet_length(selected_post)[1] else '❌',
+        'ラウンド数': 1,
+        'Pinecone結果数': result.get('pinecone_count', 0),
+        '類似投稿数': result.get('similar_count', 0)
+    }
+
+    if buffer is not None:
+        outcomes = []
+
+        def on_flushed(ok):
+            outcomes.append(ok)
+            if len(outcomes) == 2 and callback is not None:
+                callback(all(outcomes))
+
+        sheets_service = get_service('sheets')
+        sheets_service.save_draft_post(save_data, post.get('row'), buffer=buffer, callback=on_flushed)
+        sheets_service.publish_post(save_data, buffer=buffer, callback=on_flushed)
+        return None
+
+    try:
+        sheets_service = get_service('sheets')
+        # Save to draft sheet (update existing row)
+        sheets_service.save_draft_post(save_data, post.get('row'))
+        # Save to published sheet (add new row)
+        sheets_service.publish_post(save_data)
+        print(f"✅ 行{post.get('row')}: 自動保存完了")
+        return True
+    except Exception as e:
+        print(f"⚠️  行{post.get('row')}: 自動保存エラー: {e}")
+        return False
+
+
+class BatchJobService:
+    """
+    Runs batch jobs on a fixed pool of worker threads
+
+    Every row of a job is one task. Claude requests from all workers go
+    through the ClaudeService rate limiter, and rows that hit a rate limit
+    or overload error are retried after a pause instead of failing the job.
+    Row state and output live in BatchJobStore, so finished rows survive a
+    restart and resume_job only runs what is left.
+    """
+
+    def __init__(self, max_workers=None, store=None):
+        """
+        Initialize the worker pool
+
+        Args:
+            max_workers: Number of rows generated concurrently
+                (default: BATCH_MAX_WORKERS or 3)
+            store: BatchJobStore (optional, created if omitted)
+        """
+        self.max_workers = max_workers or int(os.getenv('BATCH_MAX_WORKERS', '3'))
+        self.max_retries = int(os.getenv('BATCH_MAX_RETRIES', '2'))
+        self.retry_pause = float(os.getenv('BATCH_RETRY_PAUSE', '30'))
+
+        self.store = store or BatchJobStore()
+
+        # Identifies this process in the shared store; its jobs are leased
+        # for lease_seconds and renewed by a heartbeat thread
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self.lease_seconds = float(os.getenv('BATCH_LEASE_SECONDS', '120'))
+
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers,
+            thread_name_prefix='batch-worker'
+        )
+        # job_id -> number of tasks queued or running in this process
+        self._outstanding = {}
+        self._lock = threading.Lock()
+
+        self._heartbeat_thread = threading.Thread(
+            target=self._heartbeat_loop, name='batch-heartbeat', daemon=True
+        )
+        self._heartbeat_thread.start()
+
+        print(f"[OK] Batch job service initialized ({self.max_workers} workers)")
+
+    def _heartbeat_loop(self):
+        """Renew the leases of the jobs this process is working on"""
+        interval = max(1.0, self.lease_seconds / 4)
+        while True:
+            time.sleep(interval)
+            with self._lock:
+                job_ids = list(self._outstanding)
+            try:
+                self.store.heartbeat(self.owner, job_ids)
+            except Exception as e:
+                print(f"[WARN] バッチジョブのハートビート更新に失敗: {e}")
+
+    def create_job(self, posts, options=None):
+        """
+        Store one pending row per post and start processing
+
+        Args:
+            posts: Rows returned by /api/batch/load
+            options: {'auto_save': bool, 'skip_errors': bool, 'select_first': bool}
+
+        Returns:
+            dict: Job snapshot (see get_job)
+        """
+        options = {
+            'auto_save': False,
+            'skip_errors': True,
+            'select_first': True,
+            **(options or {})
+        }
+
+        job_id = uuid.uuid4().hex[:12]
+        self.store.create_job(job_id, posts, options, owner=self.owner)
+
+        print(f"[BATCH] ジョブ {job_id} 開始: {len(posts)}件 / {self.max_workers}並列")
+
+        self._enqueue(job_id, range(len(posts)))
+        return self.get_job(job_id)
+
+    def resume_job(self, job_id, retry_failed=True):
+        """
+        Continue an interrupted, failed or cancelled job
+
+        Done rows keep their output and are not regenerated. Rows that were
+        running in a process whose lease expired go back to pending; if their
+        Claude output was already checkpointed only the sheet save is redone.
+        With auto_save, done rows whose sheet write failed or never landed
+        are saved again.
+
+        Args:
+            job_id: Job id
+            retry_failed: Also retry rows that failed
+
+        Returns:
+            dict or None: Job snapshot, None if the job does not exist
+
+        Raises:
+            ValueError: If the job is still running in this or another process
+        """
+        job = self.store.get_job(job_id)
+        if job is None:
+            return None
+
+        with self._lock:
+            if job_id in self._outstanding:
+                raise ValueError('ジョブは実行中です')
+            indices = self.store.reopen_job(
+                job_id,
+                owner=self.owner,
+                lease_seconds=self.lease_seconds,
+                retry_failed=retry_failed,
+                retry_unsaved=job['options']['auto_save']
+            )
+            if indices is None:
+                raise ValueError('ジョブは別のワーカーで実行中です')
+
+        print(f"[BATCH] ジョブ {job_id} 再開: 残り{len(indices)}件")
+
+        self._enqueue(job_id, indices)
+        return self.get_job(job_id)
+
+    def _enqueue(self, job_id, indices):
+        """Submit one worker task per row index"""
+        indices = list(indices)
+        with self._lock:
+            if indices:
+                self._outstanding[job_id] = self._outstanding.get(job_id, 0) + len(indices)
+            else:
+                self._finish_if_complete(job_id)
+
+        for idx in indices:
+            self._executor.submit(self._run_item, job_id, idx)
+
+    def _run_item(self, job_id, idx):
+        """Worker task: claim one row and process it"""
+        job = None
+        try:
+            job = self.store.get_job(job_id)
+            if job is None or job['cancel_requested']:
+                return
+
+            claimed = self.store.claim_item(job_id, idx, owner=self.owner)
+            if claimed is None:
+                return
+
+            self._process_item(job, idx, claimed['post'], claimed['output'])
+
+        except Exception as e:
+            print(f"[ERROR] ジョブ {job_id}: 行処理エラー: {e}")
+            traceback.print_exc()
+            self.store.finish_item(job_id, idx, FAILED, str(e))
+
+        finally:
+            with self._lock:
+                self._outstanding[job_id] -= 1
+                last = self._outstanding[job_id] == 0
+
+            if last:
+                # Flush while the job still counts as active so a resume
+                # cannot re-queue rows whose writes are still buffered
+                if job is not None and job['options']['auto_save']:
+                    self._flush_writes()
+
+                with self._lock:
+                    if self._outstanding.get(job_id) == 0:
+                        del self._outstanding[job_id]
+                        self.store.release_job(job_id, self.owner)
+                    self._finish_if_complete(job_id)
+
+    @staticmethod
+    def _flush_writes():
+        """Push buffered sheet writes out at the end of a job"""
+        try:
+            get_service('sheets').write_buffer.flush()
+        except Exception as e:
+            print(f"[WARN] Sheets書き込みバッファのフラッシュに失敗: {e}")
+
+    def _process_item(self, job, idx, post, output):
+        """Generate (unless checkpointed), save, and record one row"""
+        job_id = job['id']
+        options = job['options']
+
+        if output is None:
+            output, error = self._generate_with_retry(job_id, idx, post, options)
+
+            if error is not None:
+                self.store.finish_item(job_id, idx, FAILED, error)
+                print(f"❌ [BATCH] ジョブ {job_id}: 行{post.get('row')} 失敗: {error}")
+                if not options['skip_errors']:
+                    self.store.cancel_pending(job_id)
+                return
+
+            # Checkpoint before touching the sheets so a crash never re-bills Claude
+            self.store.save_output(job_id, idx, output)
+        else:
+            print(f"[INFO] ジョブ {job_id}: 行{post.get('row')} 生成済みの出力を再利用")
+
+        if options['auto_save'] and output.get('selected') and output.get('saved') is not True:
+            # Recorded before queuing: if the process stops before the flush,
+            # saved stays false and a resume saves the row again
+            output['saved'] = False
+            self.store.save_output(job_id, idx, output)
+
+            def on_saved(ok):
+                output['saved'] = ok
+                self.store.save_output(job_id, idx, output)
+
+            # Queued; appends and updates from all rows go out together
+            save_generated_post(
+                post, output,
+                buffer=get_service('sheets').write_buffer,
+                callback=on_saved
+            )
+
+        self.store.finish_item(job_id, idx, DONE)
+        print(f"✅ [BATCH] ジョブ {job_id}: 行{post.get('row')} 完了")
+
+    def _generate_with_retry(self, job_id, idx, post, options):
+        """
+        Generate one row, retrying rate limit and overload errors
+
+        Returns:
+            tuple: (output or None, error message or None)
+        """
+        error = None
+
+        for attempt in range(self.max_retries + 1):
+            self.store.add_attempt(job_id, idx)
+            try:
+                return generate_post_for_row(post, select_first=options['select_first']), None
+            except Exception as e:
+                error = str(e)
+                retryable = any(marker in error.lower() for marker in RETRYABLE_ERRORS)
+                if not retryable:
+                    traceback.print_exc()
+                    break
+                if attempt == self.max_retries or self.store.get_job(job_id)['cancel_requested']:
+                    break
+
+                # Hold back every worker, not just this one
+                pause = self.retry_pause * (2 ** attempt)
+                print(f"[WARN] 行{post.get('row')}: API制限 ({error[:80]}), {pause:.0f}秒後に再試行")
+                get_service('claude').rate_limiter.pause(pause)
+
+        return None, error
+
+    def _finish_if_complete(self, job_id):
+        """Close the job once no row is pending or running (caller holds the lock)"""
+        job = self.store.get_job(job_id)
+        if job is None or job['finished_at'] is not None:
+            return
+
+        counts = self.store.count_items(job_id)
+        if counts[PENDING] or counts[RUNNING]:
+            return
+
+        self.store.finish_job(job_id, CANCELLED if job['cancel_requested'] else 'completed')
+        print(f"[BATCH] ジョブ {job_id} 終了: 成功{counts[DONE]}件 / 失敗{counts[FAILED]}件")
+
+    def _snapshot(self, job, include_items):
+        counts = self.store.count_items(job['id'])
+        total = sum(counts.values())
+        processed = counts[DONE] + counts[FAILED] + counts[CANCELLED]
+        active = job['id'] in self._outstanding or self.store.is_leased(job, self.lease_seconds, self.owner)
+
+        snapshot = {
+            'id': job['id'],
+            'status': job['status'],
+            'options': job['options'],
+            'created_at': job['created_at'],
+            'finished_at': job['finished_at'],
+            # Running in this or another server process right now
+            'active': active,
+            # Has rows left and nobody is working on them (e.g. after a restart)
+            'resumable': not active and (total - counts[DONE]) > 0,
+            'progress': {
+                'total': total,
+                'processed': processed,
+                'percentage': round(processed / total * 100) if total else 100,
+                **counts
+            }
+        }
+
+        if include_items:
+            items = []
+            for item in self.store.get_items(job['id']):
+                output = item.pop('output') or {}
+                item['post'] = output.get('selected') or (output.get('post_a') or {}).get('text', '')
+                item['post_a'] = output.get('post_a')
+                item['post_b'] = output.get('post_b')
+                items.append(item)
+            snapshot['items'] = items
+
+        return snapshot
+
+    def get_job(self, job_id, include_items=True):
+        """
+        Get a snapshot of a job
+
+        Args:
+            job_id: Job id
+            include_items: Include per-row status and output
+
+        Returns:
+            dict or None: {
+                'id': str,
+                'status': 'running' | 'completed' | 'cancelled',
+                'active': bool,
+                'resumable': bool,
+                'progress': {'total', 'processed', 'percentage', 'pending', 'running', 'done', 'failed', 'cancelled'},
+                'items': [...]
+            }
+        """
+        job = self.store.get_job(job_id)
+        if job is None:
+            return None
+        return self._snapshot(job, include_items)
+
+    def list_jobs(self):
+        """
+        List all jobs without their rows, newest first
+
+        Returns:
+            list: Job snapshots
+        """
+        return [self._snapshot(job, include_items=False) for job in self.store.list_jobs()]
+
+    def cancel_job(self, job_id):
+        """
+        Stop a job: rows already running finish, pending rows are skipped
+
+        Args:
+            job_id: Job id
+
+        Returns:
+            dict or None: Job snapshot
+        """
+        if self.store.get_job(job_id) is None:
+            return None
+
+        with self._lock:
+            self.store.cancel_pending(job_id)
+            self._finish_if_complete(job_id)
+
+        print(f"[BATCH] ジョブ {job_id} キャンセル要求")
+        return self.get_job(job_id)
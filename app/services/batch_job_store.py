@@ -0,0 +1,432 @@
+"""
+Persistent batch job store for PostCrafterPro
+
+Keeps the state and output of every batch row in a local SQLite file so an
+interrupted batch (rate limit, timeout, server restart) can be resumed
+without regenerating rows that already finished.
+"""
+import json
+import os
+import sqlite3
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from app.utils.sqlite_db import ThreadLocalSQLite
+
+
+# Item states
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+ITEM_STATES = (PENDING, RUNNING, DONE, FAILED, CANCELLED)
+FINISHED_STATES = (DONE, FAILED, CANCELLED)
+
+
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def _now():
+    return datetime.now().strftime(TIME_FORMAT)
+
+
+def _lease_cutoff(lease_seconds):
+    """Heartbeats older than this (same format as _now) have expired"""
+    return (datetime.now() - timedelta(seconds=lease_seconds)).strftime(TIME_FORMAT)
+
+
+class BatchJobStore:
+    """
+    SQLite-backed job and row state
+
+    Rows move pending -> running -> done/failed (or cancelled). The generated
+    output is checkpointed as soon as Claude returns, before the sheets are
+    written, so a resumed row never pays for the same Claude call twice.
+
+    Several server processes can share the file. A job is leased by the
+    process working on it (``owner`` + ``heartbeat_at``) and running rows
+    record their owner; the owner refreshes both while it works, so other
+    processes only take over rows whose lease has expired.
+    """
+
+    def __init__(self, db_path=None):
+        """
+        Initialize the job database
+
+        Args:
+            db_path: Path to the SQLite file (default: data/batch_jobs.sqlite3)
+        """
+        if db_path is None:
+            data_dir = Path(__file__).parent.parent.parent / 'data'
+            db_path = os.getenv('BATCH_JOB_STORE_PATH', str(data_dir / 'batch_jobs.sqlite3'))
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+
+        self._db = ThreadLocalSQLite(self.db_path, row_factory=sqlite3.Row)
+        self._init_db()
+
+    def _connect(self):
+        """Get a per-thread SQLite connection"""
+        return self._db.connect()
+
+    def _init_db(self):
+        """Create the job tables if needed"""
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    options TEXT NOT NULL,
+                    cancel_requested INTEGER NOT NULL DEFAULT 0,
+                    created_at TEXT NOT NULL,
+                    finished_at TEXT
+                )
+                """
+            )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS job_items (
+                    job_id TEXT NOT NULL,
+                    idx INTEGER NOT NULL,
+                    row INTEGER,
+                    post TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    output TEXT,
+                    error TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    updated_at TEXT NOT NULL,
+                    PRIMARY KEY (job_id, idx)
+                )
+                """
+            )
+            conn.execute(
+                'CREATE INDEX IF NOT EXISTS idx_job_items_status '
+                'ON job_items (job_id, status)'
+            )
+
+            # Lease columns (added after the first release)
+            for table, column in (('jobs', 'owner'), ('jobs', 'heartbeat_at'), ('job_items', 'owner')):
+                columns = {row['name'] for row in conn.execute(f'PRAGMA table_info({table})')}
+                if column not in columns:
+                    conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} TEXT')
+
+    def create_job(self, job_id, posts, options, owner=None):
+        """
+        Store a new job with one pending row per post
+
+        Args:
+            job_id: Job id
+            posts: Row data from /api/batch/load
+            options: Job options
+            owner: Process that will run the job (it holds the lease)
+        """
+        now = _now()
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                'INSERT INTO jobs (id, status, options, created_at, owner, heartbeat_at) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (job_id, RUNNING, json.dumps(options), now, owner, now if owner else None)
+            )
+            conn.executemany(
+                'INSERT INTO job_items (job_id, idx, row, post, status, updated_at) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                [
+                    (job_id, idx, post.get('row'), json.dumps(post, ensure_ascii=False), PENDING, now)
+                    for idx, post in enumerate(posts)
+                ]
+            )
+
+    def get_job(self, job_id):
+        """
+        Load a job row
+
+        Args:
+            job_id: Job id
+
+        Returns:
+            dict or None: {'id', 'status', 'options', 'cancel_requested', 'created_at',
+                'finished_at', 'owner', 'heartbeat_at'}
+        """
+        row = self._connect().execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job['options'] = json.loads(job['options'])
+        job['cancel_requested'] = bool(job['cancel_requested'])
+        return job
+
+    def list_jobs(self):
+        """
+        Load every job row, newest first
+
+        Returns:
+            list: Job dicts (see get_job)
+        """
+        rows = self._connect().execute('SELECT id FROM jobs ORDER BY created_at DESC').fetchall()
+        return [self.get_job(row['id']) for row in rows]
+
+    def get_items(self, job_id):
+        """
+        Load every row of a job in order
+
+        Args:
+            job_id: Job id
+
+        Returns:
+            list: [{'idx', 'row', 'status', 'output', 'error', 'attempts', ...post fields}, ...]
+        """
+        rows = self._connect().execute(
+            'SELECT * FROM job_items WHERE job_id = ? ORDER BY idx', (job_id,)
+        ).fetchall()
+
+        items = []
+        for row in rows:
+            item = json.loads(row['post'])
+            item.update(
+                idx=row['idx'],
+                status=row['status'],
+                output=json.loads(row['output']) if row['output'] else None,
+                error=row['error'],
+                attempts=row['attempts']
+            )
+            items.append(item)
+        return items
+
+    def count_items(self, job_id):
+        """
+        Count rows per state
+
+        Args:
+            job_id: Job id
+
+        Returns:
+            dict: {state: count} for every item state
+        """
+        counts = {state: 0 for state in ITEM_STATES}
+        rows = self._connect().execute(
+            'SELECT status, COUNT(*) AS n FROM job_items WHERE job_id = ? GROUP BY status', (job_id,)
+        ).fetchall()
+        for row in rows:
+            counts[row['status']] = row['n']
+        return counts
+
+    def pending_indices(self, job_id):
+        """List the indices of rows waiting to run"""
+        rows = self._connect().execute(
+            'SELECT idx FROM job_items WHERE job_id = ? AND status = ? ORDER BY idx',
+            (job_id, PENDING)
+        ).fetchall()
+        return [row['idx'] for row in rows]
+
+    def claim_item(self, job_id, idx, owner=None):
+        """
+        Atomically move a row from pending to running
+
+        Args:
+            job_id: Job id
+            idx: Row index within the job
+            owner: Process running the row
+
+        Returns:
+            dict or None: {'post': dict, 'output': dict or None} if claimed,
+                None if the row was not pending (taken, finished or cancelled)
+        """
+        conn = self._connect()
+        with conn:
+            cursor = conn.execute(
+                'UPDATE job_items SET status = ?, owner = ?, updated_at = ? '
+                'WHERE job_id = ? AND idx = ? AND status = ?',
+                (RUNNING, owner, _now(), job_id, idx, PENDING)
+            )
+            if cursor.rowcount != 1:
+                return None
+            row = conn.execute(
+                'SELECT post, output FROM job_items WHERE job_id = ? AND idx = ?', (job_id, idx)
+            ).fetchone()
+
+        return {
+            'post': json.loads(row['post']),
+            'output': json.loads(row['output']) if row['output'] else None
+        }
+
+    def add_attempt(self, job_id, idx):
+        """Count one generation attempt for a row"""
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                'UPDATE job_items SET attempts = attempts + 1, updated_at = ? WHERE job_id = ? AND idx = ?',
+                (_now(), job_id, idx)
+            )
+
+    def save_output(self, job_id, idx, output):
+        """
+        Checkpoint the generated output of a running row
+
+        Args:
+            job_id: Job id
+            idx: Row index
+            output: Generation result (post_a, post_b, selected, ...)
+        """
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                'UPDATE job_items SET output = ?, updated_at = ? WHERE job_id = ? AND idx = ?',
+                (json.dumps(output, ensure_ascii=False), _now(), job_id, idx)
+            )
+
+    def finish_item(self, job_id, idx, status, error=None):
+        """
+        Mark a row done or failed
+
+        Args:
+            job_id: Job id
+            idx: Row index
+            status: DONE or FAILED
+            error: Error message for failed rows
+        """
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                'UPDATE job_items SET status = ?, error = ?, updated_at = ? WHERE job_id = ? AND idx = ?',
+                (status, error, _now(), job_id, idx)
+            )
+
+    def cancel_pending(self, job_id):
+        """Flag the job as cancelled and skip rows that have not started"""
+        conn = self._connect()
+        with conn:
+            conn.execute('UPDATE jobs SET cancel_requested = 1 WHERE id = ?', (job_id,))
+            conn.execute(
+                'UPDATE job_items SET status = ?, updated_at = ? WHERE job_id = ? AND status = ?',
+                (CANCELLED, _now(), job_id, PENDING)
+            )
+
+    def finish_job(self, job_id, status):
+        """Close a job once no row is pending or running"""
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                'UPDATE jobs SET status = ?, finished_at = ?, heartbeat_at = NULL '
+                'WHERE id = ? AND finished_at IS NULL',
+                (status, _now(), job_id)
+            )
+
+    def heartbeat(self, owner, job_ids):
+        """
+        Renew the leases of jobs (and their running rows) held by a process
+
+        Args:
+            owner: Process id string
+            job_ids: Jobs the process is working on
+        """
+        if not job_ids:
+            return
+        now = _now()
+        placeholders = ','.join('?' * len(job_ids))
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                f'UPDATE jobs SET heartbeat_at = ? WHERE owner = ? AND id IN ({placeholders})',
+                (now, owner, *job_ids)
+            )
+            conn.execute(
+                f'UPDATE job_items SET updated_at = ? '
+                f'WHERE owner = ? AND status = ? AND job_id IN ({placeholders})',
+                (now, owner, RUNNING, *job_ids)
+            )
+
+    def release_job(self, job_id, owner):
+        """Drop a process's lease once it has no work left for the job"""
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                'UPDATE jobs SET heartbeat_at = NULL WHERE id = ? AND owner = ?',
+                (job_id, owner)
+            )
+
+    @staticmethod
+    def is_leased(job, lease_seconds, owner=None):
+        """
+        Whether another process holds a live lease on a job
+
+        Args:
+            job: Job dict from get_job
+            lease_seconds: Heartbeats older than this have expired
+            owner: The calling process (its own lease does not count)
+
+        Returns:
+            bool: True if some other process is working on the job
+        """
+        return (
+            job.get('heartbeat_at') is not None
+            and job['heartbeat_at'] >= _lease_cutoff(lease_seconds)
+            and job.get('owner') != owner
+        )
+
+    def reopen_job(self, job_id, owner, lease_seconds, retry_failed=True, retry_cancelled=True,
+                   retry_unsaved=False):
+        """
+        Take over a job and put its unfinished rows back to pending
+
+        Rows left running by a process whose lease expired are reset; their
+        checkpointed output (if any) is kept so they are not regenerated.
+        Rows running under a live lease and done rows are never touched.
+
+        Args:
+            job_id: Job id
+            owner: Process taking the job over
+            lease_seconds: Heartbeats older than this have expired
+            retry_failed: Also retry rows that failed
+            retry_cancelled: Also run rows skipped by a cancel
+            retry_unsaved: Also reopen done rows whose requested auto-save
+                failed or never completed (output with "saved": false)
+
+        Returns:
+            list or None: Indices of the rows now pending, None if another
+                process holds a live lease on the job
+        """
+        states = [FAILED] if retry_failed else []
+        if retry_cancelled:
+            states.append(CANCELLED)
+        placeholders = ','.join('?' * len(states))
+        cutoff = _lease_cutoff(lease_seconds)
+        now = _now()
+
+        conn = self._connect()
+        with conn:
+            # Check and take the lease in one write transaction across processes
+            conn.execute('BEGIN IMMEDIATE')
+            job = conn.execute('SELECT owner, heartbeat_at FROM jobs WHERE id = ?', (job_id,)).fetchone()
+            if job is not None and self.is_leased(dict(job), lease_seconds, owner):
+                return None
+
+            conn.execute(
+                'UPDATE job_items SET status = ?, owner = NULL, error = NULL, updated_at = ? '
+                'WHERE job_id = ? AND status = ? AND updated_at < ?',
+                (PENDING, now, job_id, RUNNING, cutoff)
+            )
+            if states:
+                conn.execute(
+                    f'UPDATE job_items SET status = ?, error = NULL, updated_at = ? '
+                    f'WHERE job_id = ? AND status IN ({placeholders})',
+                    (PENDING, now, job_id, *states)
+                )
+            if retry_unsaved:
+                conn.execute(
+                    "UPDATE job_items SET status = ?, updated_at = ? "
+                    "WHERE job_id = ? AND status = ? AND output IS NOT NULL "
+                    "AND json_extract(output, '$.saved') = 0",
+                    (PENDING, now, job_id, DONE)
+                )
+            conn.execute(
+                'UPDATE jobs SET status = ?, cancel_requested = 0, finished_at = NULL, '
+                'owner = ?, heartbeat_at = ? WHERE id = ?',
+                (RUNNING, owner, now, job_id)
+            )
+
+        return self.pending_indices(job_id)
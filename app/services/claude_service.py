@@ -4,11 +4,15 @@ Based on enhanced_sns_crafter.py with improvements for Tinder UI and Pinecone RA
 """
 import os
 import anthropic
-import requests
 import json
 import re
+import threading
+import unicodedata
+from collections import OrderedDict
 from datetime import datetime
 from app.services.prompt_service import PromptService
+from app.utils.rate_limiter import RateLimiter
+from app.utils.tweet_length import check_tweet_length, parse_tweet
 from pydantic import BaseModel, Field
 
 
@@ -26,13 +30,65 @@ class TwoPostsResponse(BaseModel):
     post_b: PostOption = Field(description="投稿案B")
 
 
+# Claude requests per minute when CLAUDE_REQUESTS_PER_MINUTE is unset
+# (Anthropic API tier 1 limit)
+CLAUDE_DEFAULT_RPM = 50
+
+# Tools whose result depends only on their input, so results can be reused
+DETERMINISTIC_TOOLS = frozenset(['tweet_length_checker'])
+
+
+class ToolResultMemo:
+    """
+    LRU memo of deterministic tool results
+
+    Keys are (tool name, input key). Once full, the least recently used
+    entry is evicted. The memo lives in this process only; each gunicorn
+    worker has its own.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """Cached result for key, or None"""
+        with self._lock:
+            result = self._entries.get(key)
+            if result is not None:
+                self._entries.move_to_end(key)
+            return result
+
+    def put(self, key, result):
+        """Store a result, evicting the least recently used entry when full"""
+        with self._lock:
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+_tool_result_memo = ToolResultMemo(int(os.getenv('CLAUDE_TOOL_MEMO_SIZE', '1024')))
+
+
 class ClaudeService:
     """
     Claude 4.5 API integration for SNS post generation
     """
 
-    def __init__(self):
-        """Initialize Claude client"""
+    def __init__(self, prompt_service=None, rate_limiter=None):
+        """
+        Initialize Claude client
+
+        Args:
+            prompt_service: Shared PromptService (optional, created if omitted)
+            rate_limiter: RateLimiter applied to every Claude API request
+                (optional, configured from CLAUDE_REQUESTS_PER_MINUTE if omitted)
+        """
         api_key = os.getenv('ANTHROPIC_API_KEY')
         if not api_key:
             raise ValueError("ANTHROPIC_API_KEY not found in environment variables")
@@ -40,11 +96,11 @@ class ClaudeService:
         self.client = anthropic.Anthropic(api_key=api_key)
         self.model = os.getenv('CLAUDE_MODEL', 'claude-sonnet-4-5-20250929')
 
-        # Tweet length checker API
-        self.tweet_checker_api = "https://mj7k0bs0qd.execute-api.ap-northeast-1.amazonaws.com/prod/check"
-
         # Prompt service for dynamic prompt management
-        self.prompt_service = PromptService()
+        self.prompt_service = prompt_service or PromptService()
+
+        # Shared by every thread using this instance (batch workers included)
+        self.rate_limiter = rate_limiter or RateLimiter.from_env('CLAUDE', default_rate=CLAUDE_DEFAULT_RPM)
 
         print(f"[OK] Claude Service initialized with model: {self.model}")
 
@@ -66,8 +122,8 @@ class ClaudeService:
 
         Returns:
             dict: {
-                'post_a': {'text': str, 'character_count': int, 'is_valid': bool},
-                'post_b': {'text': str, 'character_count': int, 'is_valid': bool},
+                'post_a': {'text': str, 'character_count': int, 'weighted_length': int, 'is_valid': bool},
+                'post_b': {'text': str, 'character_count': int, 'weighted_length': int, 'is_valid': bool},
                 'metadata': {...}
             }
         """
@@ -123,6 +179,8 @@ class ClaudeService:
             # Conversation loop (max 10 turns)
             max_turns = 10
             current_turn = 0
+            # Tool results already computed in this conversation
+            tool_memo = {}
 
             while current_turn < max_turns:
                 current_turn += 1
@@ -140,6 +198,7 @@ class ClaudeService:
 
                     print(f"[INFO] 構造化出力リクエスト送信中...")
                     # Request JSON output via system prompt (Anthropic API doesn't support response_format)
+                    self.rate_limiter.acquire()
                     final_response = self.client.messages.create(
                         model=self.model,
                         max_tokens=10000,
@@ -155,6 +214,7 @@ class ClaudeService:
                     break
 
                 # Regular API request
+                self.rate_limiter.acquire()
                 response = self.client.beta.messages.create(
                     model=self.model,
                     max_tokens=16000,
@@ -184,6 +244,7 @@ class ClaudeService:
                     })
 
                     print(f"[INFO] 構造化出力リクエスト送信中...")
+                    self.rate_limiter.acquire()
                     final_response = self.client.messages.create(
                         model=self.model,
                         max_tokens=10000,
@@ -205,7 +266,7 @@ class ClaudeService:
                     break
 
                 # Process tool use
-                tool_outputs = self._process_tool_use(response)
+                tool_outputs = self._process_tool_use(response, tool_memo)
                 if tool_outputs:
                     conversation.append({"role": "user", "content": tool_outputs})
 
@@ -294,6 +355,8 @@ class ClaudeService:
             # Conversation loop (max 5 turns for refinement)
             max_turns = 5
             current_turn = 0
+            # Tool results already computed in this conversation
+            tool_memo = {}
 
             while current_turn < max_turns:
                 current_turn += 1
@@ -310,6 +373,7 @@ class ClaudeService:
                     })
 
                     print(f"[INFO] 構造化出力リクエスト送信中...")
+                    self.rate_limiter.acquire()
                     final_response = self.client.messages.create(
                         model=self.model,
                         max_tokens=8000,
@@ -323,6 +387,7 @@ class ClaudeService:
                     break
 
                 # Regular API request with tools
+                self.rate_limiter.acquire()
                 response = self.client.messages.create(
                     model=self.model,
                     max_tokens=8000,
@@ -347,6 +412,7 @@ class ClaudeService:
                     })
 
                     print(f"[INFO] 構造化出力リクエスト送信中...")
+                    self.rate_limiter.acquire()
                     final_response = self.client.messages.create(
                         model=self.model,
                         max_tokens=8000,
@@ -360,7 +426,7 @@ class ClaudeService:
                     break
 
                 # Process tool use
-                tool_outputs = self._process_tool_use(response)
+                tool_outputs = self._process_tool_use(response, tool_memo)
                 if tool_outputs:
                     conversation.append({"role": "user", "content": tool_outputs})
 
@@ -497,12 +563,8 @@ class ClaudeService:
 
                             # Remove markdown formatting
                             text_a = self._clean_text(post_a['text'])
-                            result['post_a'] = {
-                                'text': text_a,
-                                'character_count': len(text_a),
-                                'is_valid': len(text_a) <= 280
-                            }
-                            print(f"✅ [案A取得成功] {len(text_a)}文字")
+                            result['post_a'] = {'text': text_a, **self._length_fields(text_a)}
+                            print(f"✅ [案A取得成功] {len(text_a)}文字 (重み付き{result['post_a']['weighted_length']}/280)")
                             print(f"   内容: {text_a[:100]}...")
                         else:
                             print(f"⚠️  [警告] post_a キーが見つかりません")
@@ -514,12 +576,8 @@ class ClaudeService:
 
                             # Remove markdown formatting
                             text_b = self._clean_text(post_b['text'])
-                            result['post_b'] = {
-                                'text': text_b,
-                                'character_count': len(text_b),
-                                'is_valid': len(text_b) <= 280
-                            }
-                            print(f"✅ [案B取得成功] {len(text_b)}文字")
+                            result['post_b'] = {'text': text_b, **self._length_fields(text_b)}
+                            print(f"✅ [案B取得成功] {len(text_b)}文字 (重み付き{result['post_b']['weighted_length']}/280)")
                             print(f"   内容: {text_b[:100]}...")
                         else:
                             print(f"⚠️  [警告] post_b キーが見つかりません")
@@ -680,22 +738,14 @@ class ClaudeService:
         match_a = re.search(r'\[案A\](.*?)(?=\[案B\]|\[|$)', text, re.DOTALL)
         if match_a:
             post_a_text = self._clean_text(match_a.group(1))
-            result['post_a'] = {
-                'text': post_a_text,
-                'character_count': len(post_a_text),
-                'is_valid': len(post_a_text) <= 280
-            }
+            result['post_a'] = {'text': post_a_text, **self._length_fields(post_a_text)}
             print(f"\n[案A抽出(レガシー)] {len(post_a_text)}文字")
 
         # Extract 案B
         match_b = re.search(r'\[案B\](.*?)(?=\[|$)', text, re.DOTALL)
         if match_b:
             post_b_text = self._clean_text(match_b.group(1))
-            result['post_b'] = {
-                'text': post_b_text,
-                'character_count': len(post_b_text),
-                'is_valid': len(post_b_text) <= 280
-            }
+            result['post_b'] = {'text': post_b_text, **self._length_fields(post_b_text)}
             print(f"[案B抽出(レガシー)] {len(post_b_text)}文字")
 
     def _log_web_search_results(self, response):
@@ -729,70 +779,87 @@ class ClaudeService:
             # Silent fail - logging is optional
             pass
 
-    def _process_tool_use(self, response):
+    def _process_tool_use(self, response, memo=None):
         """
         Process tool use in Claude's response
 
+        All client-side tools are local (no network I/O), so the blocks run
+        inline in order.
+
         Args:
             response: Claude API response
+            memo: Per-conversation memo of tool results (optional)
 
         Returns:
             list: Tool results to send back to Claude
         """
-        tool_outputs = []
+        blocks = [
+            block for block in response.content
+            if hasattr(block, 'type') and block.type == 'tool_use'
+        ]
+        if memo is None:
+            memo = {}
+
+        tool_results = []
+        for block in blocks:
+            result = self._run_tool(block, memo)
+            if result is not None:
+                tool_results.append({
+                    'type': 'tool_result',
+                    'tool_use_id': block.id,
+                    'content': json.dumps(result)
+                })
+        return tool_results
+
+    def _run_tool(self, block, memo):
+        """
+        Run one tool_use block, reusing earlier results of deterministic tools
 
-        for block in response.content:
-            if hasattr(block, 'type') and block.type == 'tool_use':
-                print(f"ツール使用検出: {block.name}")
+        Args:
+            block: tool_use content block
+            memo: Per-conversation memo of tool results
 
-                if block.name == 'tweet_length_checker':
-                    text = block.input.get('text', '')
+        Returns:
+            dict: Tool result, or None for tools handled elsewhere
+        """
+        print(f"ツール使用検出: {block.name}")
+
+        deterministic = block.name in DETERMINISTIC_TOOLS
+        if deterministic:
+            key = (block.name, self._tool_input_key(block.name, block.input))
+            if key in memo:
+                print(f"[INFO] ツール結果を再利用 (会話内): {block.name}")
+                return memo[key]
+            result = _tool_result_memo.get(key)
+            if result is not None:
+                print(f"[INFO] ツール結果を再利用 (プロセス内): {block.name}")
+                memo[key] = result
+                return result
+
+        if block.name == 'tweet_length_checker':
+            # Computed locally (X's weighted length), no network round-trip
+            result = parse_tweet(block.input.get('text', ''))
+            print(f"文字数チェック結果: {result}")
+        else:
+            return None
+
+        if deterministic:
+            memo[key] = result
+            _tool_result_memo.put(key, result)
+
+        return result
+
+    @staticmethod
+    def _tool_input_key(name, tool_input):
+        """
+        Memo key of a tool input
 
-                    try:
-                        api_response = requests.post(
-                            self.tweet_checker_api,
-                            json={"text": text},
-                            timeout=10
-                        )
-
-                        if api_response.status_code == 200:
-                            api_result = api_response.json()
-                            print(f"文字数チェック結果: {api_result}")
-
-                            tool_outputs.append({
-                                'type': 'tool_result',
-                                'tool_use_id': block.id,
-                                'content': json.dumps(api_result)
-                            })
-                        else:
-                            # Fallback
-                            char_count = len(text)
-                            is_valid = char_count <= 280
-
-                            tool_outputs.append({
-                                'type': 'tool_result',
-                                'tool_use_id': block.id,
-                                'content': json.dumps({
-                                    "character_count": char_count,
-                                    "is_valid": is_valid
-                                })
-                            })
-
-                    except Exception as e:
-                        print(f"文字数チェックエラー: {e}")
-                        # Fallback
-                        char_count = len(text)
-                        tool_outputs.append({
-                            'type': 'tool_result',
-                            'tool_use_id': block.id,
-                            'content': json.dumps({
-                                "character_count": char_count,
-                                "is_valid": char_count <= 280,
-                                "error": str(e)
-                            })
-                        })
-
-        return tool_outputs
+        Texts that only differ in Unicode composition give the same length,
+        so tweet_length_checker inputs are keyed by their NFC form.
+        """
+        if name == 'tweet_length_checker':
+            return unicodedata.normalize('NFC', tool_input.get('text', '') or '')
+        return json.dumps(tool_input, sort_keys=True, ensure_ascii=False)
 
     def refine_emojis(self, original_text, emoji_guidelines):
         """
@@ -808,6 +875,7 @@ class ClaudeService:
                 'improved': str,
                 'changes': [{'from': '💙', 'to': '🚨', 'reason': '...'}],
                 'character_count': int,
+                'weighted_length': int,
                 'is_valid': bool
             }
         """
@@ -851,6 +919,7 @@ X Analyticsデータに基づいて、エンゲージメント率が高まるよ
 
         try:
             # Call Claude API
+            self.rate_limiter.acquire()
             response = self.client.messages.create(
                 model=self.model,
                 max_tokens=4000,
@@ -877,10 +946,10 @@ X Analyticsデータに基づいて、エンゲージメント率が高まるよ
                 reasoning = result_json.get('reasoning', '')
 
                 # Check character count with tweet_length_checker
-                char_count, is_valid = self._check_tweet_length(improved_text)
+                length = self._length_fields(improved_text)
 
                 print(f"[OK] 絵文字改善完了")
-                print(f"   改善後文字数: {char_count}文字")
+                print(f"   改善後文字数: {length['character_count']}文字 (重み付き{length['weighted_length']}/280)")
                 print(f"   変更箇所: {len(changes)}件")
 
                 return {
@@ -888,20 +957,17 @@ X Analyticsデータに基づいて、エンゲージメント率が高まるよ
                     'improved': improved_text,
                     'changes': changes,
                     'reasoning': reasoning,
-                    'character_count': char_count,
-                    'is_valid': is_valid
+                    **length
                 }
 
             else:
                 print(f"[WARN]  JSON抽出失敗、元テキストを返却")
-                char_count, is_valid = self._check_tweet_length(original_text)
                 return {
                     'original': original_text,
                     'improved': original_text,
                     'changes': [],
                     'reasoning': 'JSON解析に失敗しました',
-                    'character_count': char_count,
-                    'is_valid': is_valid
+                    **self._length_fields(original_text)
                 }
 
         except Exception as e:
@@ -909,35 +975,44 @@ X Analyticsデータに基づいて、エンゲージメント率が高まるよ
             import traceback
             traceback.print_exc()
 
-            char_count, is_valid = self._check_tweet_length(original_text)
             return {
                 'original': original_text,
                 'improved': original_text,
                 'changes': [],
                 'reasoning': f'エラー: {str(e)}',
-                'character_count': char_count,
-                'is_valid': is_valid,
+                **self._length_fields(original_text),
                 'error': str(e)
             }
 
     def _check_tweet_length(self, text):
         """
-        Check tweet length using tweet_length_checker API
+        Check tweet length with X's weighted-length rules
 
         Args:
             text: Text to check
 
         Returns:
-            tuple: (character_count, is_valid)
+            tuple: (weighted_length, is_valid)
         """
-        try:
-            response = requests.post(
-                self.tweet_checker_url,
-                json={"text": text},
-                timeout=10
-            )
-            data = response.json()
-            return data.get('weightedLength', len(text)), data.get('isValid', len(text) <= 280)
-        except Exception as e:
-            print(f"[WARN] Tweet length check failed: {e}")
-            return len(text), len(text) <= 280
+        return check_tweet_length(text)
+
+    def _length_fields(self, text):
+        """
+        Length fields of a post result
+
+        character_count stays the plain number of characters shown in the
+        UI ("N 文字"); weighted_length is X's count (CJK = 2, URL = 23) that
+        is_valid is checked against (<= 280, i.e. 全角140字).
+
+        Args:
+            text: Post text
+
+        Returns:
+            dict: {'character_count': int, 'weighted_length': int, 'is_valid': bool}
+        """
+        weighted_length, is_valid = self._check_tweet_length(text)
+        return {
+            'character_count': len(text),
+            'weighted_length': weighted_length,
+            'is_valid': is_valid
+        }
@@ -0,0 +1,218 @@
+"""
+Persistent embedding cache for PostCrafterPro
+
+Stores embedding vectors in a local SQLite file so that every gunicorn worker
+(and every restart) shares the same cache instead of re-embedding past posts.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+from app.utils.sqlite_db import ThreadLocalSQLite
+
+
+class EmbeddingCache:
+    """
+    Content-addressed, size-bounded embedding cache backed by SQLite
+
+    Keys are SHA-256 hashes of the model name plus the full text, so two
+    texts that merely share a prefix never collide. Least recently used
+    entries are evicted once the cache grows beyond ``max_entries``; the
+    size is only counted every ``evict_every`` inserted rows, so a write
+    does not scan the table and the cache may briefly overshoot by that
+    much per worker.
+    """
+
+    def __init__(self, db_path=None, max_entries=None):
+        """
+        Initialize the cache database
+
+        Args:
+            db_path: Path to the SQLite file (default: data/embedding_cache.sqlite3)
+            max_entries: Maximum number of cached vectors before LRU eviction
+        """
+        if db_path is None:
+            data_dir = Path(__file__).parent.parent.parent / 'data'
+            db_path = os.getenv('EMBEDDING_CACHE_PATH', str(data_dir / 'embedding_cache.sqlite3'))
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+
+        if max_entries is None:
+            max_entries = int(os.getenv('EMBEDDING_CACHE_MAX_ENTRIES', 50000))
+        self.max_entries = max_entries
+        self.evict_every = max(1, max_entries // 100)
+        self._inserted_since_evict = 0
+        self._evict_lock = threading.Lock()
+
+        self._db = ThreadLocalSQLite(self.db_path)
+        self._init_db()
+
+    def _connect(self):
+        """Get a per-thread SQLite connection"""
+        return self._db.connect()
+
+    def _init_db(self):
+        """Create the cache table if needed"""
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    key TEXT PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    dim INTEGER NOT NULL,
+                    vector BLOB NOT NULL,
+                    last_access REAL NOT NULL
+                )
+                """
+            )
+            conn.execute(
+                'CREATE INDEX IF NOT EXISTS idx_embeddings_last_access '
+                'ON embeddings (last_access)'
+            )
+
+    @staticmethod
+    def make_key(text, model):
+        """
+        Build the cache key for a text
+
+        Args:
+            text: Full text that was embedded
+            model: Embedding model name
+
+        Returns:
+            str: Hex digest identifying (model, text)
+        """
+        digest = hashlib.sha256()
+        digest.update(model.encode('utf-8'))
+        digest.update(b'\x00')
+        digest.update(text.encode('utf-8'))
+        return digest.hexdigest()
+
+    def get_many(self, texts, model):
+        """
+        Look up cached vectors for several texts
+
+        Args:
+            texts: List of texts
+            model: Embedding model name
+
+        Returns:
+            dict: {text: list[float]} for the texts that were cached
+        """
+        if not texts:
+            return {}
+
+        keys = {self.make_key(text, model): text for text in texts}
+        found = {}
+        conn = self._connect()
+
+        key_list = list(keys)
+        # Stay well below SQLite's bound-parameter limit
+        for i in range(0, len(key_list), 500):
+            chunk = key_list[i:i + 500]
+            placeholders = ','.join('?' * len(chunk))
+            rows = conn.execute(
+                f'SELECT key, vector FROM embeddings WHERE key IN ({placeholders})',
+                chunk
+            ).fetchall()
+            for key, blob in rows:
+                found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+
+        if found:
+            try:
+                with conn:
+                    now = time.time()
+                    conn.executemany(
+                        'UPDATE embeddings SET last_access = ? WHERE key = ?',
+                        [(now, key) for key in found]
+                    )
+            except sqlite3.OperationalError as e:
+                # Access-time bookkeeping is best effort under write contention
+                print(f"[WARN] Embedding cache touch failed: {e}")
+
+        return {keys[key]: vector for key, vector in found.items()}
+
+    def get(self, text, model):
+        """
+        Look up a single cached vector
+
+        Args:
+            text: Text to look up
+            model: Embedding model name
+
+        Returns:
+            list or None: Cached vector, or None on a miss
+        """
+        return self.get_many([text], model).get(text)
+
+    def set_many(self, items, model):
+        """
+        Store several vectors and evict old entries if over capacity
+
+        Args:
+            items: Iterable of (text, vector) pairs
+            model: Embedding model name
+        """
+        now = time.time()
+        rows = []
+        for text, vector in items:
+            array = np.asarray(vector, dtype=np.float32)
+            rows.append((self.make_key(text, model), model, int(array.shape[0]), array.tobytes(), now))
+
+        if not rows:
+            return
+
+        conn = self._connect()
+        try:
+            with conn:
+                conn.executemany(
+                    'INSERT OR REPLACE INTO embeddings (key, model, dim, vector, last_access) '
+                    'VALUES (?, ?, ?, ?, ?)',
+                    rows
+                )
+            self._maybe_evict(len(rows))
+        except sqlite3.OperationalError as e:
+            print(f"[WARN] Embedding cache write failed: {e}")
+
+    def set(self, text, vector, model):
+        """Store a single vector"""
+        self.set_many([(text, vector)], model)
+
+    def _maybe_evict(self, inserted):
+        """Run _evict() once every evict_every inserted rows"""
+        with self._evict_lock:
+            self._inserted_since_evict += inserted
+            if self._inserted_since_evict < self.evict_every:
+                return
+            self._inserted_since_evict = 0
+        self._evict()
+
+    def _evict(self):
+        """Drop least recently used entries beyond max_entries"""
+        conn = self._connect()
+        count = conn.execute('SELECT COUNT(*) FROM embeddings').fetchone()[0]
+        overflow = count - self.max_entries
+        if overflow <= 0:
+            return
+
+        with conn:
+            conn.execute(
+                'DELETE FROM embeddings WHERE key IN ('
+                'SELECT key FROM embeddings ORDER BY last_access ASC LIMIT ?)',
+                (overflow,)
+            )
+
+    def __len__(self):
+        return self._connect().execute('SELECT COUNT(*) FROM embeddings').fetchone()[0]
+
+    def clear(self):
+        """Remove every cached vector"""
+        conn = self._connect()
+        with conn:
+            conn.execute('DELETE FROM embeddings')
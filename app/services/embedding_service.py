@@ -2,14 +2,76 @@
 Embedding generation service using Claude API
 """
 import os
+import time
 from anthropic import Anthropic
 import numpy as np
+from app.services.embedding_cache import EmbeddingCache
+
+
+def normalize_rows(vectors):
+    """
+    Stack vectors into a contiguous float32 matrix of unit-length rows
+
+    Args:
+        vectors: List of vectors or 2-D array
+
+    Returns:
+        numpy.ndarray: (n, dim) float32 matrix; all-zero rows stay zero
+    """
+    matrix = np.array(vectors, dtype=np.float32, ndmin=2)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    np.divide(matrix, norms, out=matrix, where=norms > 0)
+    return np.ascontiguousarray(matrix)
+
+
+def top_k_indices(scores, top_k):
+    """
+    Select the indices of the top_k highest scores
+
+    Uses argpartition so only the selected k entries are sorted.
+
+    Args:
+        scores: 1-D array of scores
+        top_k: Number of indices to return
+
+    Returns:
+        numpy.ndarray: Indices sorted by score (descending)
+    """
+    n = scores.shape[0]
+    if top_k <= 0 or n == 0:
+        return np.empty(0, dtype=np.int64)
+    if top_k >= n:
+        return np.argsort(-scores, kind='stable')
+
+    top = np.argpartition(-scores, top_k - 1)[:top_k]
+    return top[np.argsort(-scores[top], kind='stable')]
+
+
+def score_matrix(query_vector, matrix, top_k):
+    """
+    Rank pre-normalized rows against a query in one matmul
+
+    Args:
+        query_vector: Query embedding
+        matrix: Matrix from normalize_rows()
+        top_k: Number of results to return
+
+    Returns:
+        tuple: (indices, scores) of the top_k rows, sorted by score (descending)
+    """
+    query = normalize_rows([query_vector])[0]
+    scores = matrix @ query
+    indices = top_k_indices(scores, top_k)
+    return indices, scores[indices]
 
 
 class EmbeddingService:
     """
     Generate embeddings for semantic search
     Compatible with Pinecone (1536 dimensions)
+
+    Failed embeddings are reported as None (never as zero vectors) so callers
+    can mask them out of similarity scoring.
     """
 
     def __init__(self):
@@ -19,75 +81,160 @@ class EmbeddingService:
             raise ValueError("ANTHROPIC_API_KEY not found")
 
         self.client = Anthropic(api_key=api_key)
-        self.cache = {}  # Simple in-memory cache
+        self.model = "voyage-3-lite"
+
+        # Retry settings for failed batches
+        self.max_retries = int(os.getenv('EMBEDDING_MAX_RETRIES', 3))
+        self.retry_backoff = float(os.getenv('EMBEDDING_RETRY_BACKOFF', 1.0))
+
+        # Persistent cache shared by all workers (keyed on model + full text)
+        try:
+            self.cache = EmbeddingCache()
+        except Exception as e:
+            print(f"[WARN] Embedding cache unavailable: {e}")
+            self.cache = None
 
         print("[OK] Embedding Service initialized")
 
-    def create_embedding(self, text):
+    def _embed_batch(self, batch):
         """
-        Create embedding vector for text
+        Call the embedding API for one batch and cache the result
 
         Args:
-            text: Text to embed
+            batch: List of texts
 
         Returns:
-            list: 1536-dimensional embedding vector
+            list or None: Embedding vectors, or None if the request failed
         """
-        # Check cache
-        cache_key = text[:100]  # Use first 100 chars as key
-        if cache_key in self.cache:
-            return self.cache[cache_key]
-
         try:
             # Use Claude's voyage-3-lite model (1536 dimensions)
             response = self.client.embeddings.create(
-                model="voyage-3-lite",
-                input=[text]
+                model=self.model,
+                input=batch
             )
+            embeddings = response.embeddings
+
+        except Exception as e:
+            print(f"Error in batch embedding ({len(batch)} texts): {e}")
+            return None
 
-            embedding = response.embeddings[0]
+        if self.cache is not None:
+            self.cache.set_many(zip(batch, embeddings), self.model)
 
-            # Cache result
-            self.cache[cache_key] = embedding
+        return embeddings
 
-            return embedding
+    def _retry_failed(self, texts, batch_size):
+        """
+        Retry failed texts in smaller batches with exponential backoff
 
-        except Exception as e:
-            print(f"Error creating embedding: {e}")
-            # Return zero vector as fallback
-            return [0.0] * 1536
+        Args:
+            texts: Texts whose first embedding attempt failed
+            batch_size: Batch size of the original attempt
+
+        Returns:
+            dict: {text: embedding} for the texts that eventually succeeded
+        """
+        recovered = {}
+        pending = list(texts)
+        retry_size = max(1, batch_size // 4)
+
+        for attempt in range(1, self.max_retries + 1):
+            if not pending:
+                break
+
+            delay = self.retry_backoff * (2 ** (attempt - 1))
+            print(
+                f"[INFO] Retrying {len(pending)} failed embeddings "
+                f"(attempt {attempt}/{self.max_retries}, batch={retry_size}, wait={delay:.1f}s)"
+            )
+            time.sleep(delay)
+
+            still_failed = []
+            for i in range(0, len(pending), retry_size):
+                batch = pending[i:i + retry_size]
+                embeddings = self._embed_batch(batch)
+                if embeddings is None:
+                    still_failed.extend(batch)
+                else:
+                    recovered.update(zip(batch, embeddings))
+
+            pending = still_failed
+            retry_size = max(1, retry_size // 2)
+
+        if pending:
+            print(f"[WARN] {len(pending)} texts could not be embedded and will be skipped")
+
+        return recovered
+
+    def create_embedding(self, text):
+        """
+        Create embedding vector for text
+
+        Args:
+            text: Text to embed
+
+        Returns:
+            list or None: 1536-dimensional embedding vector, or None on failure
+        """
+        return self.batch_embed([text])[0]
 
     def batch_embed(self, texts, batch_size=20):
         """
         Embed multiple texts in batches
 
+        Failed batches are retried in smaller batches with backoff. Texts that
+        still fail are returned as None.
+
         Args:
             texts: List of texts to embed
             batch_size: Number of texts per batch
 
         Returns:
-            list: List of embedding vectors
+            list: Embedding vector (or None) for each text, in input order
         """
-        embeddings = []
+        # Serve what we can from the cache, embed only the misses
+        cached = self.cache.get_many(texts, self.model) if self.cache is not None else {}
+        missing = list(dict.fromkeys(text for text in texts if text not in cached))
 
-        for i in range(0, len(texts), batch_size):
-            batch = texts[i:i + batch_size]
+        if cached and len(texts) > 1:
+            print(f"[INFO] Embedding cache hit: {len(texts) - len(missing)}/{len(texts)}")
 
-            try:
-                response = self.client.embeddings.create(
-                    model="voyage-3-lite",
-                    input=batch
-                )
+        embedded = {}
+        failed = []
+        for i in range(0, len(missing), batch_size):
+            batch = missing[i:i + batch_size]
+            embeddings = self._embed_batch(batch)
+            if embeddings is None:
+                failed.extend(batch)
+            else:
+                embedded.update(zip(batch, embeddings))
 
-                batch_embeddings = response.embeddings
-                embeddings.extend(batch_embeddings)
+        if failed:
+            embedded.update(self._retry_failed(failed, batch_size))
 
-            except Exception as e:
-                print(f"Error in batch embedding: {e}")
-                # Add zero vectors for failed batch
-                embeddings.extend([[0.0] * 1536] * len(batch))
+        return [cached[text] if text in cached else embedded.get(text) for text in texts]
 
-        return embeddings
+    def embed_with_mask(self, texts, batch_size=20):
+        """
+        Embed texts and return a compact matrix plus a missing-vector mask
+
+        Args:
+            texts: List of texts to embed
+            batch_size: Number of texts per batch
+
+        Returns:
+            tuple: (matrix, mask) where mask[i] is True if texts[i] was embedded
+                and matrix holds the normalized vectors of those texts only,
+                in input order
+        """
+        embeddings = self.batch_embed(texts, batch_size=batch_size)
+        mask = np.array([embedding is not None for embedding in embeddings], dtype=bool)
+
+        present = [embedding for embedding in embeddings if embedding is not None]
+        if not present:
+            return np.zeros((0, 0), dtype=np.float32), mask
+
+        return normalize_rows(present), mask
 
     def cosine_similarity(self, vec1, vec2):
         """
@@ -111,36 +258,59 @@ class EmbeddingService:
 
         return float(similarity)
 
-    def find_most_similar(self, query_text, texts, top_k=5):
+    def rank_similar(self, query_text, texts, top_k=5, query_vector=None):
         """
-        Find most similar texts to query
+        Rank texts by similarity to query, skipping texts that failed to embed
 
         Args:
             query_text: Query text
             texts: List of texts to search
             top_k: Number of results to return
+            query_vector: Precomputed embedding of query_text (optional)
 
         Returns:
-            list: [(text, similarity_score), ...]
+            dict: {
+                'results': [(text, similarity_score), ...],
+                'candidates': int,  # number of texts passed in
+                'scored': int       # number of texts that had a vector
+            }
         """
+        ranking = {'results': [], 'candidates': len(texts), 'scored': 0}
+
         # Embed query
-        query_embedding = self.create_embedding(query_text)
+        query_embedding = query_vector if query_vector is not None else self.create_embedding(query_text)
+        if query_embedding is None or not texts:
+            return ranking
+
+        # Embed all texts; only those with a vector take part in scoring
+        matrix, mask = self.embed_with_mask(texts)
+        positions = np.flatnonzero(mask)
+        ranking['scored'] = int(positions.size)
+        if not positions.size:
+            return ranking
+
+        # Score every candidate in one matmul and pick the top_k
+        indices, scores = score_matrix(query_embedding, matrix, top_k)
+        ranking['results'] = [(texts[positions[i]], float(score)) for i, score in zip(indices, scores)]
 
-        # Embed all texts
-        text_embeddings = self.batch_embed(texts)
+        return ranking
 
-        # Calculate similarities
-        similarities = []
-        for i, text_embedding in enumerate(text_embeddings):
-            similarity = self.cosine_similarity(query_embedding, text_embedding)
-            similarities.append((texts[i], similarity))
+    def find_most_similar(self, query_text, texts, top_k=5):
+        """
+        Find most similar texts to query
 
-        # Sort by similarity (descending)
-        similarities.sort(key=lambda x: x[1], reverse=True)
+        Args:
+            query_text: Query text
+            texts: List of texts to search
+            top_k: Number of results to return
 
-        return similarities[:top_k]
+        Returns:
+            list: [(text, similarity_score), ...]
+        """
+        return self.rank_similar(query_text, texts, top_k)['results']
 
     def clear_cache(self):
         """Clear embedding cache"""
-        self.cache = {}
+        if self.cache is not None:
+            self.cache.clear()
         print("Embedding cache cleared")
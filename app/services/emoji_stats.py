@@ -0,0 +1,212 @@
+"""
+Precomputed emoji performance table for PostCrafterPro
+
+Emoji guidelines used to regex-scan every tweet on each request. The table
+is built once per version of the X Analytics data (a hash of the post texts
+and engagement rates), kept in memory and persisted to disk, so other
+workers and restarts reuse it without scanning the tweets again.
+"""
+import hashlib
+import json
+import os
+import re
+import statistics
+import threading
+from pathlib import Path
+
+
+# Bump when the persisted table layout changes, so old files are rebuilt
+TABLE_FORMAT = 1
+
+_HASHTAG_PATTERN = re.compile(r'[#＃]([^\s#＃]+)')
+
+
+def extract_hashtags(text):
+    """
+    Get the hashtags of a post, used as its themes
+
+    Args:
+        text: Post text
+
+    Returns:
+        set: Lowercased hashtags without '#'
+    """
+    return {tag.lower() for tag in _HASHTAG_PATTERN.findall(text)}
+
+
+def data_version(tweets, extractor_version=0):
+    """
+    Hash the data an emoji table is built from
+
+    Args:
+        tweets: PostColumns
+        extractor_version: Emoji tokenizer version (tables built by another
+            tokenizer are not reused)
+
+    Returns:
+        str: Hex digest that changes when any text or engagement rate changes
+    """
+    digest = hashlib.sha1(f"{TABLE_FORMAT}:{extractor_version}:{len(tweets)}:".encode('utf-8'))
+    digest.update(tweets.text_blob.encode('utf-8'))
+    digest.update(tweets.offsets.tobytes())
+    digest.update(tweets.column('engagement_rate').tobytes())
+    return digest.hexdigest()
+
+
+class EmojiStatsTable:
+    """
+    Per-emoji counts, engagement-rate sums and medians, with a per-theme
+    (hashtag) breakdown
+
+    Only posts with text and a non-zero engagement rate are counted, and
+    an emoji counts once per post.
+    """
+
+    def __init__(self, path=None):
+        """
+        Initialize an empty table
+
+        Args:
+            path: JSON file the table is persisted to (default: data/emoji_stats.json)
+        """
+        if path is None:
+            data_dir = Path(__file__).parent.parent.parent / 'data'
+            path = os.getenv('EMOJI_STATS_PATH', str(data_dir / 'emoji_stats.json'))
+        self.path = Path(path)
+
+        self.version = None
+        self.post_count = 0
+        # emoji -> {'count', 'er_sum', 'er_median', 'themes': {theme: [count, er_sum]}}
+        self.stats = {}
+        self._lock = threading.Lock()
+
+    def ensure(self, tweets, extract_emojis, version):
+        """
+        Make the table match a data version, loading or building as needed
+
+        Args:
+            tweets: PostColumns the table is built from
+            extract_emojis: Callable returning the emojis of a text
+            version: data_version() of tweets
+
+        Returns:
+            bool: True if the table was rebuilt from the tweets
+        """
+        if self.version == version:
+            return False
+
+        with self._lock:
+            if self.version == version:
+                return False
+            if self._load(version):
+                return False
+            self._build(tweets, extract_emojis, version)
+            self._save()
+            return True
+
+    def _build(self, tweets, extract_emojis, version):
+        print(f"[INFO] 絵文字統計テーブルを構築中... ({len(tweets)}件の投稿)")
+
+        engagement_rates = tweets.column('engagement_rate')
+        rates_by_emoji = {}
+        themes_by_emoji = {}
+        post_count = 0
+
+        for i in range(len(tweets)):
+            engagement_rate = float(engagement_rates[i])
+            if engagement_rate == 0 or not tweets.lengths[i]:
+                continue
+
+            text = tweets.text(i)
+            emojis = set(extract_emojis(text))
+            if not emojis:
+                continue
+            post_count += 1
+
+            themes = extract_hashtags(text)
+            for emoji in emojis:
+                rates_by_emoji.setdefault(emoji, []).append(engagement_rate)
+                emoji_themes = themes_by_emoji.setdefault(emoji, {})
+                for theme in themes:
+                    entry = emoji_themes.setdefault(theme, [0, 0.0])
+                    entry[0] += 1
+                    entry[1] += engagement_rate
+
+        self.stats = {
+            emoji: {
+                'count': len(rates),
+                'er_sum': sum(rates),
+                'er_median': statistics.median(rates),
+                'themes': themes_by_emoji.get(emoji, {})
+            }
+            for emoji, rates in rates_by_emoji.items()
+        }
+        self.post_count = post_count
+        self.version = version
+        print(f"[OK] 絵文字統計テーブル: {len(self.stats)}種類 (バージョン {version[:8]})")
+
+    def _load(self, version):
+        """Load the persisted table if it was built from the same data version"""
+        if not self.path.exists():
+            return False
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"[WARN] Failed to load emoji stats: {e}")
+            return False
+
+        if data.get('version') != version:
+            return False
+
+        self.stats = data['stats']
+        self.post_count = data['post_count']
+        self.version = version
+        print(f"[OK] Loaded emoji stats: {len(self.stats)} emojis (version {version[:8]})")
+        return True
+
+    def _save(self):
+        """Write the table atomically so other workers never read half a file"""
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_name(f'{self.path.stem}.{os.getpid()}.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(
+                    {'version': self.version, 'post_count': self.post_count, 'stats': self.stats},
+                    f, ensure_ascii=False
+                )
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            print(f"[WARN] Failed to save emoji stats: {e}")
+
+    def ranked(self, min_occurrences=5, theme=None):
+        """
+        Emojis with enough occurrences and their average engagement rate
+
+        Args:
+            min_occurrences: Minimum number of posts an emoji must appear in
+            theme: Optional hashtag (with or without '#'); only posts with
+                that hashtag are counted
+
+        Returns:
+            dict: {emoji: {'avg_er', 'count', 'total_er', 'median_er'}}
+                (median_er is None for theme breakdowns)
+        """
+        if theme:
+            theme = theme.lstrip('#＃').lower()
+
+        ranked = {}
+        for emoji, data in self.stats.items():
+            if theme:
+                count, total_er = data['themes'].get(theme, (0, 0.0))
+                median_er = None
+            else:
+                count, total_er, median_er = data['count'], data['er_sum'], data['er_median']
+            if count >= min_occurrences:
+                ranked[emoji] = {
+                    'avg_er': total_er / count,
+                    'count': count,
+                    'total_er': total_er,
+                    'median_er': median_er
+                }
+        return ranked
@@ -0,0 +1,131 @@
+"""
+Hybrid lexical + semantic retrieval of past posts for PostCrafterPro
+
+Ranks posts by BM25 over character n-grams and by embedding similarity and
+fuses the two rankings with reciprocal rank fusion (RRF). The lexical
+ranking also acts as a prefilter: only its best candidates are scored with
+vectors, so vector scoring cost stays flat as the archive grows.
+"""
+import os
+
+from app.services.keyword_index import NgramIndex
+
+
+def reciprocal_rank_fusion(rankings, k=60, weights=None):
+    """
+    Fuse several rankings with reciprocal rank fusion
+
+    Args:
+        rankings: Lists of doc ids, best first
+        k: RRF constant (larger = flatter rank weighting)
+        weights: Optional weight per ranking (default: 1.0 each)
+
+    Returns:
+        dict: {doc_id: fused score}
+    """
+    weights = weights or [1.0] * len(rankings)
+    fused = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, doc_id in enumerate(ranking, 1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + weight / (k + rank)
+    return fused
+
+
+class HybridRetriever:
+    """
+    BM25 + embedding ranking over a list of post texts
+
+    Post texts are identified by their position in the list passed to
+    rank(); the n-gram index is kept across calls and only re-indexes
+    positions whose text changed.
+    """
+
+    def __init__(self, candidate_limit=None, rrf_k=None, lexical_weight=None):
+        """
+        Initialize the retriever
+
+        Args:
+            candidate_limit: Lexical candidates passed on to vector scoring
+                (default: RAG_HYBRID_CANDIDATES or 50)
+            rrf_k: RRF constant (default: RAG_HYBRID_RRF_K or 60)
+            lexical_weight: Weight of the BM25 ranking relative to the
+                vector ranking (default: RAG_HYBRID_LEXICAL_WEIGHT or 1.0)
+        """
+        self.candidate_limit = candidate_limit or int(os.getenv('RAG_HYBRID_CANDIDATES', '50'))
+        self.rrf_k = rrf_k or int(os.getenv('RAG_HYBRID_RRF_K', '60'))
+        self.lexical_weight = (
+            lexical_weight if lexical_weight is not None
+            else float(os.getenv('RAG_HYBRID_LEXICAL_WEIGHT', '1.0'))
+        )
+        self.index = NgramIndex()
+
+    def _candidates(self, lexical_ranking, n_texts, top_k):
+        """
+        Positions to score with vectors
+
+        The best BM25 hits, or every position when the archive is small or
+        too few posts share any n-gram with the query.
+        """
+        limit = max(self.candidate_limit, top_k)
+        if n_texts <= limit or len(lexical_ranking) < top_k:
+            return list(range(n_texts))
+        return lexical_ranking[:limit]
+
+    def rank(self, query, texts, top_k=5, vector_scorer=None):
+        """
+        Rank texts against a query
+
+        Args:
+            query: Query text
+            texts: Post texts (positions are the result ids)
+            top_k: Number of results to return
+            vector_scorer: Callable taking a list of positions and returning
+                [(position, similarity), ...] best first, for the positions
+                that have a vector. None ranks by BM25 only.
+
+        Returns:
+            dict: {
+                'results': [{'position', 'score', 'similarity', 'bm25'}, ...],
+                'candidates': int,  # positions passed to vector scoring
+                'scored': int       # positions that had a vector
+            }
+        """
+        ranking = {'results': [], 'candidates': 0, 'scored': 0}
+        if not texts:
+            return ranking
+
+        # One locked call: a concurrent rank() with other texts cannot
+        # re-sync the shared index before these scores are taken
+        bm25 = self.index.sync_bm25(texts, query)
+        lexical_ranking = sorted(bm25, key=lambda position: (-bm25[position], position))
+
+        candidates = self._candidates(lexical_ranking, len(texts), top_k)
+        ranking['candidates'] = len(candidates)
+
+        similarities = {}
+        vector_ranking = []
+        if vector_scorer is not None and candidates:
+            for position, similarity in vector_scorer(candidates):
+                similarities[position] = similarity
+                vector_ranking.append(position)
+        ranking['scored'] = len(vector_ranking)
+
+        # Both rankings cover the same candidate set
+        candidate_set = set(candidates)
+        fused = reciprocal_rank_fusion(
+            [[position for position in lexical_ranking if position in candidate_set], vector_ranking],
+            k=self.rrf_k,
+            weights=[self.lexical_weight, 1.0]
+        )
+
+        order = sorted(fused, key=lambda position: (-fused[position], position))[:top_k]
+        ranking['results'] = [
+            {
+                'position': position,
+                'score': fused[position],
+                'similarity': similarities.get(position),
+                'bm25': bm25.get(position, 0.0)
+            }
+            for position in order
+        ]
+        return ranking
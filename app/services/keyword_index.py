@@ -0,0 +1,261 @@
+"""
+Character n-gram inverted index over past posts for PostCrafterPro
+
+Japanese posts have no whitespace between words, so texts are indexed by
+character 1-grams and 2-grams. A keyword lookup intersects the posting
+lists of its 2-grams (its 1-gram for single characters) and only checks
+the few remaining candidates for the full substring. The same postings
+give BM25 scores for ranking posts against a longer query.
+"""
+import math
+import threading
+import unicodedata
+
+
+NGRAM_SIZES = (1, 2)
+
+
+def normalize_text(text):
+    """
+    Normalize text for indexing and lookups
+
+    NFKC folds full-width/half-width variants (e.g. "ＡＢＣ" and "ABC") and
+    the result is lowercased.
+
+    Args:
+        text: Any value (converted with str())
+
+    Returns:
+        str: Normalized text
+    """
+    return unicodedata.normalize('NFKC', str(text)).lower()
+
+
+def char_ngrams(text, sizes=NGRAM_SIZES):
+    """
+    Yield every character n-gram of a (normalized) text
+
+    Args:
+        text: Normalized text
+        sizes: n-gram lengths to produce
+
+    Yields:
+        str: n-grams in order, one per occurrence
+    """
+    for n in sizes:
+        for i in range(len(text) - n + 1):
+            yield text[i:i + n]
+
+
+class NgramIndex:
+    """
+    Inverted index from character n-grams to documents
+
+    Documents are identified by their position in the list passed to sync(),
+    e.g. the record index of a worksheet. Each posting keeps the term
+    frequency of the n-gram in the document, and document lengths are kept
+    for scoring.
+    """
+
+    def __init__(self):
+        self.texts = []
+        self.doc_lengths = []
+        # n-gram -> {doc_id: term frequency}
+        self.postings = {}
+        # Non-empty documents and their total length (for BM25 avgdl)
+        self._live_docs = 0
+        self._total_length = 0
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.texts)
+
+    def _add(self, doc_id, text):
+        counts = {}
+        for gram in char_ngrams(text):
+            counts[gram] = counts.get(gram, 0) + 1
+        for gram, tf in counts.items():
+            self.postings.setdefault(gram, {})[doc_id] = tf
+        self.texts[doc_id] = text
+        self.doc_lengths[doc_id] = len(text)
+        if text:
+            self._live_docs += 1
+            self._total_length += len(text)
+
+    def _remove(self, doc_id):
+        text = self.texts[doc_id]
+        for gram in set(char_ngrams(text)):
+            posting = self.postings.get(gram)
+            if posting is None:
+                continue
+            posting.pop(doc_id, None)
+            if not posting:
+                del self.postings[gram]
+        if text:
+            self._live_docs -= 1
+            self._total_length -= len(text)
+        self.texts[doc_id] = ''
+        self.doc_lengths[doc_id] = 0
+
+    def sync(self, texts):
+        """
+        Bring the index in line with the current document texts
+
+        Only documents whose text changed (or that are new) are re-indexed;
+        documents past the end of ``texts`` are dropped.
+
+        Args:
+            texts: Current document texts, by doc id
+
+        Returns:
+            int: Number of documents added, changed or removed
+        """
+        normalized = [normalize_text(text) for text in texts]
+
+        with self._lock:
+            changed = 0
+
+            for doc_id in range(len(normalized), len(self.texts)):
+                self._remove(doc_id)
+                changed += 1
+            del self.texts[len(normalized):]
+            del self.doc_lengths[len(normalized):]
+
+            for doc_id, text in enumerate(normalized):
+                if doc_id < len(self.texts):
+                    if self.texts[doc_id] == text:
+                        continue
+                    self._remove(doc_id)
+                else:
+                    self.texts.append('')
+                    self.doc_lengths.append(0)
+                self._add(doc_id, text)
+                changed += 1
+
+            return changed
+
+    def query_grams(self, query):
+        """
+        n-grams a document must contain to match a query as a substring
+
+        Args:
+            query: Raw query text
+
+        Returns:
+            list: Distinct 2-grams of the normalized query (its 1-gram when
+                the query is a single character, [] when it is empty)
+        """
+        query = normalize_text(query)
+        size = 2 if len(query) >= 2 else 1
+        return list(dict.fromkeys(char_ngrams(query, (size,))))
+
+    def candidates(self, query):
+        """
+        Documents that contain every n-gram of the query
+
+        Args:
+            query: Raw query text
+
+        Returns:
+            set: Candidate doc ids (a superset of the substring matches)
+        """
+        grams = self.query_grams(query)
+        if not grams:
+            return set()
+
+        with self._lock:
+            postings = [self.postings.get(gram) for gram in grams]
+            if any(posting is None for posting in postings):
+                return set()
+
+            # Intersect starting from the rarest n-gram
+            postings.sort(key=len)
+            result = set(postings[0])
+            for posting in postings[1:]:
+                result.intersection_update(posting)
+                if not result:
+                    break
+            return result
+
+    def search(self, keyword, limit=None):
+        """
+        Find documents containing a keyword
+
+        Args:
+            keyword: Keyword to search for (case and width insensitive)
+            limit: Maximum number of results (None = all)
+
+        Returns:
+            list: Matching doc ids in document order
+        """
+        needle = normalize_text(keyword)
+        if not needle:
+            return []
+
+        matches = []
+        with self._lock:
+            for doc_id in sorted(self.candidates(keyword)):
+                if needle in self.texts[doc_id]:
+                    matches.append(doc_id)
+                    if limit is not None and len(matches) >= limit:
+                        break
+        return matches
+
+    def bm25(self, query, k1=1.2, b=0.75):
+        """
+        Score documents against a query with Okapi BM25 over its n-grams
+
+        Every distinct 2-gram of the query is a term, so documents sharing
+        any part of the query score above zero and documents sharing rare
+        n-grams (e.g. product names) score highest.
+
+        Args:
+            query: Raw query text
+            k1: Term frequency saturation
+            b: Document length normalization
+
+        Returns:
+            dict: {doc_id: score} for documents sharing at least one n-gram
+        """
+        grams = self.query_grams(query)
+        scores = {}
+
+        with self._lock:
+            if not grams or not self._live_docs:
+                return scores
+
+            n_docs = self._live_docs
+            avg_length = self._total_length / n_docs
+
+            for gram in grams:
+                posting = self.postings.get(gram)
+                if not posting:
+                    continue
+                df = len(posting)
+                idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+                for doc_id, tf in posting.items():
+                    norm = k1 * (1 - b + b * self.doc_lengths[doc_id] / avg_length)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (k1 + 1) / (tf + norm)
+
+        return scores
+
+    def sync_bm25(self, texts, query, k1=1.2, b=0.75):
+        """
+        sync() then bm25() under one lock
+
+        Callers sharing the index with different text lists could otherwise
+        re-sync it between another caller's sync and scoring, and the
+        returned doc ids would point into the wrong list.
+
+        Args:
+            texts: Current document texts, by doc id
+            query: Raw query text
+            k1: Term frequency saturation
+            b: Document length normalization
+
+        Returns:
+            dict: {doc_id: score} over ``texts``
+        """
+        with self._lock:
+            self.sync(texts)
+            return self.bm25(query, k1, b)
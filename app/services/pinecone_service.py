@@ -4,6 +4,7 @@ Pinecone RAG integration for PostCrafterPro
 Searches the midori-anzen-v2 index (65,098 records) for relevant product information
 """
 import os
+from concurrent.futures import ThreadPoolExecutor
 from pinecone import Pinecone, ServerlessSpec
 from anthropic import Anthropic
 
@@ -41,6 +42,9 @@ class PineconeService:
             print(f"[ERROR] Failed to connect to Pinecone: {e}")
             raise
 
+        # Upper bound on parallel index.query calls for multi-URL search
+        self.max_workers = int(os.getenv('PINECONE_MAX_WORKERS', 4))
+
         # Initialize Anthropic for embeddings
         anthropic_key = os.getenv('ANTHROPIC_API_KEY')
         if anthropic_key:
@@ -76,6 +80,74 @@ class PineconeService:
             # Fallback: return zero vector
             return [0.0] * 1536
 
+    def _create_embeddings(self, texts):
+        """
+        Create embedding vectors for several texts in one API call
+
+        Args:
+            texts: List of texts to embed
+
+        Returns:
+            list: Embedding vector for each text, or None for every text if
+                the request failed
+        """
+        if not self.anthropic:
+            raise ValueError("Anthropic client not initialized")
+
+        try:
+            response = self.anthropic.embeddings.create(
+                model="voyage-3-lite",
+                input=texts
+            )
+            return response.embeddings
+
+        except Exception as e:
+            print(f"Error creating embeddings: {e}")
+            return [None] * len(texts)
+
+    def _format_matches(self, results):
+        """
+        Convert Pinecone query matches into result dictionaries
+
+        Args:
+            results: Response from index.query
+
+        Returns:
+            list: Formatted results
+        """
+        formatted_results = []
+        for match in results.get('matches', []):
+            formatted_results.append({
+                'id': match.get('id'),
+                'score': match.get('score'),
+                'metadata': match.get('metadata', {}),
+                'title': match.get('metadata', {}).get('title', ''),
+                'description': match.get('metadata', {}).get('description', ''),
+                'content': match.get('metadata', {}).get('content', ''),
+                'url': match.get('metadata', {}).get('url', '')
+            })
+
+        return formatted_results
+
+    def search_by_vector(self, query_vector, top_k=5):
+        """
+        Search for product information with a precomputed query vector
+
+        Args:
+            query_vector: Query embedding
+            top_k: Number of results to return
+
+        Returns:
+            list: List of relevant product information
+        """
+        results = self.index.query(
+            vector=query_vector,
+            top_k=top_k,
+            include_metadata=True
+        )
+
+        return self._format_matches(results)
+
     def search_by_url(self, url, top_k=5):
         """
         Search for product information by URL
@@ -92,39 +164,26 @@ class PineconeService:
             query_vector = self._create_embedding(url)
 
             # Query Pinecone
-            results = self.index.query(
-                vector=query_vector,
-                top_k=top_k,
-                include_metadata=True
-            )
-
-            # Format results
-            formatted_results = []
-            for match in results.get('matches', []):
-                formatted_results.append({
-                    'id': match.get('id'),
-                    'score': match.get('score'),
-                    'metadata': match.get('metadata', {}),
-                    'title': match.get('metadata', {}).get('title', ''),
-                    'description': match.get('metadata', {}).get('description', ''),
-                    'content': match.get('metadata', {}).get('content', ''),
-                    'url': match.get('metadata', {}).get('url', '')
-                })
-
-            return formatted_results
+            return self.search_by_vector(query_vector, top_k=top_k)
 
         except Exception as e:
             print(f"Error in Pinecone search by URL: {e}")
             return []
 
-    def search_by_multiple_urls(self, urls, top_k_per_url=3, total_top_k=5):
+    def search_by_multiple_urls(self, urls, top_k_per_url=3, total_top_k=5, concurrent=True,
+                                query_vectors=None):
         """
         Search for product information by multiple URLs
 
+        In concurrent mode all URLs are embedded in one batched call and the
+        index queries run in parallel on a bounded thread pool.
+
         Args:
             urls: List of product URLs or comma-separated string
             top_k_per_url: Number of results per URL
             total_top_k: Total number of results to return after merging
+            concurrent: Embed in one batch and query in parallel (default True)
+            query_vectors: Precomputed embedding per URL (optional, skips embedding)
 
         Returns:
             list: List of relevant product information (deduplicated and sorted by score)
@@ -140,23 +199,25 @@ class PineconeService:
 
         print(f"[INFO] Searching Pinecone for {len(url_list)} URLs...")
 
+        if query_vectors is not None or (concurrent and len(url_list) > 1):
+            per_url_results = self._search_urls_concurrently(url_list, top_k_per_url, query_vectors)
+        else:
+            per_url_results = []
+            for url in url_list:
+                try:
+                    per_url_results.append(self.search_by_url(url, top_k=top_k_per_url))
+                except Exception as e:
+                    print(f"[WARN] Error searching URL {url}: {e}")
+
         all_results = []
         seen_ids = set()
 
-        # Search each URL
-        for url in url_list:
-            try:
-                results = self.search_by_url(url, top_k=top_k_per_url)
-
-                # Add unique results
-                for result in results:
-                    if result['id'] not in seen_ids:
-                        all_results.append(result)
-                        seen_ids.add(result['id'])
-
-            except Exception as e:
-                print(f"[WARN] Error searching URL {url}: {e}")
-                continue
+        # Add unique results (in URL order)
+        for results in per_url_results:
+            for result in results:
+                if result['id'] not in seen_ids:
+                    all_results.append(result)
+                    seen_ids.add(result['id'])
 
         # Sort by score (descending)
         all_results.sort(key=lambda x: x['score'], reverse=True)
@@ -167,6 +228,41 @@ class PineconeService:
 
         return final_results
 
+    def _search_urls_concurrently(self, url_list, top_k_per_url, query_vectors=None):
+        """
+        Embed URLs in one call and fan out the index queries
+
+        Args:
+            url_list: List of URLs
+            top_k_per_url: Number of results per URL
+            query_vectors: Precomputed embedding per URL (optional; URLs
+                whose vector is None are searched with search_by_url)
+
+        Returns:
+            list: One result list per URL, in input order
+        """
+        if query_vectors is None:
+            try:
+                query_vectors = self._create_embeddings(url_list)
+            except Exception as e:
+                # Same as the sequential path: a failed URL yields no results
+                print(f"[WARN] Error embedding URLs: {e}")
+                return [[] for _ in url_list]
+
+        def query(url, vector):
+            if vector is None:
+                # Not embedded in the batch: embed this URL on its own
+                return self.search_by_url(url, top_k=top_k_per_url)
+            try:
+                return self.search_by_vector(vector, top_k=top_k_per_url)
+            except Exception as e:
+                print(f"[WARN] Error searching URL {url}: {e}")
+                return []
+
+        workers = max(1, min(self.max_workers, len(url_list)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(query, url_list, query_vectors))
+
     def search_by_keywords(self, keywords, top_k=5):
         """
         Search for information by keywords
@@ -189,26 +285,7 @@ class PineconeService:
             query_vector = self._create_embedding(query_text)
 
             # Query Pinecone
-            results = self.index.query(
-                vector=query_vector,
-                top_k=top_k,
-                include_metadata=True
-            )
-
-            # Format results
-            formatted_results = []
-            for match in results.get('matches', []):
-                formatted_results.append({
-                    'id': match.get('id'),
-                    'score': match.get('score'),
-                    'metadata': match.get('metadata', {}),
-                    'title': match.get('metadata', {}).get('title', ''),
-                    'description': match.get('metadata', {}).get('description', ''),
-                    'content': match.get('metadata', {}).get('content', ''),
-                    'url': match.get('metadata', {}).get('url', '')
-                })
-
-            return formatted_results
+            return self.search_by_vector(query_vector, top_k=top_k)
 
         except Exception as e:
             print(f"Error in Pinecone search by keywords: {e}")
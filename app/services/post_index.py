@@ -0,0 +1,248 @@
+"""
+Persistent vector index of past posts for PostCrafterPro
+
+Keeps one normalized embedding per past post in a NumPy matrix on disk so a
+similarity search costs one query embedding plus a single matrix-vector product.
+"""
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+
+import numpy as np
+
+from app.services.embedding_service import normalize_rows, top_k_indices
+
+
+class PastPostIndex:
+    """
+    Incrementally updated matrix of past-post embeddings
+
+    Posts are identified by a hash of their text. Only posts whose id is not
+    in the index yet are embedded, so the index grows as new rows appear in
+    the published or analytics sheet.
+
+    The index is stored with the embedding model and dimension that built it
+    and is rebuilt when either changes, so vectors of different models never
+    mix. Readers use an immutable (ids, positions, matrix) snapshot that
+    sync() replaces in a single assignment, so a query never sees positions
+    from one state and the matrix of another.
+    """
+
+    def __init__(self, index_dir=None, model=None):
+        """
+        Initialize the index and load it from disk if present
+
+        Args:
+            index_dir: Directory holding the index files (default: data/)
+            model: Embedding model name the vectors come from
+        """
+        if index_dir is None:
+            default_dir = Path(__file__).parent.parent.parent / 'data'
+            index_dir = os.getenv('PAST_POST_INDEX_DIR', str(default_dir))
+        self.index_dir = Path(index_dir)
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+
+        self.vectors_file = self.index_dir / 'past_post_vectors.npy'
+        self.ids_file = self.index_dir / 'past_post_ids.json'
+
+        self.model = model
+        self._lock = threading.Lock()
+        self._snapshot = ((), {}, np.zeros((0, 0), dtype=np.float32))
+        self._loaded_mtime = None
+
+        self._load()
+
+    @property
+    def ids(self):
+        """Indexed post ids, in matrix row order"""
+        return self._snapshot[0]
+
+    @property
+    def matrix(self):
+        """Normalized embeddings, one row per post id"""
+        return self._snapshot[2]
+
+    @staticmethod
+    def make_id(text):
+        """
+        Build the post id for a text
+
+        Args:
+            text: Post text
+
+        Returns:
+            str: Stable id derived from the text
+        """
+        return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+    def _load(self):
+        """Load ids and vectors from disk (no-op if unchanged since last load)"""
+        if not self.vectors_file.exists() or not self.ids_file.exists():
+            return
+
+        mtime = self.ids_file.stat().st_mtime
+        if mtime == self._loaded_mtime:
+            return
+
+        try:
+            with open(self.ids_file, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            matrix = np.load(self.vectors_file)
+
+            # Older index files are a bare id list with no model recorded
+            if not isinstance(meta, dict) or meta.get('model') != self.model:
+                print(f"[WARN] Past post index was built with another embedding model, rebuilding")
+                self._loaded_mtime = mtime
+                return
+
+            ids = tuple(meta['ids'])
+            if len(ids) != matrix.shape[0] or (ids and matrix.shape[1] != meta.get('dimension')):
+                print(f"[WARN] Past post index is inconsistent, rebuilding")
+                return
+
+            positions = {post_id: i for i, post_id in enumerate(ids)}
+            self._snapshot = (ids, positions, np.ascontiguousarray(matrix, dtype=np.float32))
+            self._loaded_mtime = mtime
+            print(f"[OK] Loaded past post index: {len(ids)} posts")
+
+        except Exception as e:
+            print(f"[WARN] Failed to load past post index: {e}")
+
+    def _save(self, ids, matrix):
+        """Write ids and vectors atomically so other workers never see half a file"""
+        tmp_vectors = self.vectors_file.with_name(f'{self.vectors_file.stem}.{os.getpid()}.tmp.npy')
+        tmp_ids = self.ids_file.with_name(f'{self.ids_file.stem}.{os.getpid()}.tmp.json')
+
+        np.save(tmp_vectors, matrix)
+        with open(tmp_ids, 'w', encoding='utf-8') as f:
+            json.dump({'model': self.model, 'dimension': int(matrix.shape[1]), 'ids': list(ids)}, f)
+
+        os.replace(tmp_vectors, self.vectors_file)
+        os.replace(tmp_ids, self.ids_file)
+        self._loaded_mtime = self.ids_file.stat().st_mtime
+
+    def __len__(self):
+        return len(self._snapshot[0])
+
+    def sync(self, texts, embed_fn):
+        """
+        Add any texts that are not indexed yet
+
+        Args:
+            texts: Current past-post texts
+            embed_fn: Callable taking a list of texts and returning vectors
+                (e.g. EmbeddingService.batch_embed)
+
+        Returns:
+            int: Number of newly indexed posts
+        """
+        with self._lock:
+            # Pick up rows another worker may have added
+            self._load()
+            return self._sync_locked(texts, embed_fn)
+
+    def _sync_locked(self, texts, embed_fn):
+        """sync() body; the caller holds self._lock"""
+        ids, positions, matrix = self._snapshot
+
+        new_texts = {}
+        for text in texts:
+            post_id = self.make_id(text)
+            if post_id not in positions and post_id not in new_texts:
+                new_texts[post_id] = text
+
+        if not new_texts:
+            return 0
+
+        print(f"[INFO] Past post index: embedding {len(new_texts)} new posts")
+        vectors = embed_fn(list(new_texts.values()))
+
+        # Failed embeddings (None) stay out so they are retried next sync
+        new_ids = [post_id for post_id, vector in zip(new_texts, vectors) if vector is not None]
+        if not new_ids:
+            return 0
+
+        new_matrix = normalize_rows([vector for vector in vectors if vector is not None])
+
+        if matrix.size and matrix.shape[1] != new_matrix.shape[1]:
+            # Same model name but another dimension: the old vectors are unusable
+            print(f"[WARN] Past post index dimension changed "
+                  f"({matrix.shape[1]} -> {new_matrix.shape[1]}), rebuilding")
+            self._snapshot = ((), {}, np.zeros((0, 0), dtype=np.float32))
+            return self._sync_locked(texts, embed_fn)
+
+        if matrix.size:
+            matrix = np.ascontiguousarray(np.vstack([matrix, new_matrix]))
+        else:
+            matrix = np.ascontiguousarray(new_matrix)
+
+        # Build the next state on copies, then publish it in one assignment
+        positions = dict(positions)
+        for offset, post_id in enumerate(new_ids):
+            positions[post_id] = len(ids) + offset
+        ids = ids + tuple(new_ids)
+        self._snapshot = (ids, positions, matrix)
+
+        try:
+            self._save(ids, matrix)
+        except Exception as e:
+            print(f"[WARN] Failed to save past post index: {e}")
+
+        print(f"[OK] Past post index: {len(ids)} posts ({len(new_ids)} added)")
+        return len(new_ids)
+
+    def count_indexed(self, ids):
+        """
+        Count how many of the given post ids have a vector
+
+        Args:
+            ids: Iterable of post ids
+
+        Returns:
+            int: Number of ids present in the index
+        """
+        positions = self._snapshot[1]
+        return sum(1 for post_id in ids if post_id in positions)
+
+    def query(self, query_vector, top_k=5, ids=None):
+        """
+        Score indexed posts against a query vector
+
+        Args:
+            query_vector: Query embedding
+            top_k: Number of results to return
+            ids: Optional iterable of post ids to restrict the search to
+
+        Returns:
+            list: [(post_id, similarity_score), ...] sorted by score (descending)
+        """
+        # One consistent state for the whole query, even if sync() runs meanwhile
+        index_ids, index_positions, matrix = self._snapshot
+
+        if not index_ids or query_vector is None:
+            return []
+
+        query = normalize_rows([query_vector])[0]
+        if not query.any() or query.shape[0] != matrix.shape[1]:
+            return []
+
+        # One matrix-vector product scores every indexed post
+        scores = matrix @ query
+
+        if ids is not None:
+            positions = np.array(
+                sorted({index_positions[post_id] for post_id in ids if post_id in index_positions}),
+                dtype=np.int64
+            )
+        else:
+            positions = np.arange(len(index_ids))
+
+        if positions.size == 0:
+            return []
+
+        candidate_scores = scores[positions]
+        order = top_k_indices(candidate_scores, top_k)
+
+        return [(index_ids[positions[i]], float(candidate_scores[i])) for i in order]
@@ -0,0 +1,154 @@
+"""
+Typed past-post record for PostCrafterPro
+
+Sheet rows arrive as get_all_records() dicts whose text and metric columns
+differ between the published sheet and the X Analytics tweet sheet. A Post
+is built once per row when the sheet is loaded: the text column is
+resolved and metrics are parsed to floats. The original row is kept as-is
+(shared, not copied) so responses still carry every sheet column.
+"""
+
+
+# Text column candidates, in priority order
+TEXT_FIELDS = (
+    '最終投稿',       # PostCrafterPro完成版
+    'ツイート本文',   # X Analytics tweet sheet
+    'text',           # Generic
+    '投稿本文',       # Alternative
+    '内容',           # Alternative
+)
+
+# Date column candidates, in priority order
+DATE_FIELDS = ('投稿日', 'date', '時間（日本1）')
+
+# X Analytics column -> Post attribute
+METRIC_FIELDS = {
+    'インプレッション': 'impressions',
+    'エンゲージメント': 'engagement',
+    'エンゲージメント率': 'engagement_rate',
+    'いいね': 'likes',
+    'リツイート': 'retweets',
+}
+
+
+def _first(record, fields):
+    """First non-empty value among fields, as a string ('' if none)"""
+    for field in fields:
+        value = record.get(field)
+        if value:
+            return str(value)
+    return ''
+
+
+def post_text(record):
+    """
+    Get the post text of a sheet record
+
+    Args:
+        record: Row dict from the published or analytics sheet
+
+    Returns:
+        str: Text of the first non-empty text column ('' if none)
+    """
+    return _first(record, TEXT_FIELDS)
+
+
+def parse_metric(value):
+    """
+    Parse a metric cell to float
+
+    Args:
+        value: Cell value (number, numeric string or '')
+
+    Returns:
+        float: Parsed value (0.0 if empty or not numeric)
+    """
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return 0.0
+
+
+def metric_attr(metric):
+    """
+    Map a metric column name (e.g. 'エンゲージメント率') to its Post attribute
+
+    Raises:
+        ValueError: If the metric is unknown
+    """
+    try:
+        return METRIC_FIELDS[metric]
+    except KeyError:
+        raise ValueError(f"Unknown metric: {metric}") from None
+
+
+class Post:
+    """
+    One past post with its text and pre-parsed metrics
+    """
+
+    __slots__ = ('text', 'date', 'impressions', 'engagement', 'engagement_rate', 'likes', 'retweets', 'raw')
+
+    def __init__(self, text, date='', impressions=0.0, engagement=0.0,
+                 engagement_rate=0.0, likes=0.0, retweets=0.0, raw=None):
+        self.text = text
+        self.date = date
+        self.impressions = impressions
+        self.engagement = engagement
+        self.engagement_rate = engagement_rate
+        self.likes = likes
+        self.retweets = retweets
+        # Original sheet row (URL, 決定事項, ...); read-only
+        self.raw = raw if raw is not None else {}
+
+    @classmethod
+    def from_record(cls, record):
+        """
+        Build a post from a sheet record
+
+        Args:
+            record: Row dict from get_all_records() / read_records()
+
+        Returns:
+            Post: Normalized post
+        """
+        metrics = {attr: parse_metric(record.get(field)) for field, attr in METRIC_FIELDS.items()}
+        return cls(post_text(record), _first(record, DATE_FIELDS), raw=record, **metrics)
+
+    def metric(self, metric):
+        """
+        Value of a metric by column name
+
+        Args:
+            metric: 'エンゲージメント率', 'インプレッション', 'エンゲージメント', 'いいね' or 'リツイート'
+
+        Returns:
+            float: Metric value
+        """
+        return getattr(self, metric_attr(metric))
+
+    def to_dict(self, **fields):
+        """
+        Plain dict for JSON responses and prompt formatting
+
+        Args:
+            **fields: Extra fields (e.g. similarity_score)
+
+        Returns:
+            dict: Original sheet columns, the parsed Post fields and the
+                extra fields (later ones win on a name clash)
+        """
+        return {
+            **self.raw,
+            'text': self.text,
+            'date': self.date,
+            'impressions': self.impressions,
+            'engagement': self.engagement,
+            'engagement_rate': self.engagement_rate,
+            'likes': self.likes,
+            'retweets': self.retweets,
+            **fields
+        }
+
+    def __repr__(self):
+        return f"Post(text={self.text[:20]!r}, engagement_rate={self.engagement_rate})"
@@ -0,0 +1,49 @@
+"""
+Compact table of past posts for PostCrafterPro retrieval
+
+Ranking works on positions in the table and results are looked up by
+position instead of being matched back by text.
+"""
+
+
+class PostTable:
+    """
+    Past posts with usable text, addressed by position
+
+    ``texts[i]`` is the text of ``posts[i]``. Posts with the same text keep
+    separate positions.
+    """
+
+    def __init__(self, posts):
+        self.posts = posts
+        self.texts = [post.text for post in posts]
+
+    @classmethod
+    def from_posts(cls, posts, min_length=10):
+        """
+        Build the table, dropping posts without enough text
+
+        Args:
+            posts: Post records from SheetsService.get_posts()
+            min_length: Posts with this many characters or fewer are dropped
+
+        Returns:
+            PostTable: Table of the remaining posts
+        """
+        return cls([post for post in posts if len(post.text) > min_length])
+
+    def __len__(self):
+        return len(self.posts)
+
+    def result(self, position, **fields):
+        """
+        Build a result dict for one post
+
+        Args:
+            position: Position in the table
+            **fields: Extra fields (e.g. similarity_score)
+
+        Returns:
+            dict: Post fields plus the extra fields
+        """
+        return self.posts[position].to_dict(**fields)
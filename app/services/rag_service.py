@@ -1,10 +1,17 @@
 """
 Integrated RAG service combining Pinecone, past posts, and X analytics
 """
+import os
+import threading
+import time
+from concurrent.futures import CancelledError, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from app.services.pinecone_service import PineconeService
 from app.services.sheets_service import SheetsService
-from app.services.embedding_service import EmbeddingService
+from app.services.embedding_service import EmbeddingService, score_matrix
 from app.services.analytics_service import AnalyticsService
+from app.services.post_index import PastPostIndex
+from app.services.hybrid_retriever import HybridRetriever
+from app.services.post_table import PostTable
 
 
 class RAGService:
@@ -15,8 +22,15 @@ class RAGService:
     3. X Analytics (performance insights)
     """
 
-    def __init__(self):
-        """Initialize all RAG components"""
+    def __init__(self, sheets=None, embedding=None, analytics=None):
+        """
+        Initialize all RAG components
+
+        Args:
+            sheets: Shared SheetsService (optional, created if omitted)
+            embedding: Shared EmbeddingService (optional, created if omitted)
+            analytics: Shared AnalyticsService (optional, created if omitted)
+        """
         # Pinecone temporarily disabled
         print("[INFO] Pinecone service disabled (temporary)")
         self.pinecone = None
@@ -30,30 +44,68 @@ class RAGService:
         #     self.pinecone = None
 
         try:
-            self.sheets = SheetsService()
+            self.sheets = sheets or SheetsService()
             print("[OK] Sheets service connected")
         except Exception as e:
             print(f"[WARN] Sheets service unavailable: {e}")
             self.sheets = None
 
         try:
-            self.embedding = EmbeddingService()
+            self.embedding = embedding or EmbeddingService()
             print("[OK] Embedding service connected")
         except Exception as e:
             print(f"[WARN] Embedding service unavailable: {e}")
             self.embedding = None
 
         try:
-            self.analytics = AnalyticsService()
+            # The index is tied to the embedding model that built it
+            model = self.embedding.model if self.embedding is not None else None
+            self.post_index = PastPostIndex(model=model)
+        except Exception as e:
+            print(f"[WARN] Past post index unavailable: {e}")
+            self.post_index = None
+
+        # BM25 + embedding ranking of past posts
+        self.retriever = HybridRetriever()
+
+        try:
+            self.analytics = analytics or AnalyticsService()
             print("[OK] Analytics service connected")
         except Exception as e:
             print(f"[WARN] Analytics service unavailable: {e}")
             self.analytics = None
 
+        # Context sources run concurrently, each with its own timeout (seconds)
+        default_timeout = float(os.getenv('RAG_SOURCE_TIMEOUT', 30))
+        self.source_timeouts = {
+            'pinecone': float(os.getenv('RAG_PINECONE_TIMEOUT', default_timeout)),
+            'similar_posts': float(os.getenv('RAG_SHEETS_TIMEOUT', default_timeout)),
+            'anniversary': float(os.getenv('RAG_SHEETS_TIMEOUT', default_timeout)),
+            'analytics': float(os.getenv('RAG_ANALYTICS_TIMEOUT', default_timeout)),
+            'embedding': float(os.getenv('RAG_EMBEDDING_TIMEOUT', 10))
+        }
+        self._max_workers = int(os.getenv('RAG_SOURCE_WORKERS', 8))
+        self._executor = self._new_executor()
+        # Timed-out sources still running on the current pool
+        self._abandoned = set()
+        self._executor_lock = threading.Lock()
+
+    def _new_executor(self):
+        return ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix='rag-source')
+
+    def close(self):
+        """Stop the source pool (called by the service registry on refresh)"""
+        with self._executor_lock:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
     def get_comprehensive_context(self, url=None, decided=None, anniversary=None):
         """
         Get comprehensive context from all sources
 
+        Pinecone, past posts, anniversary posts and X Analytics run
+        concurrently; each source has its own timeout so a slow Sheets read
+        cannot hold up the other results.
+
         Args:
             url: Product URL
             decided: Decided content
@@ -63,102 +115,319 @@ class RAGService:
             dict: {
                 'pinecone_results': [...],
                 'similar_posts': [...],
+                'similar_posts_scored': int,  # past posts actually scored
+                'similar_posts_candidates': int,
                 'analytics_insights': str,
-                'context_summary': str
+                'context_summary': str,
+                'timings': {source: ms, ..., 'embedding': ms, 'total': ms},
+                'timed_out': [source, ...]  # 'embedding' included
             }
         """
         context = {
             'pinecone_results': [],
             'similar_posts': [],
+            'similar_posts_scored': 0,
+            'similar_posts_candidates': 0,
             'analytics_insights': '',
-            'context_summary': ''
+            'context_summary': '',
+            'timings': {},
+            'timed_out': []
         }
+        started = time.perf_counter()
+        futures = {}
 
-        # 1. Search Pinecone (product info)
-        if self.pinecone and url:
-            try:
-                # Check if multiple URLs (comma-separated)
-                if ',' in url:
-                    # Use multiple URL search
-                    pinecone_results = self.pinecone.search_by_multiple_urls(
-                        urls=url,
-                        top_k_per_url=3,
-                        total_top_k=5
-                    )
-                    context['pinecone_results'] = pinecone_results
-                else:
-                    # Single URL search
-                    pinecone_results = self.pinecone.search_by_url(url, top_k=5)
-                    context['pinecone_results'] = pinecone_results
-
-                # Also search by keywords if decided is provided
-                if decided:
-                    keyword_results = self.pinecone.search_by_keywords(decided, top_k=3)
-                    # Merge unique results
-                    existing_ids = {r['id'] for r in context['pinecone_results']}
-                    for result in keyword_results:
-                        if result['id'] not in existing_ids:
-                            context['pinecone_results'].append(result)
-                            existing_ids.add(result['id'])
+        # X Analytics does not need query vectors - start it right away
+        if self.analytics and decided:
+            futures['analytics'] = (self._submit_timed(self._get_analytics_insights, decided), time.perf_counter())
 
-            except Exception as e:
-                print(f"Error in Pinecone search: {e}")
+        # 0. Plan queries: embed every text this request needs in one batch.
+        # Bounded like the sources; on timeout the sources wait for this same
+        # embedding within their own budget instead of calling the API again.
+        embed_future = self._submit_timed(self._embed_queries, url, decided, anniversary)
+        pending_embedding = None
+        try:
+            query_vectors, context['timings']['embedding'] = embed_future.result(
+                timeout=self.source_timeouts['embedding']
+            )
+        except FutureTimeoutError:
+            print(f"[WARN] embedding がタイムアウトしました ({self.source_timeouts['embedding']}s)")
+            self._abandon(embed_future)
+            context['timed_out'].append('embedding')
+            context['timings']['embedding'] = round(self.source_timeouts['embedding'] * 1000, 1)
+            pending_embedding = embed_future
+            query_vectors = {}
+        except Exception as e:
+            print(f"Error in query embedding: {e}")
+            query_vectors = {}
 
-        # 2. Search past posts (semantic search)
+        def vectors_for(source):
+            if pending_embedding is None:
+                return query_vectors
+            # Half the source's budget, so the search itself still fits in it
+            return self._await_vectors(pending_embedding, self.source_timeouts[source] / 2)
+
+        # 1-3. Vector searches run side by side
+        if self.pinecone and url:
+            def search_pinecone():
+                vectors = vectors_for('pinecone')
+                return self._search_pinecone(url, decided, vectors) if vectors is not None else []
+            futures['pinecone'] = (self._submit_timed(search_pinecone), time.perf_counter())
         if self.sheets and self.embedding and decided:
+            def search_similar():
+                vectors = vectors_for('similar_posts')
+                if vectors is None:
+                    # Embedding still running: rank by BM25 only
+                    return self.search_past_posts(decided, 5, embed_query=False)
+                return self.search_past_posts(decided, 5, vectors.get(decided))
+            futures['similar_posts'] = (self._submit_timed(search_similar), time.perf_counter())
+        if self.sheets and self.embedding and anniversary:
+            def search_anniversary():
+                vectors = vectors_for('anniversary')
+                if vectors is None:
+                    return self.search_past_posts(anniversary, 3, embed_query=False)['posts']
+                return self.find_similar_posts(anniversary, 3, vectors.get(anniversary))
+            futures['anniversary'] = (self._submit_timed(search_anniversary), time.perf_counter())
+
+        results = {}
+        for source, (future, submitted) in futures.items():
             try:
-                print(f"\n[INFO] 過去投稿の検索を開始...")
-                print(f"   クエリ: {decided}")
-                similar_posts = self.find_similar_posts(decided, top_k=5)
-                context['similar_posts'] = similar_posts
-                print(f"✅ [完了] 類似投稿 {len(similar_posts)}件 取得")
-
+                value, elapsed = future.result(timeout=self._remaining(source, submitted))
+                results[source] = value
+                context['timings'][source] = elapsed
+            except FutureTimeoutError:
+                print(f"[WARN] {source} がタイムアウトしました ({self.source_timeouts[source]}s)")
+                self._abandon(future)
+                context['timed_out'].append(source)
+                context['timings'][source] = round(self.source_timeouts[source] * 1000, 1)
             except Exception as e:
-                print(f"❌ [エラー] 過去投稿検索でエラー: {e}")
+                print(f"Error in {source} search: {e}")
                 import traceback
                 traceback.print_exc()
 
-        # 3. Anniversary-based search
-        if self.sheets and self.embedding and anniversary:
-            try:
-                anniversary_posts = self.find_similar_posts(anniversary, top_k=3)
-                # Merge with existing similar posts
-                existing_texts = {p.get('text', '') for p in context['similar_posts']}
-                for post in anniversary_posts:
-                    post_text = post.get('text', post.get('最終投稿', ''))
-                    if post_text and post_text not in existing_texts:
-                        context['similar_posts'].append(post)
-
-            except Exception as e:
-                print(f"Error in anniversary search: {e}")
-
-        # 4. Get X Analytics insights (NEW)
-        if self.analytics and decided:
-            try:
-                # Extract keywords from decided content
-                analytics_context = self.analytics.create_prompt_context(theme=decided)
-                context['analytics_insights'] = analytics_context
-                print("[OK] X Analytics insights generated")
-
-            except Exception as e:
-                print(f"Error getting analytics insights: {e}")
+        # 1. Pinecone (product info)
+        if 'pinecone' in results:
+            context['pinecone_results'] = results['pinecone']
+
+        # 2. Past posts (semantic search)
+        if 'similar_posts' in results:
+            search = results['similar_posts']
+            context['similar_posts'] = search['posts']
+            context['similar_posts_scored'] = search['scored']
+            context['similar_posts_candidates'] = search['candidates']
+            print(f"✅ [完了] 類似投稿 {len(search['posts'])}件 取得")
+
+        # 3. Anniversary-based posts - merge with existing similar posts
+        if 'anniversary' in results:
+            existing_texts = {p.get('text', '') for p in context['similar_posts']}
+            for post in results['anniversary']:
+                post_text = post.get('text', post.get('最終投稿', ''))
+                if post_text and post_text not in existing_texts:
+                    context['similar_posts'].append(post)
+
+        # 4. X Analytics insights
+        if 'analytics' in results:
+            context['analytics_insights'] = results['analytics']
+            print("[OK] X Analytics insights generated")
 
         # 5. Create context summary
         context['context_summary'] = self._create_summary(context)
+        context['timings']['total'] = round((time.perf_counter() - started) * 1000, 1)
+        print(f"[INFO] コンテキスト取得時間(ms): {context['timings']}")
 
         return context
 
-    def find_similar_posts(self, query, top_k=5):
+    def _submit_timed(self, fn, *args):
+        """
+        Run fn(*args) on the source pool and measure its latency
+
+        Returns:
+            Future: Resolves to (result, elapsed_ms)
+        """
+        def run():
+            source_started = time.perf_counter()
+            value = fn(*args)
+            return value, round((time.perf_counter() - source_started) * 1000, 1)
+
+        with self._executor_lock:
+            return self._executor.submit(run)
+
+    def _abandon(self, future):
+        """
+        Give up on a timed-out source
+
+        A source that has not started is cancelled. One that is still running
+        keeps its worker thread, so once half the pool is held by abandoned
+        sources the pool is replaced; the old one finishes its work and exits
+        without blocking new requests.
+        """
+        if future.cancel():
+            return
+
+        with self._executor_lock:
+            abandoned = self._abandoned
+            abandoned.add(future)
+            future.add_done_callback(abandoned.discard)
+
+            if len(abandoned) >= max(1, self._max_workers // 2):
+                print(f"[WARN] タイムアウトしたソースが{len(abandoned)}件実行中のため、スレッドプールを切り替えます")
+                self._executor.shutdown(wait=False)
+                self._executor = self._new_executor()
+                self._abandoned = set()
+
+    @staticmethod
+    def _await_vectors(embed_future, wait):
+        """
+        Wait for a query embedding that already timed out once
+
+        Args:
+            embed_future: Future of _embed_queries() (from _submit_timed)
+            wait: Seconds to wait at most
+
+        Returns:
+            dict or None: {text: vector or None}; {} if it failed or never
+                ran (sources then embed their own query), None if it is
+                still running (sources skip vector search)
+        """
+        try:
+            return embed_future.result(timeout=wait)[0]
+        except FutureTimeoutError:
+            return None
+        except CancelledError:
+            return {}
+        except Exception as e:
+            print(f"Error in query embedding: {e}")
+            return {}
+
+    def _remaining(self, source, submitted):
+        """Seconds left before source hits its timeout (measured from submission)"""
+        return max(0.0, self.source_timeouts[source] - (time.perf_counter() - submitted))
+
+    def _search_pinecone(self, url, decided, query_vectors):
+        """
+        Search Pinecone by URL(s) and by the decided text
+
+        Args:
+            url: Product URL(s), comma-separated
+            decided: Decided content
+            query_vectors: Vectors from _embed_queries(); a text without a
+                usable vector is embedded by Pinecone instead
+
+        Returns:
+            list: Merged, deduplicated product results
+        """
+        pinecone_results = []
+        url_list = self._split_urls(url)
+
+        # Check if multiple URLs (comma-separated)
+        if len(url_list) > 1:
+            # Use multiple URL search
+            pinecone_results = self.pinecone.search_by_multiple_urls(
+                urls=url_list,
+                top_k_per_url=3,
+                total_top_k=5,
+                query_vectors=[query_vectors.get(u) for u in url_list] if query_vectors else None
+            )
+        elif url_list:
+            # Single URL search; without a planned vector (not planned or
+            # embedding failed) Pinecone embeds it, as in the multi-URL search
+            vector = query_vectors.get(url_list[0])
+            if vector is None:
+                pinecone_results = self.pinecone.search_by_url(url_list[0], top_k=5)
+            else:
+                pinecone_results = self.pinecone.search_by_vector(vector, top_k=5)
+
+        # Also search by keywords if decided is provided
+        keyword_results = []
+        if decided:
+            vector = query_vectors.get(decided)
+            if vector is None:
+                keyword_results = self.pinecone.search_by_keywords(decided, top_k=3)
+            else:
+                keyword_results = self.pinecone.search_by_vector(vector, top_k=3)
+
+        # Merge unique results
+        existing_ids = {r['id'] for r in pinecone_results}
+        for result in keyword_results:
+            if result['id'] not in existing_ids:
+                pinecone_results.append(result)
+                existing_ids.add(result['id'])
+
+        return pinecone_results
+
+    def _get_analytics_insights(self, decided):
+        """Build the X Analytics prompt context for the decided theme"""
+        return self.analytics.create_prompt_context(theme=decided)
+
+    @staticmethod
+    def _split_urls(url):
+        """Split a comma-separated URL field into individual URLs"""
+        return [u.strip() for u in url.split(',') if u.strip()]
+
+    def _embed_queries(self, url=None, decided=None, anniversary=None):
+        """
+        Embed every query text a context request needs in one batched call
+
+        Args:
+            url: Product URL(s), comma-separated
+            decided: Decided content
+            anniversary: Anniversary information
+
+        Returns:
+            dict: {text: vector or None}; identical texts are embedded once
+        """
+        texts = []
+        if self.pinecone and url:
+            texts.extend(self._split_urls(url))
+        if decided:
+            texts.append(decided)
+        if anniversary and self.sheets:
+            texts.append(anniversary)
+
+        # Dedupe while keeping order
+        texts = list(dict.fromkeys(texts))
+        if not texts or not self.embedding:
+            return {}
+
+        print(f"[INFO] クエリを一括エンベディング: {len(texts)}件")
+        return dict(zip(texts, self.embedding.batch_embed(texts)))
+
+    def find_similar_posts(self, query, top_k=5, query_vector=None):
         """
         Find similar past posts using semantic search
 
         Args:
             query: Query text
             top_k: Number of results
+            query_vector: Precomputed embedding of query (optional)
 
         Returns:
             list: Similar posts with similarity scores
         """
+        return self.search_past_posts(query, top_k, query_vector=query_vector)['posts']
+
+    def search_past_posts(self, query, top_k=5, query_vector=None, embed_query=True):
+        """
+        Find similar past posts and report how many candidates were scored
+
+        Posts whose embedding failed are excluded from scoring (and retried
+        on the next search) rather than ranked as zero vectors.
+
+        Args:
+            query: Query text
+            top_k: Number of results
+            query_vector: Precomputed embedding of query (optional)
+            embed_query: Embed the query when no vector is given; False
+                ranks by BM25 only
+
+        Returns:
+            dict: {
+                'posts': [...],     # similar posts with similarity scores
+                'candidates': int,  # past posts with usable text
+                'scored': int       # candidates that had a vector
+            }
+        """
+        search = {'posts': [], 'candidates': 0, 'scored': 0}
+
         print(f"\n[DEBUG] find_similar_posts() 開始")
         print(f"   sheets: {'あり' if self.sheets else 'なし'}")
         print(f"   embedding: {'あり' if self.embedding else 'なし'}")
@@ -166,88 +435,102 @@ class RAGService:
 
         if not self.sheets or not self.embedding:
             print(f"⚠️  [警告] sheets または embedding サービスが利用できません")
-            return []
+            return search
 
         try:
             # Get all past posts
             print(f"[INFO] Google Sheetsから過去投稿を取得中...")
-            past_posts = self.sheets.get_past_posts(limit=100)
+            past_posts = self.sheets.get_posts(limit=100)
             print(f"[INFO] 取得した過去投稿数: {len(past_posts) if past_posts else 0}件")
 
             if not past_posts:
                 print(f"⚠️  [警告] 過去投稿が見つかりませんでした")
-                return []
-
-            # Extract post texts
-            post_texts = []
-            post_data = []
+                return search
 
+            # Posts arrive with their text resolved; ranking works on table positions
             print(f"[INFO] 投稿テキストを抽出中...")
+            table = PostTable.from_posts(past_posts)
+            post_texts = table.texts
 
             # デバッグ: 最初の5件を表示
             for i, post in enumerate(past_posts[:5]):
-                post_text = (
-                    post.get('最終投稿', '') or
-                    post.get('ツイート本文', '') or
-                    post.get('text', '') or
-                    post.get('投稿本文', '') or
-                    post.get('内容', '')
-                )
-                print(f"   投稿{i+1}: キー={list(post.keys())[:5]}..., テキスト長={len(post_text)}")
-
-            # 実際の処理: 全件をループ
-            for post in past_posts:
-                # Try different field names (including X Analytics format)
-                post_text = (
-                    post.get('最終投稿', '') or           # PostCrafterPro完成版
-                    post.get('ツイート本文', '') or       # X Analytics tweet sheet
-                    post.get('text', '') or               # Generic
-                    post.get('投稿本文', '') or           # Alternative
-                    post.get('内容', '')                  # Alternative
-                )
-
-                if post_text and len(post_text) > 10:  # Minimum length
-                    post_texts.append(post_text)
-                    post_data.append(post)
+                print(f"   投稿{i+1}: テキスト長={len(post.text)}, 投稿日={post.date or '-'}")
 
             print(f"[INFO] 有効な投稿テキスト数: {len(post_texts)}件")
 
             if not post_texts:
                 print(f"⚠️  [警告] 有効な投稿テキストが見つかりませんでした")
-                return []
-
-            # Find most similar using embeddings
-            print(f"[INFO] エンベディングで類似度計算中...")
-            similar = self.embedding.find_most_similar(query, post_texts, top_k)
-            print(f"[INFO] 類似投稿 {len(similar)}件 取得")
-
-            # Combine with original post data
-            results = []
-            for text, score in similar:
-                # Find matching post data
-                for post in post_data:
-                    post_text = (
-                        post.get('最終投稿', '') or           # PostCrafterPro完成版
-                        post.get('ツイート本文', '') or       # X Analytics tweet sheet
-                        post.get('text', '') or               # Generic
-                        post.get('投稿本文', '')              # Alternative
-                    )
-                    if post_text == text:
-                        results.append({
-                            **post,
-                            'text': text,
-                            'similarity_score': score
-                        })
-                        break
-
+                return search
+
+            # Rank by BM25 + embeddings; only the lexical candidates are vector-scored
+            print(f"[INFO] ハイブリッド検索（BM25 + エンベディング）で類似度計算中...")
+            search['candidates'] = len(post_texts)
+            if query_vector is None and embed_query:
+                query_vector = self.embedding.create_embedding(query)
+
+            vector_scorer = None
+            if query_vector is not None:
+                def vector_scorer(positions):
+                    return self._vector_scores(post_texts, positions, query_vector)
+
+            ranking = self.retriever.rank(query, post_texts, top_k, vector_scorer=vector_scorer)
+            search['scored'] = ranking['scored']
+            results = [
+                table.result(
+                    result['position'],
+                    similarity_score=result['similarity'] or 0.0,
+                    hybrid_score=result['score']
+                )
+                for result in ranking['results']
+            ]
+            print(
+                f"[INFO] 類似投稿 {len(results)}件 取得 "
+                f"(候補 {ranking['candidates']}/{search['candidates']}件, スコア計算 {search['scored']}件)"
+            )
+
+            search['posts'] = results
             print(f"✅ [完了] find_similar_posts() 終了: {len(results)}件")
-            return results
+            return search
 
         except Exception as e:
             print(f"❌ [エラー] find_similar_posts()でエラー: {e}")
             import traceback
             traceback.print_exc()
+            return search
+
+    def _vector_scores(self, texts, positions, query_vector):
+        """
+        Embedding similarity of the candidate posts
+
+        Args:
+            texts: All past-post texts
+            positions: Candidate positions in texts
+            query_vector: Query embedding
+
+        Returns:
+            list: [(position, similarity), ...] best first, for candidates
+                that have a vector
+        """
+        candidate_texts = [texts[position] for position in positions]
+
+        if self.post_index is not None:
+            # Embed only candidates that are new since the last request
+            self.post_index.sync(candidate_texts, self.embedding.batch_embed)
+            positions_by_id = {}
+            for position, text in zip(positions, candidate_texts):
+                positions_by_id.setdefault(PastPostIndex.make_id(text), []).append(position)
+
+            scored = []
+            for post_id, score in self.post_index.query(query_vector, len(positions_by_id), ids=positions_by_id):
+                scored.extend((position, score) for position in positions_by_id[post_id])
+            return scored
+
+        matrix, mask = self.embedding.embed_with_mask(candidate_texts)
+        vector_positions = [position for position, has_vector in zip(positions, mask) if has_vector]
+        if not vector_positions:
             return []
+        indices, scores = score_matrix(query_vector, matrix, len(vector_positions))
+        return [(vector_positions[i], float(score)) for i, score in zip(indices, scores)]
 
     def _create_summary(self, context):
         """
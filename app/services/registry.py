@@ -0,0 +1,167 @@
+"""
+Process-wide service registry for PostCrafterPro
+
+Services are expensive to build (OAuth handshake and open_by_key for Sheets,
+describe_index_stats for Pinecone, prompts.json for Claude, a full analytics
+sheet load for AnalyticsService), so every blueprint shares one lazily created
+instance per process instead of constructing them per request.
+"""
+import threading
+
+
+def _build_prompt():
+    from app.services.prompt_service import PromptService
+    return PromptService()
+
+
+def _build_sheets():
+    from app.services.sheets_service import SheetsService
+    return SheetsService()
+
+
+def _build_embedding():
+    from app.services.embedding_service import EmbeddingService
+    return EmbeddingService()
+
+
+def _build_pinecone():
+    from app.services.pinecone_service import PineconeService
+    return PineconeService()
+
+
+def _build_analytics():
+    from app.services.analytics_service import AnalyticsService
+    return AnalyticsService(sheets=get_service('sheets'))
+
+
+def _build_claude():
+    from app.services.claude_service import ClaudeService
+    return ClaudeService(prompt_service=get_service('prompt'))
+
+
+def _build_rag():
+    from app.services.rag_service import RAGService
+
+    def optional(name):
+        # RAGService degrades gracefully when a component is unavailable
+        try:
+            return get_service(name)
+        except Exception as e:
+            print(f"[WARN] {name} service unavailable: {e}")
+            return None
+
+    return RAGService(
+        sheets=optional('sheets'),
+        embedding=optional('embedding'),
+        analytics=optional('analytics')
+    )
+
+
+def _build_batch_jobs():
+    from app.services.batch_job_service import BatchJobService
+    return BatchJobService()
+
+
+# name -> (factory, names of services it is built from)
+_FACTORIES = {
+    'prompt': (_build_prompt, ()),
+    'sheets': (_build_sheets, ()),
+    'embedding': (_build_embedding, ()),
+    'pinecone': (_build_pinecone, ()),
+    'analytics': (_build_analytics, ('sheets',)),
+    'claude': (_build_claude, ('prompt',)),
+    'rag': (_build_rag, ('sheets', 'embedding', 'analytics')),
+    'batch_jobs': (_build_batch_jobs, ()),
+}
+
+# Holds state that would be lost on refresh; only dropped when named explicitly
+_PINNED = {'batch_jobs'}
+
+_instances = {}
+# Reentrant: building 'rag' builds 'analytics', which builds 'sheets'
+_lock = threading.RLock()
+
+
+def get_service(name):
+    """
+    Get the shared instance of a service, creating it on first use
+
+    Args:
+        name: One of 'prompt', 'sheets', 'embedding', 'pinecone',
+            'analytics', 'claude', 'rag', 'batch_jobs'
+
+    Returns:
+        object: The service instance
+
+    Raises:
+        KeyError: If name is not a known service
+        Exception: Whatever the service constructor raises (nothing is cached)
+    """
+    instance = _instances.get(name)
+    if instance is not None:
+        return instance
+
+    factory, _ = _FACTORIES[name]
+
+    with _lock:
+        # Another thread may have built it while we waited
+        instance = _instances.get(name)
+        if instance is None:
+            print(f"[INFO] Creating shared {name} service")
+            instance = factory()
+            _instances[name] = instance
+
+    return instance
+
+
+def _dependents(names):
+    """Expand names with every service that is (transitively) built from them"""
+    expanded = set(names)
+    changed = True
+    while changed:
+        changed = False
+        for name, (_, deps) in _FACTORIES.items():
+            if name not in expanded and expanded.intersection(deps):
+                expanded.add(name)
+                changed = True
+    return expanded
+
+
+def refresh_services(*names):
+    """
+    Drop shared instances so they are rebuilt on next use
+
+    Services built on top of a refreshed service are dropped as well
+    (refreshing 'sheets' also refreshes 'analytics' and 'rag').
+
+    Args:
+        *names: Services to refresh (all but the batch job engine if omitted)
+
+    Returns:
+        list: Names of the services that were dropped
+    """
+    unknown = [name for name in names if name not in _FACTORIES]
+    if unknown:
+        raise KeyError(f"Unknown service(s): {', '.join(unknown)}")
+
+    with _lock:
+        targets = _dependents(names) if names else set(_FACTORIES) - _PINNED
+        removed = {name: _instances.pop(name) for name in targets if name in _instances}
+        dropped = sorted(removed)
+
+    # Release thread pools and other resources held by dropped instances
+    for name, instance in removed.items():
+        close = getattr(instance, 'close', None)
+        if callable(close):
+            try:
+                close()
+            except Exception as e:
+                print(f"[WARN] Failed to close {name} service: {e}")
+
+    print(f"[INFO] Refreshed services: {dropped if dropped else 'none'}")
+    return dropped
+
+
+def service_names():
+    """List every service the registry knows how to build"""
+    return list(_FACTORIES)
@@ -0,0 +1,244 @@
+"""
+Local read-through replica of Google Sheets worksheets for PostCrafterPro
+
+Read APIs used to download whole worksheets on every request (the published
+sheet even twice per get_past_posts call). The replica keeps the last
+downloaded values of each worksheet in a local SQLite file shared by all
+workers and only re-downloads a sheet when it has actually changed.
+"""
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+from gspread.utils import numericise_all
+
+from app.utils.sqlite_db import ThreadLocalSQLite
+
+
+def records_from_values(values):
+    """
+    Convert a value matrix (header row first) to records like get_all_records()
+
+    Args:
+        values: List of rows as returned by get_all_values()
+
+    Returns:
+        list: [{header: value}, ...] with numeric strings converted to numbers
+    """
+    if len(values) < 2:
+        return []
+
+    headers = values[0]
+    width = len(headers)
+    records = []
+    for row in values[1:]:
+        padded = (list(row) + [''] * (width - len(row)))[:width]
+        records.append(dict(zip(headers, numericise_all(padded))))
+    return records
+
+
+class SheetsReplica:
+    """
+    SQLite-backed snapshot of worksheet values, refreshed on change
+
+    Within ``ttl`` seconds of the last check a snapshot is served without
+    contacting Google. After that one cheap probe is made (the Drive
+    modified time of the spreadsheet, or the length of column A when the
+    modified time is unavailable) and the worksheet is only downloaded again
+    if the probe changed. Snapshots older than ``max_age`` are always
+    refreshed, and writes made through SheetsService invalidate them.
+    """
+
+    def __init__(self, db_path=None, ttl=None, max_age=None):
+        """
+        Initialize the replica database
+
+        Args:
+            db_path: Path to the SQLite file (default: data/sheets_replica.sqlite3)
+            ttl: Seconds a snapshot is served without probing (default: 60)
+            max_age: Seconds after which a snapshot is re-downloaded even if
+                the probe did not change (default: 3600)
+        """
+        if db_path is None:
+            data_dir = Path(__file__).parent.parent.parent / 'data'
+            db_path = os.getenv('SHEETS_REPLICA_PATH', str(data_dir / 'sheets_replica.sqlite3'))
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+
+        self.ttl = ttl if ttl is not None else float(os.getenv('SHEETS_REPLICA_TTL', '60'))
+        self.max_age = max_age if max_age is not None else float(os.getenv('SHEETS_REPLICA_MAX_AGE', '3600'))
+
+        self._db = ThreadLocalSQLite(self.db_path)
+        # name -> (fetched_at, values) so unchanged snapshots are not re-parsed
+        self._memory = {}
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+
+        self._init_db()
+
+    def _connect(self):
+        """Get a per-thread SQLite connection"""
+        return self._db.connect()
+
+    def _init_db(self):
+        """Create the snapshot table if needed"""
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS snapshots (
+                    name TEXT PRIMARY KEY,
+                    sheet_id INTEGER,
+                    probe TEXT,
+                    row_count INTEGER NOT NULL,
+                    fetched_at REAL NOT NULL,
+                    checked_at REAL NOT NULL,
+                    sheet_values TEXT NOT NULL
+                )
+                """
+            )
+
+    def _lock_for(self, name):
+        with self._locks_guard:
+            return self._locks.setdefault(name, threading.Lock())
+
+    @staticmethod
+    def _probe(sheet):
+        """
+        Cheap change marker for a worksheet
+
+        The row-count fallback misses in-place edits (e.g. updated metrics)
+        until the snapshot reaches max_age, so falling back is logged.
+
+        Returns:
+            str: Drive modified time of the spreadsheet, or "rows:<n>" from column A
+        """
+        try:
+            return f"modified:{sheet.spreadsheet.get_lastUpdateTime()}"
+        except Exception as e:
+            print(
+                f"[WARN] 更新日時を取得できないため行数で変更を判定します "
+                f"({getattr(sheet, 'title', sheet)}): {e}"
+            )
+            return f"rows:{len(sheet.col_values(1))}"
+
+    def _load_meta(self, name):
+        return self._connect().execute(
+            'SELECT sheet_id, probe, fetched_at, checked_at FROM snapshots WHERE name = ?', (name,)
+        ).fetchone()
+
+    def _load_values(self, name, fetched_at):
+        """Values of a snapshot, parsed once per fetch"""
+        cached = self._memory.get(name)
+        if cached is not None and cached[0] == fetched_at:
+            return cached[1]
+
+        row = self._connect().execute(
+            'SELECT sheet_values FROM snapshots WHERE name = ?', (name,)
+        ).fetchone()
+        values = json.loads(row[0])
+        self._memory[name] = (fetched_at, values)
+        return values
+
+    def _store(self, name, sheet, probe, values):
+        now = time.time()
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO snapshots '
+                '(name, sheet_id, probe, row_count, fetched_at, checked_at, sheet_values) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (name, sheet.id, probe, len(values), now, now, json.dumps(values, ensure_ascii=False))
+            )
+        self._memory[name] = (now, values)
+
+    def peek(self, name, sheet):
+        """
+        Get a snapshot only if it can be served without contacting Google
+
+        Args:
+            name: Replica key
+            sheet: gspread Worksheet the snapshot mirrors
+
+        Returns:
+            list or None: Rows within the TTL, None if the snapshot is
+                missing, stale or belongs to another worksheet
+        """
+        meta = self._load_meta(name)
+        if meta is None or meta[0] != sheet.id:
+            return None
+
+        _, _, fetched_at, checked_at = meta
+        if time.time() - checked_at >= self.ttl:
+            return None
+        return self._load_values(name, fetched_at)
+
+    def get_values(self, name, sheet):
+        """
+        Get all values of a worksheet, downloading only when it changed
+
+        Args:
+            name: Replica key (e.g. 'published', 'tweet')
+            sheet: gspread Worksheet the snapshot mirrors
+
+        Returns:
+            list: Rows as returned by get_all_values()
+        """
+        with self._lock_for(name):
+            now = time.time()
+            meta = self._load_meta(name)
+            current = None
+
+            if meta is not None and meta[0] == sheet.id:
+                _, probe, fetched_at, checked_at = meta
+
+                if now - checked_at < self.ttl:
+                    return self._load_values(name, fetched_at)
+
+                if now - fetched_at < self.max_age:
+                    current = self._probe(sheet)
+                    if current == probe:
+                        conn = self._connect()
+                        with conn:
+                            conn.execute('UPDATE snapshots SET checked_at = ? WHERE name = ?', (now, name))
+                        return self._load_values(name, fetched_at)
+
+            # Probe before downloading so a change made during the download is caught next time
+            if current is None:
+                current = self._probe(sheet)
+            values = sheet.get_all_values()
+            self._store(name, sheet, current, values)
+            print(f"[INFO] Sheets replica refreshed: {name} ({len(values)} rows)")
+            return values
+
+    def get_records(self, name, sheet):
+        """
+        Get a worksheet as records, like get_all_records()
+
+        Args:
+            name: Replica key
+            sheet: gspread Worksheet
+
+        Returns:
+            list: [{header: value}, ...]
+        """
+        return records_from_values(self.get_values(name, sheet))
+
+    def invalidate(self, *names):
+        """
+        Force the next read of these worksheets to download them again
+
+        Args:
+            *names: Replica keys (all snapshots if omitted)
+        """
+        conn = self._connect()
+        with conn:
+            if names:
+                conn.executemany(
+                    'UPDATE snapshots SET fetched_at = 0, checked_at = 0 WHERE name = ?',
+                    [(name,) for name in names]
+                )
+            else:
+                conn.execute('UPDATE snapshots SET fetched_at = 0, checked_at = 0')
@@ -2,10 +2,32 @@
 Google Sheets integration service for PostCrafterPro
 """
 import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import gspread
 from oauth2client.service_account import ServiceAccountCredentials
 from datetime import datetime
 import json
+from app.services.keyword_index import NgramIndex
+from app.services.post_record import Post
+from app.services.sheets_replica import SheetsReplica, records_from_values
+from app.utils.sheet_schema import HeaderCache, a1_range
+
+
+# Row numbers of an append response range, e.g. "'完成版'!A5:L7" -> ('5', '7')
+_APPENDED_RANGE_PATTERN = re.compile(r'![A-Z]*(\d+)(?::[A-Z]*(\d+))?$')
+
+
+def _worksheet_key(sheet):
+    """
+    Identify a worksheet across spreadsheets
+
+    A worksheet id (gid) is only unique inside its spreadsheet: in legacy
+    single-sheet mode draft and published are both sheet1 (gid 0) of
+    different files.
+    """
+    return (sheet.spreadsheet.id, sheet.id)
 
 
 class SheetsService:
@@ -45,6 +67,30 @@ class SheetsService:
         # Analytics sheet (always separate file)
         self.analytics_sheet_id = os.getenv('GOOGLE_SHEETS_ANALYTICS_ID')
 
+        # Last used row per worksheet (fallback when an append response has no range)
+        self._row_counts = {}
+        self._row_count_lock = threading.Lock()
+
+        # Write-behind buffer for batch auto-save
+        self.write_buffer = SheetsWriteBuffer(self)
+
+        # Local snapshot of the worksheets all read APIs are served from
+        self.replica = SheetsReplica()
+
+        # Column name -> position per worksheet (header row read once)
+        self.headers = HeaderCache()
+
+        # Post records per worksheet: name -> (values, [Post, ...])
+        self._post_records = {}
+        self._post_records_lock = threading.Lock()
+
+        # Keyword search index per worksheet: name -> (values, records, NgramIndex)
+        self._keyword_indexes = {}
+        self._keyword_index_lock = threading.Lock()
+
+        # Rows per request for windowed reads (iter_rows)
+        self.read_chunk_size = int(os.getenv('SHEETS_READ_CHUNK_SIZE', '500'))
+
         # Initialize sheet connections
         self._init_sheets()
 
@@ -214,6 +260,200 @@ class SheetsService:
 
         return spreadsheet.id
 
+    def _worksheet(self, name):
+        """
+        Resolve a replica name to its worksheet
+
+        Args:
+            name: 'draft', 'published', 'tweet', 'day' or 'followers'
+
+        Returns:
+            Worksheet or None: The worksheet, None if not configured
+        """
+        return {
+            'draft': self.draft_sheet,
+            'published': self.published_sheet,
+            'tweet': self.analytics_sheet,
+            'day': self.analytics_day_sheet,
+            'followers': self.analytics_followers_sheet,
+        }[name]
+
+    def read_values(self, name):
+        """
+        Get all values of a worksheet from the local replica
+
+        Args:
+            name: 'draft', 'published', 'tweet', 'day' or 'followers'
+
+        Returns:
+            list: Rows including the header row ([] if the sheet is not configured)
+        """
+        sheet = self._worksheet(name)
+        if sheet is None:
+            return []
+
+        values = self.replica.get_values(name, sheet)
+        if values:
+            # Keeps the cached header map in step with the sheet
+            self.headers.observe(sheet, values[0])
+        return values
+
+    def header_map(self, name):
+        """
+        Get the cached column map of a worksheet
+
+        Args:
+            name: 'draft', 'published', 'tweet', 'day' or 'followers'
+
+        Returns:
+            HeaderMap: Column name -> position map
+        """
+        sheet = self._worksheet(name)
+        if sheet is None:
+            raise ValueError(f"Sheet not configured: {name}")
+        return self.headers.get(sheet)
+
+    def read_records(self, name):
+        """
+        Get a worksheet as records (like get_all_records) from the local replica
+
+        Args:
+            name: 'draft', 'published', 'tweet', 'day' or 'followers'
+
+        Returns:
+            list: [{header: value}, ...]
+        """
+        return records_from_values(self.read_values(name))
+
+    def iter_rows(self, name, start_row=2, end_row=0, chunk_size=None):
+        """
+        Stream rows of a worksheet window without downloading the whole sheet
+
+        Only rows start_row..end_row are requested, chunk_size rows per
+        request. The next chunk is downloaded in the background while the
+        rows of the current one are yielded. The header row is fetched with
+        the first chunk (one batch_get) and kept in step with the header
+        cache. A fresh replica snapshot is used instead when one exists.
+
+        Reading stops at end_row or at the first chunk that ends in blank
+        rows (the end of the data), whichever comes first.
+
+        Args:
+            name: 'draft', 'published', 'tweet', 'day' or 'followers'
+            start_row: First row to read (1-indexed, row 1 is the header)
+            end_row: Last row to read (0 = until the end of the data)
+            chunk_size: Rows per request (default: SHEETS_READ_CHUNK_SIZE or 500)
+
+        Yields:
+            tuple: (row_number, {header: value}) with values as strings
+        """
+        sheet = self._worksheet(name)
+        if sheet is None:
+            return
+
+        start_row = max(start_row, 2)
+        chunk_size = max(1, chunk_size or self.read_chunk_size)
+
+        snapshot = self.replica.peek(name, sheet)
+        if snapshot is not None:
+            if not snapshot:
+                return
+            columns = self.headers.observe(sheet, snapshot[0])
+            window = snapshot[start_row - 1:end_row if end_row > 0 else None]
+            for offset, row in enumerate(window):
+                yield start_row + offset, columns.record(row)
+            return
+
+        if 0 < end_row < start_row:
+            return
+
+        def fetch(first, with_header):
+            last = first + chunk_size - 1
+            if end_row > 0:
+                last = min(last, end_row)
+            window = f"{first}:{last}"
+            if with_header:
+                header, rows = sheet.batch_get(['1:1', window])
+                return first, last, (header[0] if header else []), rows
+            return first, last, None, sheet.get_values(window)
+
+        executor = ThreadPoolExecutor(max_workers=1)
+        future = executor.submit(fetch, start_row, True)
+        try:
+            columns = None
+            while future is not None:
+                first, last, header, rows = future.result()
+                if header is not None:
+                    columns = self.headers.observe(sheet, header)
+                    if not columns.width:
+                        return
+
+                # A chunk shorter than requested means the data ended inside it
+                data_ended = len(rows) < last - first + 1
+                future = None
+                if not data_ended and (end_row <= 0 or last < end_row):
+                    future = executor.submit(fetch, last + 1, False)
+
+                for offset, row in enumerate(rows):
+                    yield first + offset, columns.record(row)
+        finally:
+            if future is not None:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+    def read_rows(self, name, start_row=2, end_row=0, chunk_size=None):
+        """
+        Read a window of rows (see iter_rows)
+
+        Returns:
+            list: [(row_number, {header: value}), ...]
+        """
+        return list(self.iter_rows(name, start_row, end_row, chunk_size))
+
+    def _invalidate_replica(self, sheet):
+        """Drop the replica snapshot of a worksheet that was just written"""
+        for name in ('draft', 'published', 'tweet', 'day', 'followers'):
+            if self._worksheet(name) is sheet:
+                self.replica.invalidate(name)
+
+    def _append_rows(self, sheet, rows):
+        """
+        Append rows and return the row number of the last one
+
+        The row number is read from the append response (updates.updatedRange)
+        so the sheet never has to be downloaded to find it. If the response
+        has no usable range, a per-worksheet counter is used instead.
+
+        Args:
+            sheet: gspread Worksheet
+            rows: List of row value lists
+
+        Returns:
+            int: Row number (1-indexed) of the last appended row
+        """
+        response = sheet.append_rows(rows)
+        self._invalidate_replica(sheet)
+
+        updated_range = ''
+        if isinstance(response, dict):
+            updated_range = response.get('updates', {}).get('updatedRange', '')
+        match = _APPENDED_RANGE_PATTERN.search(updated_range)
+        key = _worksheet_key(sheet)
+
+        with self._row_count_lock:
+            if match:
+                last_row = int(match.group(2) or match.group(1))
+            else:
+                if key not in self._row_counts:
+                    # One-time column read; the rows just appended are already included
+                    self._row_counts[key] = len(sheet.col_values(1))
+                    return self._row_counts[key]
+                last_row = self._row_counts[key] + len(rows)
+
+            self._row_counts[key] = last_row
+
+        return last_row
+
     def save_draft(self, data):
         """
         Save draft to draft sheet
@@ -284,12 +524,11 @@ class SheetsService:
         print(f"   書き込む行データ（最初の5項目）: {row[:5]}")
         print(f"   R1データ: 案A={bool(data.get('R1_案A'))}, 案B={bool(data.get('R1_案B'))}, 選択={data.get('R1_選択', 'なし')}")
 
-        # Append row
-        self.draft_sheet.append_row(row)
-        print(f"✅ [完了] Draft sheetに保存完了")
+        # Append row (row number comes from the append response)
+        row_num = self._append_rows(self.draft_sheet, [row])
+        print(f"✅ [完了] Draft sheetに保存完了 (行{row_num})")
 
-        # Return row number
-        return len(self.draft_sheet.get_all_values())
+        return row_num
 
     def _combine_refinement_requests(self, data):
         """ラウンド別の改善リクエストを結合"""
@@ -314,70 +553,86 @@ class SheetsService:
         if not self.draft_sheet:
             raise ValueError("Draft sheet not configured")
 
-        # Get existing row
-        existing = self.draft_sheet.row_values(row_num)
-
         # Update specific cells based on round
         round_num = data.get('round', 1)
 
         # Round columns: R1(F,G,H), R2(I,J,K), R3(L,M,N)
         col_offset = 5 + (round_num - 1) * 3  # F=6, I=9, L=12
 
+        cells = []
         if 'post_a' in data:
-            self.draft_sheet.update_cell(row_num, col_offset + 1, data['post_a']['text'])
+            cells.append((row_num, col_offset + 1, data['post_a']['text']))
         if 'post_b' in data:
-            self.draft_sheet.update_cell(row_num, col_offset + 2, data['post_b']['text'])
+            cells.append((row_num, col_offset + 2, data['post_b']['text']))
         if 'selected' in data:
-            self.draft_sheet.update_cell(row_num, col_offset + 3, data['selected'])
+            cells.append((row_num, col_offset + 3, data['selected']))
 
         # Update refinement history
         if 'refinement_request' in data and data['refinement_request']:
-            self.draft_sheet.update_cell(row_num, 15, data['refinement_request'])
+            cells.append((row_num, 15, data['refinement_request']))
+
+        # One batch_update instead of one update_cell request per cell
+        if cells:
+            self.draft_sheet.batch_update(
+                [{'range': a1_range(row, col), 'values': [[value]]} for row, col, value in cells],
+                value_input_option='RAW'
+            )
+            self._invalidate_replica(self.draft_sheet)
 
         return True
 
-    def save_draft_post(self, data, row_number=None):
+    def save_draft_post(self, data, row_number=None, buffer=None, callback=None):
         """
         Save or update draft post in draft sheet
 
         Args:
             data: Dictionary containing draft data (日本語キー)
             row_number: Row number to update (if None, append new row)
+            buffer: SheetsWriteBuffer to queue the write in (optional)
+            callback: Called with True/False once a buffered write is flushed
 
         Returns:
-            int: Row number
+            int or None: Row number (None for a buffered append)
         """
         if not self.draft_sheet:
             raise ValueError("Draft sheet not configured")
 
+        if buffer is not None:
+            if row_number:
+                buffer.update_row(self.draft_sheet, row_number, data, callback)
+                return row_number
+            buffer.append(self.draft_sheet, data, callback)
+            return None
+
         print(f"\n[DEBUG] save_draft_post() 開始")
         print(f"   行番号: {row_number if row_number else '新規追加'}")
 
-        # Get headers
-        headers = self.draft_sheet.row_values(1)
+        # Cached headers (row 1 is only read once per worksheet)
+        header_map = self.headers.get(self.draft_sheet)
 
         # Prepare row data matching headers
-        row_data = []
-        for header in headers:
-            value = data.get(header, '')
-            row_data.append(str(value) if value else '')
+        row_data = header_map.row_from_dict(data)
 
         print(f"   データ長: {len(row_data)}")
 
         if row_number:
             # Update existing row
-            cell_range = f"A{row_number}:{chr(65 + len(row_data) - 1)}{row_number}"
-            self.draft_sheet.update(cell_range, [row_data])
+            try:
+                self.draft_sheet.update(header_map.row_range(row_number), [row_data])
+            except Exception:
+                # The header row may have changed under us; re-read it next time
+                self.headers.invalidate(self.draft_sheet)
+                raise
+            self._invalidate_replica(self.draft_sheet)
             print(f"✅ 行{row_number}を更新しました")
             return row_number
         else:
             # Append new row
-            self.draft_sheet.append_row(row_data)
-            row_num = len(self.draft_sheet.get_all_values())
+            row_num = self._append_rows(self.draft_sheet, [row_data])
             print(f"✅ 新規行{row_num}を追加しました")
             return row_num
 
-    def publish_post(self, data):
+    def publish_post(self, data, buffer=None, callback=None):
         """
         Publish final post to published sheet
 
@@ -396,9 +651,11 @@ class SheetsService:
                     '類似投稿数': int,
                     '文字数チェック': str
                 }
+            buffer: SheetsWriteBuffer to queue the append in (optional)
+            callback: Called with True/False once a buffered append is flushed
 
         Returns:
-            int: Row number of the published post
+            int or None: Row number of the published post (None when buffered)
         """
         if not self.published_sheet:
             raise ValueError("Published sheet not configured")
@@ -434,12 +691,15 @@ class SheetsService:
 
         print(f"   書き込む行データ（最初の6項目）: {row[:6]}")
 
-        # Append row
-        self.published_sheet.append_row(row)
-        print(f"✅ [完了] Published sheetに保存完了")
+        if buffer is not None:
+            buffer.append(self.published_sheet, row, callback)
+            return None
 
-        # Return row number
-        return len(self.published_sheet.get_all_values())
+        # Append row (row number comes from the append response)
+        row_num = self._append_rows(self.published_sheet, [row])
+        print(f"✅ [完了] Published sheetに保存完了 (行{row_num})")
+
+        return row_num
 
     def get_past_posts(self, limit=100):
         """
@@ -462,12 +722,12 @@ class SheetsService:
                 print(f"[INFO] Published sheet（完成版）から過去投稿を取得中...")
 
                 # Check if sheet has data (more than just header row)
-                all_values = self.published_sheet.get_all_values()
+                all_values = self.read_values('published')
                 if len(all_values) <= 1:
                     print(f"⚠️  [警告] Published sheetにデータがありません（ヘッダーのみ）")
                     # Fall through to analytics sheet
                 else:
-                    all_records = self.published_sheet.get_all_records()
+                    all_records = records_from_values(all_values)
                     print(f"[INFO] Published sheetから {len(all_records)}件取得")
 
                     # Limit results
@@ -484,7 +744,7 @@ class SheetsService:
         if self.analytics_sheet:
             try:
                 print(f"[INFO] Analytics sheet（tweet）から過去投稿を取得中...")
-                all_records = self.analytics_sheet.get_all_records()
+                all_records = self.read_records('tweet')
                 print(f"[INFO] Analytics sheetから {len(all_records)}件取得")
 
                 # Limit results
@@ -500,10 +760,91 @@ class SheetsService:
         print(f"⚠️  [警告] 利用可能なシートがありません")
         return []
 
+    def _keyword_index(self, name):
+        """
+        Get the records of a worksheet and their n-gram index
+
+        The index is updated only when the replica returns a new snapshot,
+        and then only for rows whose text changed.
+
+        Args:
+            name: 'tweet' or 'published'
+
+        Returns:
+            tuple: (records, NgramIndex) with doc ids = record positions
+        """
+        values = self.read_values(name)
+
+        with self._keyword_index_lock:
+            entry = self._keyword_indexes.get(name)
+            if entry is not None and entry[0] is values:
+                return entry[1], entry[2]
+
+            records = records_from_values(values)
+            index = entry[2] if entry is not None else NgramIndex()
+            changed = index.sync(['\n'.join(str(value) for value in record.values()) for record in records])
+            if changed:
+                print(f"[INFO] Keyword index updated: {name} ({changed}/{len(records)} rows)")
+
+            self._keyword_indexes[name] = (values, records, index)
+            return records, index
+
+    def _posts(self, name):
+        """
+        Get the rows of a worksheet as Post records, built once per snapshot
+
+        Args:
+            name: 'published' or 'tweet'
+
+        Returns:
+            tuple: (data row count, [Post, ...])
+        """
+        values = self.read_values(name)
+
+        with self._post_records_lock:
+            entry = self._post_records.get(name)
+            if entry is None or entry[0] is not values:
+                posts = [Post.from_record(record) for record in records_from_values(values)]
+                entry = self._post_records[name] = (values, posts)
+
+        return max(len(values) - 1, 0), entry[1]
+
+    def get_posts(self, limit=100, source=None):
+        """
+        Get past posts as Post records (text resolved, metrics parsed)
+
+        Args:
+            limit: Maximum number of posts (None for all)
+            source: 'published' or 'tweet'; None uses the published sheet
+                and falls back to the analytics sheet, like get_past_posts()
+
+        Returns:
+            list: [Post, ...] (with limit=None, the shared list cached for
+                the current snapshot; it is replaced, never modified, when
+                the sheet changes)
+        """
+        sources = [source] if source else ['published', 'tweet']
+
+        for name in sources:
+            if self._worksheet(name) is None:
+                continue
+            try:
+                rows, posts = self._posts(name)
+            except Exception as e:
+                print(f"[ERROR] Error reading {name} posts: {e}")
+                continue
+            if rows or name == sources[-1]:
+                return posts[:limit] if limit else posts
+
+        return []
+
     def search_similar_posts(self, keyword, limit=10):
         """
         Search for similar posts in analytics and published sheets
 
+        Uses a character n-gram index of each sheet, so a lookup only
+        checks the rows that contain every 2-gram of the keyword.
+
         Args:
             keyword: Keyword to search for
             limit: Maximum number of results
@@ -513,30 +854,19 @@ class SheetsService:
         """
         results = []
 
-        # Search in analytics sheet
-        if self.analytics_sheet:
-            try:
-                all_records = self.analytics_sheet.get_all_records()
-                for record in all_records:
-                    # Simple keyword matching (can be enhanced with embedding)
-                    if keyword.lower() in str(record).lower():
-                        results.append(record)
-                        if len(results) >= limit:
-                            break
-            except Exception as e:
-                print(f"Error searching analytics sheet: {e}")
-
-        # Search in published sheet
-        if self.published_sheet and len(results) < limit:
+        sources = [
+            ('tweet', self.analytics_sheet, 'analytics'),
+            ('published', self.published_sheet, 'published'),
+        ]
+        for name, sheet, label in sources:
+            if not sheet or len(results) >= limit:
+                continue
             try:
-                all_records = self.published_sheet.get_all_records()
-                for record in all_records:
-                    if keyword.lower() in str(record).lower():
-                        results.append(record)
-                        if len(results) >= limit:
-                            break
+                records, index = self._keyword_index(name)
+                for doc_id in index.search(keyword, limit - len(results)):
+                    results.append(records[doc_id])
             except Exception as e:
-                print(f"Error searching published sheet: {e}")
+                print(f"Error searching {label} sheet: {e}")
 
         return results[:limit]
 
@@ -554,7 +884,7 @@ class SheetsService:
             return []
 
         try:
-            all_records = self.analytics_day_sheet.get_all_records()
+            all_records = self.read_records('day')
             # Return most recent records
             if limit is None:
                 return all_records
@@ -580,9 +910,184 @@ class SheetsService:
             return []
 
         try:
-            all_records = self.analytics_followers_sheet.get_all_records()
+            all_records = self.read_records('followers')
             # Return most recent records
             return all_records[-limit:] if len(all_records) > limit else all_records
         except Exception as e:
             print(f"Error reading follower growth: {e}")
             return []
+
+
+class SheetsWriteBuffer:
+    """
+    Write-behind buffer that coalesces Sheets writes
+
+    Appends are sent as one append_rows call per worksheet and row/cell
+    updates as one batch_update call per worksheet. The buffer flushes when
+    it holds `max_pending` writes, `flush_interval` seconds after the first
+    queued write, or when flush() is called (e.g. at the end of a batch job).
+    """
+
+    def __init__(self, sheets, max_pending=None, flush_interval=None):
+        """
+        Initialize the buffer
+
+        Args:
+            sheets: SheetsService used for appends (row number tracking)
+            max_pending: Flush once this many writes are queued
+                (default: SHEETS_WRITE_BUFFER_SIZE or 50)
+            flush_interval: Seconds before queued writes are flushed
+                (default: SHEETS_WRITE_BUFFER_INTERVAL or 10)
+        """
+        self.sheets = sheets
+        self.max_pending = max_pending or int(os.getenv('SHEETS_WRITE_BUFFER_SIZE', '50'))
+        self.flush_interval = flush_interval or float(os.getenv('SHEETS_WRITE_BUFFER_INTERVAL', '10'))
+
+        self._pending = []
+        self._lock = threading.Lock()
+        # Serializes flushes so appends keep their queue order
+        self._flush_lock = threading.Lock()
+        self._timer = None
+
+    @property
+    def pending_count(self):
+        return len(self._pending)
+
+    def append(self, sheet, values, callback=None):
+        """
+        Queue a row append
+
+        Args:
+            sheet: gspread Worksheet
+            values: Row value list, or dict keyed by header (resolved at flush)
+            callback: Called with True/False after the flush
+        """
+        self._queue(('append', sheet, None, values, callback))
+
+    def update_row(self, sheet, row_number, data, callback=None):
+        """
+        Queue an overwrite of one row from a dict keyed by header
+
+        Args:
+            sheet: gspread Worksheet
+            row_number: Row to overwrite (1-indexed)
+            data: {header: value}; headers not in data are cleared
+            callback: Called with True/False after the flush
+        """
+        self._queue(('update_row', sheet, row_number, data, callback))
+
+    def update_cells(self, sheet, cells, callback=None):
+        """
+        Queue single-cell updates
+
+        Args:
+            sheet: gspread Worksheet
+            cells: [(row, col, value), ...] (1-indexed)
+            callback: Called with True/False after the flush
+        """
+        self._queue(('update_cells', sheet, None, cells, callback))
+
+    def _queue(self, op):
+        with self._lock:
+            self._pending.append(op)
+            full = len(self._pending) >= self.max_pending
+            if not full and self._timer is None:
+                self._timer = threading.Timer(self.flush_interval, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+        if full:
+            self.flush()
+
+    def flush(self):
+        """
+        Send every queued write
+
+        Returns:
+            dict: {'appended': int, 'updated': int, 'failed': int, 'requests': int}
+        """
+        with self._flush_lock:
+            with self._lock:
+                ops, self._pending = self._pending, []
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+
+            stats = {'appended': 0, 'updated': 0, 'failed': 0, 'requests': 0}
+            if not ops:
+                return stats
+
+            # Group by worksheet, keeping queue order within each sheet
+            # (gids repeat across spreadsheets, so the spreadsheet id is part of the key)
+            by_sheet = {}
+            for op in ops:
+                by_sheet.setdefault(_worksheet_key(op[1]), []).append(op)
+
+            for sheet_ops in by_sheet.values():
+                self._flush_sheet(sheet_ops[0][1], sheet_ops, stats)
+
+            print(
+                f"[OK] Sheets書き込みバッファ: 追加{stats['appended']}行 / 更新{stats['updated']}件 "
+                f"/ 失敗{stats['failed']}件 ({stats['requests']}リクエスト)"
+            )
+            return stats
+
+    def _flush_sheet(self, sheet, ops, stats):
+        """Write one worksheet's queued ops with at most one read and two writes"""
+        header_map = None
+        if any(isinstance(op[3], dict) for op in ops):
+            if self.sheets.headers.peek(sheet) is None:
+                stats['requests'] += 1
+            header_map = self.sheets.headers.get(sheet)
+
+        appends = [op for op in ops if op[0] == 'append']
+        updates = [op for op in ops if op[0] != 'append']
+
+        if appends:
+            rows = [
+                header_map.row_from_dict(values) if isinstance(values, dict) else values
+                for _, _, _, values, _ in appends
+            ]
+            self._send(lambda: self.sheets._append_rows(sheet, rows), appends, stats, 'appended', len(rows))
+
+        if updates:
+            data = []
+            for kind, _, row_number, payload, _ in updates:
+                if kind == 'update_row':
+                    data.append({
+                        'range': header_map.row_range(row_number),
+                        'values': [header_map.row_from_dict(payload)]
+                    })
+                else:
+                    data.extend(
+                        {'range': a1_range(row, col), 'values': [[value]]}
+                        for row, col, value in payload
+                    )
+            self._send(
+                lambda: sheet.batch_update(data, value_input_option='RAW'),
+                updates, stats, 'updated', len(updates)
+            )
+
+    def _send(self, request, ops, stats, key, count):
+        """Run one write request and report the outcome to each op's callback"""
+        stats['requests'] += 1
+        try:
+            request()
+            self.sheets._invalidate_replica(ops[0][1])
+            stats[key] += count
+            ok = True
+        except Exception as e:
+            print(f"[WARN] Sheets書き込みバッファのフラッシュに失敗: {e}")
+            stats['failed'] += len(ops)
+            ok = False
+            if any(isinstance(op[3], dict) for op in ops):
+                # Rows were laid out with the cached header row; re-read it next time
+                self.sheets.headers.invalidate(ops[0][1])
+
+        for op in ops:
+            callback = op[4]
+            if callback is not None:
+                try:
+                    callback(ok)
+                except Exception as e:
+                    print(f"[WARN] Sheets write callback failed: {e}")
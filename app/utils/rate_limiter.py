@@ -0,0 +1,106 @@
+"""
+Thread-safe request rate limiter for PostCrafterPro
+"""
+import os
+import threading
+import time
+
+
+class RateLimiter:
+    """
+    Token bucket shared by every thread that calls a rate-limited API
+
+    Tokens refill at `rate_per_minute`; up to `burst` requests may be sent
+    back to back. A rate limit response from the API can pause the bucket
+    for a while so all workers back off together.
+    """
+
+    def __init__(self, rate_per_minute, burst=1):
+        """
+        Initialize the limiter
+
+        Args:
+            rate_per_minute: Allowed requests per minute (0 or less = unlimited)
+            burst: Maximum number of requests sent without waiting
+        """
+        self.rate_per_minute = rate_per_minute
+        self.interval = 60.0 / rate_per_minute if rate_per_minute > 0 else 0.0
+        self.burst = max(1, burst)
+
+        self._lock = threading.Lock()
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+
+    @classmethod
+    def from_env(cls, prefix, default_rate=0):
+        """
+        Build a limiter from `<prefix>_REQUESTS_PER_MINUTE` and `<prefix>_BURST`
+
+        Args:
+            prefix: Environment variable prefix (e.g. 'CLAUDE')
+            default_rate: Requests per minute when the variable is unset
+                (setting it to 0 disables the limit)
+
+        Returns:
+            RateLimiter: Configured limiter
+        """
+        rate = float(os.getenv(f'{prefix}_REQUESTS_PER_MINUTE', str(default_rate)))
+        burst = int(os.getenv(f'{prefix}_BURST', '1'))
+        return cls(rate, burst)
+
+    @property
+    def enabled(self):
+        return self.interval > 0
+
+    def _refill(self, now):
+        elapsed = now - self._updated
+        self._updated = now
+        if not self.enabled:
+            self._tokens = float(self.burst)
+            return
+        self._tokens = min(self.burst, self._tokens + elapsed / self.interval)
+
+    def acquire(self, timeout=None):
+        """
+        Block until a request may be sent
+
+        Args:
+            timeout: Maximum seconds to wait (None = wait indefinitely)
+
+        Returns:
+            bool: True if a token was taken, False on timeout
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+
+                if now >= self._paused_until and self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+
+                wait = max(self._paused_until - now, (1 - self._tokens) * self.interval)
+
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """
+        Hold back every caller for `seconds` (e.g. after an HTTP 429)
+
+        Args:
+            seconds: Pause length in seconds
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._paused_until = max(self._paused_until, now + seconds)
+            self._tokens = 0.0
+            self._updated = now
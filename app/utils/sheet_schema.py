@@ -0,0 +1,197 @@
+"""
+Worksheet header schema helpers for PostCrafterPro
+
+Resolves column names to positions once per worksheet and builds A1
+ranges from them, so writes can target exact ranges without reading the
+header row first.
+"""
+import threading
+
+
+def column_letter(col):
+    """
+    Convert a 1-indexed column number to its A1 letters
+
+    Args:
+        col: Column number (1 = A, 26 = Z, 27 = AA)
+
+    Returns:
+        str: Column letters
+    """
+    if col < 1:
+        raise ValueError(f"Column number must be >= 1: {col}")
+
+    letters = ''
+    while col:
+        col, remainder = divmod(col - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+
+def a1_range(start_row, start_col, end_row=None, end_col=None):
+    """
+    Build an A1 range such as "A5:AB5"
+
+    Args:
+        start_row: First row (1-indexed)
+        start_col: First column (1-indexed)
+        end_row: Last row (default: start_row)
+        end_col: Last column (default: start_col)
+
+    Returns:
+        str: A1 range (a single cell if start and end are the same)
+    """
+    end_row = end_row or start_row
+    end_col = end_col or start_col
+    start = f"{column_letter(start_col)}{start_row}"
+    end = f"{column_letter(end_col)}{end_row}"
+    return start if start == end else f"{start}:{end}"
+
+
+class HeaderMap:
+    """
+    Column-name to position map for one worksheet header row
+    """
+
+    def __init__(self, headers):
+        """
+        Build the map
+
+        Args:
+            headers: Header row values (row 1)
+        """
+        self.headers = list(headers)
+        self._index = {}
+        for i, header in enumerate(self.headers):
+            # First occurrence wins, like list.index()
+            self._index.setdefault(header, i)
+
+    def __contains__(self, name):
+        return name in self._index
+
+    @property
+    def width(self):
+        return len(self.headers)
+
+    def index(self, name):
+        """
+        0-indexed position of a column
+
+        Raises:
+            ValueError: If the column does not exist
+        """
+        try:
+            return self._index[name]
+        except KeyError:
+            raise ValueError(f"'{name}' is not in header row") from None
+
+    def get(self, name):
+        """0-indexed position of a column, or None if it does not exist"""
+        return self._index.get(name)
+
+    def col(self, name):
+        """1-indexed column number of a column (for A1 ranges)"""
+        return self.index(name) + 1
+
+    def cell(self, row, name):
+        """A1 address of one cell, e.g. cell(5, '最終投稿') -> 'G5'"""
+        return a1_range(row, self.col(name))
+
+    def row_range(self, row, end_row=None):
+        """A1 range covering every header column of one or more rows"""
+        return a1_range(row, 1, end_row or row, max(self.width, 1))
+
+    def row_from_dict(self, data):
+        """
+        Order dict values by header; missing or falsy values become ''
+
+        Args:
+            data: {header: value}
+
+        Returns:
+            list: Row values as strings, one per header column
+        """
+        row = []
+        for header in self.headers:
+            value = data.get(header, '')
+            row.append(str(value) if value else '')
+        return row
+
+    def record(self, row):
+        """
+        Map one row of values to {header: value}; short rows are padded with ''
+
+        Args:
+            row: Row values as returned by the Sheets API
+
+        Returns:
+            dict: {header: value} (first column wins for duplicate headers)
+        """
+        return {
+            name: row[i] if i < len(row) else ''
+            for name, i in self._index.items()
+        }
+
+
+class HeaderCache:
+    """
+    Cached HeaderMap per worksheet
+
+    The header row is read once per worksheet. The cached map is only
+    replaced when a read shows a different header row (observe) or a
+    write against it fails (invalidate).
+    """
+
+    def __init__(self):
+        self._maps = {}
+        self._lock = threading.Lock()
+
+    def get(self, sheet):
+        """
+        Get the header map of a worksheet, reading row 1 on first use
+
+        Args:
+            sheet: gspread Worksheet
+
+        Returns:
+            HeaderMap: Column map
+        """
+        header_map = self._maps.get(id(sheet))
+        if header_map is not None:
+            return header_map
+
+        headers = sheet.row_values(1)
+        with self._lock:
+            header_map = self._maps[id(sheet)] = HeaderMap(headers)
+        return header_map
+
+    def peek(self, sheet):
+        """Cached header map of a worksheet, or None (never reads the sheet)"""
+        return self._maps.get(id(sheet))
+
+    def observe(self, sheet, headers):
+        """
+        Compare a freshly read header row with the cache and update on mismatch
+
+        Args:
+            sheet: gspread Worksheet
+            headers: Header row values just read from the sheet
+
+        Returns:
+            HeaderMap: Current column map
+        """
+        header_map = self._maps.get(id(sheet))
+        if header_map is not None and header_map.headers == list(headers):
+            return header_map
+
+        if header_map is not None:
+            print(f"[INFO] Header row changed: {getattr(sheet, 'title', sheet)}")
+
+        with self._lock:
+            header_map = self._maps[id(sheet)] = HeaderMap(headers)
+        return header_map
+
+    def invalidate(self, sheet):
+        """Drop the cached map so the next get() reads row 1 again"""
+        with self._lock:
+            self._maps.pop(id(sheet), None)
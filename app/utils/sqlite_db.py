@@ -0,0 +1,38 @@
+"""
+Per-thread SQLite connections for PostCrafterPro's local stores
+"""
+import sqlite3
+import threading
+
+
+class ThreadLocalSQLite:
+    """
+    One SQLite connection per thread to a shared database file
+
+    sqlite3 connections must not be shared between threads. WAL mode lets
+    several worker processes read while one writes.
+    """
+
+    def __init__(self, db_path, row_factory=None, timeout=30):
+        """
+        Args:
+            db_path: Path to the SQLite file
+            row_factory: Row factory for new connections (e.g. sqlite3.Row)
+            timeout: Seconds to wait for a lock held by another connection
+        """
+        self.db_path = db_path
+        self.row_factory = row_factory
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def connect(self):
+        """Get this thread's connection, opening it on first use"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=self.timeout)
+            if self.row_factory is not None:
+                conn.row_factory = self.row_factory
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
@@ -0,0 +1,149 @@
+"""
+Weighted tweet length for PostCrafterPro
+
+Local implementation of X's weighted-length rules (twitter-text v3
+configuration), so length checks need no network round-trip:
+
+- text is NFC-normalized first
+- code points in the Latin / general punctuation ranges weigh 1,
+  everything else (CJK, kana, full-width forms...) weighs 2
+- every URL counts as 23, whatever its real length
+- every emoji counts as 2, including ZWJ sequences, skin tones, flags
+  and keycaps; text-presentation symbols (©, ™, ▶ ... without U+FE0F)
+  are ordinary characters, as in app.utils.emoji_tokenizer
+- a post is valid with 1 to 280 weighted characters
+"""
+import re
+import unicodedata
+
+from app.utils.emoji_tokenizer import emoji_spans
+
+
+MAX_WEIGHTED_LENGTH = 280
+SCALE = 100
+DEFAULT_WEIGHT = 200
+TRANSFORMED_URL_LENGTH = 23
+
+# (first code point, last code point, weight)
+WEIGHTED_RANGES = (
+    (0x0000, 0x10FF, 100),
+    (0x2000, 0x200D, 100),
+    (0x2010, 0x201F, 100),
+    (0x2032, 0x2037, 100),
+)
+
+# Characters that make a post invalid however short it is
+INVALID_CHARACTERS = frozenset('\uFFFE\uFEFF\uFFFF')
+
+_URL_PATH = r"(?:/[A-Za-z0-9\-._~:/?#\[\]@!$&'()*+,;=%]*)?"
+_DOMAIN = r"(?:[A-Za-z0-9](?:[A-Za-z0-9\-]*[A-Za-z0-9])?\.)+"
+# URLs with a scheme, www. hosts, bare generic-TLD hosts and bare
+# country-code hosts followed by a path (like twitter-text, "example.jp"
+# alone is not linked)
+_URL_PATTERN = re.compile(
+    r"(?<![A-Za-z0-9@＠$#＃/.\-])(?:"
+    rf"https?://{_DOMAIN}[A-Za-z]{{2,}}(?::\d+)?{_URL_PATH}"
+    rf"|www\.{_DOMAIN}[A-Za-z]{{2,}}{_URL_PATH}"
+    rf"|{_DOMAIN}(?:com|net|org|info|biz|io|app|dev|shop|site|online|co)\b{_URL_PATH}"
+    rf"|{_DOMAIN}(?:jp|us|uk|tv|me|ly)/[A-Za-z0-9\-._~:/?#\[\]@!$&'()*+,;=%]*"
+    r")",
+    re.IGNORECASE
+)
+_URL_TRAILING_PUNCTUATION = ".,:;!?'\""
+
+
+def _char_weight(code_point):
+    for start, end, weight in WEIGHTED_RANGES:
+        if start <= code_point <= end:
+            return weight
+    return DEFAULT_WEIGHT
+
+
+def _trim_url(url):
+    """Drop trailing punctuation and unbalanced closing parentheses"""
+    while url:
+        if url[-1] in _URL_TRAILING_PUNCTUATION:
+            url = url[:-1]
+        elif url[-1] == ')' and url.count(')') > url.count('('):
+            url = url[:-1]
+        else:
+            break
+    return url
+
+
+def extract_urls(text):
+    """
+    Find the URLs X would link in a text
+
+    Args:
+        text: Post text
+
+    Returns:
+        list: (start, end) character spans of each URL
+    """
+    spans = []
+    for match in _URL_PATTERN.finditer(text):
+        url = _trim_url(match.group())
+        if url:
+            spans.append((match.start(), match.start() + len(url)))
+    return spans
+
+
+def parse_tweet(text):
+    """
+    Compute the weighted length of a post
+
+    Args:
+        text: Post text
+
+    Returns:
+        dict: {
+            'weightedLength': int,
+            'isValid': bool,
+            'permillage': int (weighted length per mille of the limit),
+            'maxLength': int
+        }
+    """
+    text = unicodedata.normalize('NFC', text or '')
+
+    # Entities that count as a fixed weight, by start position
+    entities = {start: (end, TRANSFORMED_URL_LENGTH * SCALE) for start, end in extract_urls(text)}
+    for emoji_start, emoji_end in emoji_spans(text):
+        if not any(start <= emoji_start < end for start, (end, _) in entities.items()):
+            entities[emoji_start] = (emoji_end, DEFAULT_WEIGHT)
+
+    weighted_count = 0
+    has_invalid_character = False
+    i = 0
+    while i < len(text):
+        if i in entities:
+            end, weight = entities[i]
+            weighted_count += weight
+            i = end
+            continue
+        char = text[i]
+        has_invalid_character = has_invalid_character or char in INVALID_CHARACTERS
+        weighted_count += _char_weight(ord(char))
+        i += 1
+
+    weighted_length = weighted_count // SCALE
+    return {
+        'weightedLength': weighted_length,
+        'isValid': 0 < weighted_length <= MAX_WEIGHTED_LENGTH and not has_invalid_character,
+        'permillage': weighted_length * 1000 // MAX_WEIGHTED_LENGTH,
+        'maxLength': MAX_WEIGHTED_LENGTH
+    }
+
+
+def check_tweet_length(text):
+    """
+    Weighted length and validity of a post
+
+    Args:
+        text: Post text
+
+    Returns:
+        tuple: (weighted_length, is_valid)
+    """
+    result = parse_tweet(text)
+    return result['weightedLength'], result['isValid']
@@ -0,0 +1,139 @@
+"""
+Benchmark emoji extraction: legacy character-class regex vs emoji tokenizer
+
+Usage:
+    python bench_emoji.py                    # tweet sheet (falls back to a synthetic corpus)
+    python bench_emoji.py --source synthetic --size 20000
+    python bench_emoji.py --source file --path tweets.txt   # one post per line
+"""
+import argparse
+import random
+import re
+import time
+from collections import Counter
+
+from app.utils.emoji_tokenizer import extract_emojis
+
+
+LEGACY_EMOJI_PATTERN = re.compile(
+    "["
+    "\U0001F600-\U0001F64F"  # emoticons
+    "\U0001F300-\U0001F5FF"  # symbols & pictographs
+    "\U0001F680-\U0001F6FF"  # transport & map symbols
+    "\U0001F1E0-\U0001F1FF"  # flags (iOS)
+    "\U00002702-\U000027B0"  # dingbats
+    "\U000024C2-\U0001F251"  # enclosed characters
+    "\U0001F900-\U0001F9FF"  # supplemental symbols
+    "\U0001FA00-\U0001FA6F"  # extended symbols
+    "\U00002600-\U000026FF"  # miscellaneous symbols
+    "]+",
+    flags=re.UNICODE
+)
+
+SAMPLE_POSTS = [
+    "新商品のご紹介です✨ 詳しくはプロフィールのリンクから👉 #新商品 #PR",
+    "週末はキャンプへ🏕️ 家族みんなで👨‍👩‍👧‍👦 楽しい時間でした😊😊",
+    "本日の営業は18:00まで⏰ ご来店お待ちしております🙇‍♀️",
+    "いいね👍🏽とRT🔁で応援よろしくお願いします！ 1️⃣位を目指します🇯🇵",
+    "【お知らせ】年末年始の休業日について▶ 12/29〜1/3 ※詳細は公式サイトへ",
+    "季節限定メニュー🍓🍰 数量限定なのでお早めに❤️‍🔥 #スイーツ",
+    "©2024 PostCrafterPro All Rights Reserved. 〽️キャンペーン実施中",
+    "セミナー開催のお知らせ📢 テーマは「SNS運用の基本」です🙌",
+    "明日のライブ楽しみ♪★ 新曲も披露します♡",
+    "本日は晴天☀ ご来店お待ちしてます☺ スタッフ一同❤",
+]
+
+
+def legacy_extract_emojis(text):
+    """Old AnalyticsService._extract_emojis"""
+    if not text:
+        return []
+    return LEGACY_EMOJI_PATTERN.findall(text)
+
+
+def load_corpus(source, path=None, size=10000):
+    """
+    Load the post texts to scan
+
+    Args:
+        source: 'sheet', 'file' or 'synthetic'
+        path: Text file with one post per line (source='file')
+        size: Number of posts in the synthetic corpus
+
+    Returns:
+        tuple: (corpus name, list of texts)
+    """
+    if source == 'sheet':
+        try:
+            from app.services.sheets_service import SheetsService
+            posts = SheetsService().get_posts(limit=None, source='tweet')
+            texts = [post.text for post in posts if post.text]
+            if texts:
+                return 'tweet sheet', texts
+            print("[WARN] tweetシートに投稿がありません。合成コーパスを使用します")
+        except Exception as e:
+            print(f"[WARN] tweetシートを読めません ({e})。合成コーパスを使用します")
+    elif source == 'file':
+        with open(path, 'r', encoding='utf-8') as f:
+            return path, [line.rstrip('\n') for line in f if line.strip()]
+
+    rng = random.Random(42)
+    return 'synthetic', [rng.choice(SAMPLE_POSTS) for _ in range(size)]
+
+
+def timed(fn, repeat):
+    """Return the best wall time of fn() over `repeat` runs and its last result"""
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--source', choices=['sheet', 'file', 'synthetic'], default='sheet')
+    parser.add_argument('--path', help='Text file with one post per line (--source file)')
+    parser.add_argument('--size', type=int, default=10000, help='Synthetic corpus size')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--examples', type=int, default=10,
+                        help='Number of differing posts to print')
+    args = parser.parse_args()
+
+    name, texts = load_corpus(args.source, args.path, args.size)
+    chars = sum(len(text) for text in texts)
+    print(f"corpus={name} posts={len(texts)} chars={chars} repeat={args.repeat}")
+
+    extractors = [('legacy regex', legacy_extract_emojis), ('tokenizer', extract_emojis)]
+    results = {}
+    print(f"{'extractor':>12} | {'total (ms)':>10} | {'per post (us)':>13} | {'tokens':>7} | {'distinct':>8}")
+    print('-' * 64)
+    for label, extract in extractors:
+        elapsed, tokens = timed(lambda: [extract(text) for text in texts], args.repeat)
+        results[label] = tokens
+        counts = Counter(token for post_tokens in tokens for token in post_tokens)
+        per_post = elapsed / max(len(texts), 1) * 1e6
+        print(f"{label:>12} | {elapsed * 1000:10.2f} | {per_post:13.2f} | "
+              f"{sum(counts.values()):7d} | {len(counts):8d}")
+
+    legacy, tokenized = results['legacy regex'], results['tokenizer']
+    differing = [i for i in range(len(texts)) if legacy[i] != tokenized[i]]
+    print(f"\nposts with different tokens: {len(differing)} / {len(texts)}")
+
+    # Same text only counted once, so the examples show distinct cases
+    shown = set()
+    for i in differing:
+        if len(shown) >= args.examples:
+            break
+        if texts[i] in shown:
+            continue
+        shown.add(texts[i])
+        print(f"\n  {texts[i][:80]}")
+        print(f"    legacy:    {legacy[i]}")
+        print(f"    tokenizer: {tokenized[i]}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+Benchmark top-k cosine similarity: per-candidate loop vs batched matmul
+
+Usage:
+    python bench_similarity.py
+    python bench_similarity.py --sizes 100 1000 10000 100000 --dim 1536 --top-k 5
+"""
+import argparse
+import time
+
+import numpy as np
+
+from app.services.embedding_service import normalize_rows, score_matrix
+
+
+def legacy_cosine_similarity(vec1, vec2):
+    """Per-pair cosine similarity as used by the old find_most_similar loop"""
+    vec1 = np.array(vec1)
+    vec2 = np.array(vec2)
+    vec1_norm = vec1 / (np.linalg.norm(vec1) + 1e-10)
+    vec2_norm = vec2 / (np.linalg.norm(vec2) + 1e-10)
+    return float(np.dot(vec1_norm, vec2_norm))
+
+
+def legacy_top_k(query, vectors, top_k):
+    """Old path: Python loop + full sort"""
+    similarities = [(i, legacy_cosine_similarity(query, vec)) for i, vec in enumerate(vectors)]
+    similarities.sort(key=lambda x: x[1], reverse=True)
+    return similarities[:top_k]
+
+
+def batched_top_k(query, matrix, top_k):
+    """New path: one matmul + argpartition"""
+    indices, scores = score_matrix(query, matrix, top_k)
+    return list(zip(indices.tolist(), scores.tolist()))
+
+
+def timed(fn, repeat):
+    """Return the best wall time of fn() over `repeat` runs and its last result"""
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000, 100000])
+    parser.add_argument('--dim', type=int, default=1536)
+    parser.add_argument('--top-k', type=int, default=5)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--legacy-max', type=int, default=100000,
+                        help='Skip the legacy loop above this many candidates')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    query = rng.standard_normal(args.dim).astype(np.float32)
+
+    print(f"dim={args.dim} top_k={args.top_k} repeat={args.repeat}")
+    print(f"{'candidates':>10} | {'legacy (ms)':>12} | {'normalize (ms)':>14} | {'batched (ms)':>12} | {'speedup':>8}")
+    print('-' * 70)
+
+    for size in args.sizes:
+        vectors = rng.standard_normal((size, args.dim)).astype(np.float32)
+
+        norm_time, matrix = timed(lambda: normalize_rows(vectors), 1)
+        batched_time, batched = timed(lambda: batched_top_k(query, matrix, args.top_k), args.repeat)
+
+        if size <= args.legacy_max:
+            legacy_time, legacy = timed(lambda: legacy_top_k(query, vectors, args.top_k), 1)
+            if [i for i, _ in legacy] != [i for i, _ in batched]:
+                print(f"[WARN] Top-k mismatch at {size} candidates")
+            legacy_ms = f"{legacy_time * 1000:12.2f}"
+            speedup = f"{legacy_time / batched_time:7.1f}x"
+        else:
+            legacy_ms = f"{'skipped':>12}"
+            speedup = f"{'-':>8}"
+
+        print(f"{size:>10} | {legacy_ms} | {norm_time * 1000:14.2f} | {batched_time * 1000:12.3f} | {speedup}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+Check the emoji tokenizer against reference cases
+
+Expected tokens follow the emoji sequence grammar of Unicode TR #51:
+symbols that are not emoji (♪, ★, ♡) and text-default emoji without
+U+FE0F (☺, ❤, ©) give no token.
+
+Usage:
+    python check_emoji_tokenizer.py
+    python check_emoji_tokenizer.py "確認したい投稿テキスト"
+"""
+import io
+import sys
+
+from app.utils.emoji_tokenizer import extract_emojis
+
+# UTF-8 output for Windows
+sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+
+# (label, text, expected tokens)
+REFERENCE_CASES = [
+    ('empty', '', []),
+    ('plain text', '新商品のご紹介です', []),
+    ('music / star symbols', '楽しみ♪★', []),
+    ('white heart suit', '♡', []),
+    ('black heart suit', '♥', []),
+    ('smiley (text)', '☺', []),
+    ('smiley (emoji)', '☺️', ['☺️']),
+    ('heart (text)', '❤', []),
+    ('heart (emoji)', '❤️', ['❤️']),
+    ('sun (text)', '☀', []),
+    ('copyright (text)', '©2024', []),
+    ('play (text)', '▶ 再生', []),
+    ('forced text presentation', '\U0001F600︎', []),
+    ('emoji', '😀', ['😀']),
+    ('adjacent emoji', '✨👉', ['✨', '👉']),
+    ('skin tone', '👍🏽👍', ['👍🏽', '👍']),
+    ('text-default + skin tone', '☝\U0001F3FD', ['☝\U0001F3FD']),
+    ('ZWJ family', '\U0001F468‍\U0001F469‍\U0001F467‍\U0001F466',
+     ['\U0001F468‍\U0001F469‍\U0001F467‍\U0001F466']),
+    ('ZWJ without selector', '\U0001F3C3‍♀', ['\U0001F3C3‍♀']),
+    ('heart on fire', '❤️‍\U0001F525', ['❤️‍\U0001F525']),
+    ('flag', '🇯🇵', ['🇯🇵']),
+    ('subdivision flag', '\U0001F3F4\U000E0067\U000E0062\U000E0065\U000E006E\U000E0067\U000E007F',
+     ['\U0001F3F4\U000E0067\U000E0062\U000E0065\U000E006E\U000E0067\U000E007F']),
+    ('keycap', '1️⃣位', ['1️⃣']),
+    ('mixed', '季節限定♪ 数量限定🍓🍰 お早めに❤️‍\U0001F525 ★',
+     ['🍓', '🍰', '❤️‍\U0001F525']),
+]
+
+
+def main():
+    if len(sys.argv) > 1:
+        text = ' '.join(sys.argv[1:])
+        tokens = extract_emojis(text)
+        print(f"絵文字: {len(tokens)}件")
+        for token in tokens:
+            print(f"  {token}  ({' '.join(f'U+{ord(c):04X}' for c in token)})")
+        return
+
+    failures = 0
+    print(f"{'case':<26} | {'expected':>8} | {'actual':>6} | result")
+    print('-' * 56)
+    for label, text, expected in REFERENCE_CASES:
+        tokens = extract_emojis(text)
+        ok = tokens == expected
+        failures += not ok
+        print(f"{label:<26} | {len(expected):>8} | {len(tokens):>6} | {'OK' if ok else 'NG'}")
+
+    print(f"\n{len(REFERENCE_CASES) - failures} / {len(REFERENCE_CASES)} cases passed")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""
+Check the local tweet length calculator against reference cases
+
+Expected values follow X's weighted-length rules (twitter-text v3).
+
+Usage:
+    python check_tweet_length.py
+    python check_tweet_length.py "確認したい投稿テキスト"
+"""
+import io
+import sys
+
+from app.utils.tweet_length import parse_tweet
+
+# UTF-8 output for Windows
+sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+
+# (label, text, expected weighted length, expected validity)
+REFERENCE_CASES = [
+    ('empty', '', 0, False),
+    ('ASCII', 'Hello, world!', 13, True),
+    ('hiragana', 'こんにちは', 10, True),
+    ('kanji + hashtag', '#PR 新商品', 10, True),
+    ('half-width kana', 'ｱｲｳ', 6, True),
+    ('full-width digits', '１２３', 6, True),
+    ('curly quotes', '“quote”', 7, True),
+    ('decomposed accent (NFC)', 'cafe\u0301', 4, True),
+    ('280 ASCII', 'a' * 280, 280, True),
+    ('281 ASCII', 'a' * 281, 281, False),
+    ('140 CJK', 'あ' * 140, 280, True),
+    ('141 CJK', 'あ' * 141, 282, False),
+    ('URL', 'https://example.com/very/long/path?query=1&page=2', 23, True),
+    ('URL in Japanese text', '詳細はこちら https://example.com/products/12345', 36, True),
+    ('URL right after Japanese', '詳細はこちらhttps://example.com/p', 35, True),
+    ('bare domains', 'example.com と www.example.jp', 50, True),
+    ('bare ccTLD without path', 'example.jp', 10, True),
+    ('URL before a period', 'Visit example.com.', 30, True),
+    ('emoji', '😀', 2, True),
+    ('ZWJ family', '\U0001F468\u200D\U0001F469\u200D\U0001F467\u200D\U0001F466', 2, True),
+    ('skin tone', '👍🏽', 2, True),
+    ('flag', '🇯🇵', 2, True),
+    ('keycap', '1\uFE0F\u20E3', 2, True),
+    ('variation selector', '\u2764\uFE0F', 2, True),
+    ('copyright (text)', '©2024', 5, True),
+    ('registered (text)', 'PostCrafter®', 12, True),
+    ('copyright (emoji)', '\u00A9\uFE0F', 2, True),
+    ('trade mark (text)', '™', 2, True),
+    ('play (text)', '▶ 再生', 7, True),
+    ('play (emoji)', '\u25B6\uFE0F', 2, True),
+    ('part alternation (text)', '〽', 2, True),
+    ('music / star symbols', '楽しみ♪★', 10, True),
+    ('white heart suit', '♡', 2, True),
+    ('smiley (text)', '☺', 2, True),
+    ('smiley (emoji)', '\u263A\uFE0F', 2, True),
+    ('mixed', '新商品のご紹介です✨ 詳しくはこちら👉 https://example.com/item #新商品', 69, True),
+    ('byte order mark', 'abc\uFEFF', 5, False),
+]
+
+
+def main():
+    if len(sys.argv) > 1:
+        text = ' '.join(sys.argv[1:])
+        result = parse_tweet(text)
+        print(f"文字数: {result['weightedLength']} / {result['maxLength']}")
+        print(f"有効: {result['isValid']} ({result['permillage'] / 10:.1f}%)")
+        return
+
+    failures = 0
+    print(f"{'case':<26} | {'expected':>8} | {'actual':>6} | {'valid':>5} | result")
+    print('-' * 66)
+    for label, text, expected_length, expected_valid in REFERENCE_CASES:
+        result = parse_tweet(text)
+        ok = result['weightedLength'] == expected_length and result['isValid'] == expected_valid
+        failures += not ok
+        print(f"{label:<26} | {expected_length:>8} | {result['weightedLength']:>6} | "
+              f"{str(result['isValid']):>5} | {'OK' if ok else 'NG'}")
+
+    print(f"\n{len(REFERENCE_CASES) - failures} / {len(REFERENCE_CASES)} cases passed")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()